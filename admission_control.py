@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Admission Control
+Giới hạn số job và tổng dung lượng job đang chờ/đang chạy để bộ nhớ không tăng vô hạn khi bị dồn job
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionTicket(NamedTuple):
+    size: int
+    admitted_at: float
+
+
+class AdmissionController:
+    def __init__(self, max_jobs: int = 64, max_bytes: int = 256 * 1024 * 1024, resume_ratio: float = 0.75):
+        self.max_jobs = max(1, int(max_jobs))
+        self.max_bytes = max(1, int(max_bytes))
+        # Sau khi đầy, chỉ nhận tiếp khi đã xuống dưới tỉ lệ này (tránh dừng/chạy liên tục)
+        self.resume_ratio = resume_ratio
+        self._jobs = 0
+        self._bytes = 0
+        self._capacity_event: Optional[asyncio.Event] = None
+        # Thời gian trung bình từ lúc nhận tới lúc xong job (EWMA), dùng để ước lượng retryAfter
+        self._avg_latency: Optional[float] = None
+        self._stats = {'admitted': 0, 'rejected': 0}
+
+    @property
+    def jobs(self) -> int:
+        return self._jobs
+
+    @property
+    def bytes(self) -> int:
+        return self._bytes
+
+    def try_admit(self, size: int) -> Optional[AdmissionTicket]:
+        """Nhận job nếu còn chỗ; trả về None nếu vượt giới hạn số job hoặc dung lượng"""
+        size = max(0, int(size))
+        # Hàng đợi rỗng thì luôn nhận, kể cả job lớn hơn max_bytes (nếu không sẽ không bao giờ in được)
+        if self._jobs > 0 and (self._jobs + 1 > self.max_jobs or self._bytes + size > self.max_bytes):
+            self._stats['rejected'] += 1
+            return None
+
+        self._jobs += 1
+        self._bytes += size
+        self._stats['admitted'] += 1
+        return AdmissionTicket(size, time.monotonic())
+
+    def release(self, ticket: AdmissionTicket):
+        """Trả lại chỗ khi job xong (thành công, lỗi hoặc bị hủy)"""
+        self._jobs = max(0, self._jobs - 1)
+        self._bytes = max(0, self._bytes - ticket.size)
+
+        latency = time.monotonic() - ticket.admitted_at
+        if self._avg_latency is None:
+            self._avg_latency = latency
+        else:
+            self._avg_latency += 0.2 * (latency - self._avg_latency)
+
+        if self._capacity_event is not None and self._below_resume_level():
+            self._capacity_event.set()
+
+    def is_full(self) -> bool:
+        """Đã chạm giới hạn số job hoặc dung lượng"""
+        return self._jobs >= self.max_jobs or self._bytes >= self.max_bytes
+
+    def _below_resume_level(self) -> bool:
+        return (
+            self._jobs <= self.max_jobs * self.resume_ratio
+            and self._bytes <= self.max_bytes * self.resume_ratio
+        )
+
+    async def wait_for_capacity(self, timeout: Optional[float] = None) -> bool:
+        """Chờ tới khi hàng đợi giảm xuống dưới mức nhận lại; False nếu hết timeout"""
+        if self._below_resume_level():
+            return True
+        if self._capacity_event is None or self._capacity_event.is_set():
+            self._capacity_event = asyncio.Event()
+        try:
+            await asyncio.wait_for(self._capacity_event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def retry_after(self) -> float:
+        """Ước lượng số giây bên gửi nên chờ trước khi gửi lại"""
+        if self._avg_latency is None or self._jobs == 0:
+            return 1.0
+        # Trung bình cứ avg_latency / số job đang giữ thì có một chỗ trống
+        return round(min(30.0, max(0.5, self._avg_latency / self._jobs)), 1)
+
+    def credits(self) -> Dict[str, int]:
+        """Số job và dung lượng còn nhận được"""
+        return {
+            'jobs': max(0, self.max_jobs - self._jobs),
+            'bytes': max(0, self.max_bytes - self._bytes)
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        stats = dict(self._stats)
+        stats.update({'jobs': self._jobs, 'bytes': self._bytes})
+        return stats
@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark
+Đo throughput và độ trễ của WebSocketPrintClient: bridge server giả lập gửi job theo tỉ lệ loại nội dung và
+tốc độ cấu hình, máy in giả lập TCP RAW có tốc độ cố định. Kết quả xuất JSON để so sánh giữa các phiên bản.
+
+Ví dụ:
+    python benchmark.py --rate 50 --jobs 1000 --mix text=70,html=10,pdf=10,image=10 --output bench.json
+"""
+
+import argparse
+import asyncio
+import base64
+import functools
+import io
+import json
+import logging
+import platform
+import random
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import websockets
+
+from logging_setup import setup_logging
+from raw_tcp_backend import LocalRawPrinter
+from websocket_print_client import WebSocketPrintClient
+
+logger = logging.getLogger('benchmark')
+
+CONTENT_TYPES = ('text', 'html', 'pdf', 'image')
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Percentile theo nearest-rank"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def summarize_ms(samples: List[float]) -> Dict[str, Any]:
+    """Tóm tắt các mẫu thời gian (giây) thành mili giây"""
+    if not samples:
+        return {'count': 0}
+    return {
+        'count': len(samples),
+        'mean_ms': round(sum(samples) / len(samples) * 1000, 3),
+        'p50_ms': round(percentile(samples, 50) * 1000, 3),
+        'p90_ms': round(percentile(samples, 90) * 1000, 3),
+        'p99_ms': round(percentile(samples, 99) * 1000, 3),
+        'max_ms': round(max(samples) * 1000, 3),
+        'total_ms': round(sum(samples) * 1000, 3)
+    }
+
+
+def peak_rss_bytes() -> Optional[Dict[str, int]]:
+    """RSS đỉnh của process (và các process con, ví dụ process pool chuẩn bị tài liệu)"""
+    try:
+        import resource
+    except ImportError:
+        resource = None
+
+    if resource is not None:
+        # Linux trả về KB, macOS trả về bytes
+        scale = 1 if sys.platform == 'darwin' else 1024
+        return {
+            'self': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+            'children': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale
+        }
+
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return {'self': getattr(info, 'peak_wset', info.rss)}
+    except ImportError:
+        return None
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return None
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    """'text=70,html=10,pdf=10,image=10' -> {loại: trọng số}"""
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in CONTENT_TYPES:
+            raise argparse.ArgumentTypeError(f"Loại nội dung không hỗ trợ: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def build_payloads(rng: random.Random, pdf_kb: int, image_width: int) -> Dict[str, Tuple[str, Dict[str, Any]]]:
+    """Tạo sẵn nội dung mẫu cho từng loại (tạo một lần, dùng lại cho mọi job)"""
+    lines = [f"{'Mat hang %02d' % i:<30}{rng.randint(1, 9):>3}{rng.randint(1000, 99000):>12,}" for i in range(30)]
+    text = "HOA DON BAN HANG\n" + "\n".join(lines) + "\nTONG CONG\n"
+
+    rows = ''.join(
+        f"<tr><td>Mat hang {i:02d}</td><td>{rng.randint(1, 9)}</td><td>{rng.randint(1000, 99000):,}</td></tr>"
+        for i in range(30)
+    )
+    html = f"<html><body><center><h1>HOA DON</h1></center><table>{rows}</table><hr><p>Cam on quy khach</p></body></html>"
+
+    pdf_body = b'%PDF-1.4\n' + bytes(rng.getrandbits(8) for _ in range(pdf_kb * 1024)) + b'\n%%EOF\n'
+    pdf = 'data:application/pdf;base64,' + base64.b64encode(pdf_body).decode('ascii')
+
+    payloads = {
+        'text': (text, {'content_type': 'text'}),
+        'html': (html, {'content_type': 'html'}),
+        'pdf': (pdf, {'content_type': 'pdf', 'keep': False})
+    }
+
+    try:
+        from PIL import Image, ImageDraw
+        height = image_width // 2
+        image = Image.new('L', (image_width, height), 255)
+        draw = ImageDraw.Draw(image)
+        for x in range(0, image_width, 4):
+            draw.line((x, 0, x, height), fill=x * 255 // image_width)
+        draw.ellipse((image_width // 4, height // 4, image_width * 3 // 4, height * 3 // 4), fill=0)
+        buffer = io.BytesIO()
+        image.save(buffer, 'PNG')
+        payloads['image'] = (
+            'data:image/png;base64,' + base64.b64encode(buffer.getvalue()).decode('ascii'),
+            {'content_type': 'image'}
+        )
+    except ImportError:
+        logger.warning("Không có Pillow: bỏ loại image khỏi benchmark")
+
+    return payloads
+
+
+class StageTimer:
+    """Đo thời gian từng giai đoạn bằng cách bọc method của client/handler"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self._received_at: Dict[int, float] = {}
+
+    def wrap_async(self, obj: Any, name: str, stage: str):
+        original = getattr(obj, name)
+
+        @functools.wraps(original)
+        async def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await original(*args, **kwargs)
+            finally:
+                self.samples[stage].append(time.perf_counter() - started)
+
+        setattr(obj, name, timed)
+
+    def wrap_sync(self, obj: Any, name: str, stage: str):
+        original = getattr(obj, name)
+
+        @functools.wraps(original)
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self.samples[stage].append(time.perf_counter() - started)
+
+        setattr(obj, name, timed)
+
+    def instrument(self, client: WebSocketPrintClient):
+        handler = client.print_handler
+        self.wrap_async(handler, 'cache_document', 'decode')
+        self.wrap_async(handler, 'keep_document', 'spool_store')
+        self.wrap_async(handler, '_prepare_html', 'render_html')
+        self.wrap_async(handler, '_prepare_image', 'raster_image')
+        self.wrap_async(handler, 'print_content', 'print')
+        self.wrap_sync(handler, '_sync_print_pages', 'printer_write')
+        self.wrap_async(client, 'send_message', 'send_response')
+        self.wrap_async(client, 'handle_message', 'handle_total')
+
+        # Thời gian chờ trong dispatcher: từ lúc nhận tin nhắn tới lúc bắt đầu xử lý
+        route = client._route_message
+        handle = client.handle_message
+
+        async def timed_route(message_data, *args, **kwargs):
+            self._received_at[id(message_data)] = time.perf_counter()
+            return await route(message_data, *args, **kwargs)
+
+        async def timed_handle(message_data):
+            received = self._received_at.pop(id(message_data), None)
+            if received is not None:
+                self.samples['queue_wait'].append(time.perf_counter() - received)
+            return await handle(message_data)
+
+        client._route_message = timed_route
+        client.handle_message = timed_handle
+
+    def summary(self) -> Dict[str, Any]:
+        return {stage: summarize_ms(samples) for stage, samples in sorted(self.samples.items())}
+
+
+class BridgeStandIn:
+    """Bridge server giả lập: gửi job theo lịch cố định (open-loop) và ghi nhận phản hồi"""
+
+    def __init__(self, plan: List[str], payloads: Dict[str, Tuple[str, Dict[str, Any]]],
+                 printers: List[str], rate: float, clients: int):
+        self.plan = plan
+        self.payloads = payloads
+        self.printers = printers
+        self.rate = rate
+        self.clients = clients
+        self.pending: Dict[str, Tuple[str, float]] = {}
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.completed = 0
+        self.failed = 0
+        self.busy = 0
+        self.paused = 0
+        self.bytes_sent = 0
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.done = asyncio.Event()
+
+    async def handler(self, websocket, *args):
+        sender = asyncio.ensure_future(self._send_jobs(websocket))
+        try:
+            async for message in websocket:
+                self._on_message(json.loads(message))
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            sender.cancel()
+
+    async def _send_jobs(self, websocket):
+        # Lịch gửi cố định: độ trễ tính từ thời điểm lẽ ra phải gửi, tránh coordinated omission
+        self.started_at = time.perf_counter()
+        for index, job_type in enumerate(self.plan):
+            intended = self.started_at + index / self.rate
+            delay = intended - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            job_id = f"{job_type}-{index}"
+            content, options = self.payloads[job_type]
+            if job_type in ('text', 'html'):
+                # Nội dung văn bản khác nhau giữa các job
+                content = content.replace('HOA DON', f"HOA DON #{index}", 1)
+            message = json.dumps({
+                'type': 'print',
+                'jobId': job_id,
+                'clientId': f"tab-{index % self.clients}",
+                'printer': self.printers[index % len(self.printers)],
+                'content': content,
+                'options': options
+            })
+            self.pending[job_id] = (job_type, intended)
+            self.bytes_sent += len(message)
+            await websocket.send(message)
+
+    def _on_message(self, message: Dict[str, Any]):
+        message_type = message.get('type')
+        if message_type == 'flowControl' and message.get('state') == 'paused':
+            self.paused += 1
+            return
+        job = self.pending.pop(message.get('jobId'), None) if message_type == 'print' else None
+        if job is None:
+            return
+
+        job_type, intended = job
+        if message.get('busy'):
+            self.busy += 1
+        elif message.get('success'):
+            self.completed += 1
+            self.latencies[job_type].append(time.perf_counter() - intended)
+        else:
+            self.failed += 1
+
+        if self.completed + self.failed + self.busy == len(self.plan):
+            self.finished_at = time.perf_counter()
+            self.done.set()
+
+
+async def run_benchmark(args) -> Dict[str, Any]:
+    rng = random.Random(args.seed)
+    payloads = build_payloads(rng, args.pdf_kb, args.image_width)
+    mix = {name: weight for name, weight in args.mix.items() if name in payloads and weight > 0}
+    plan = rng.choices(list(mix), weights=list(mix.values()), k=args.jobs)
+
+    printers = [
+        LocalRawPrinter(bytes_per_second=args.printer_bps, keep_data=False).start()
+        for _ in range(args.printers)
+    ]
+    network_printers = {f"Bench{i}": printer.address for i, printer in enumerate(printers)}
+    bridge = BridgeStandIn(plan, payloads, list(network_printers), args.rate, args.clients)
+
+    async with websockets.serve(bridge.handler, '127.0.0.1', 0, max_size=None) as server:
+        port = server.sockets[0].getsockname()[1]
+        client = WebSocketPrintClient(
+            server_url=f"ws://127.0.0.1:{port}",
+            max_concurrent_jobs=args.concurrency,
+            network_printers=network_printers
+        )
+        stages = StageTimer()
+        stages.instrument(client)
+
+        client_task = asyncio.ensure_future(client.run())
+        timed_out = False
+        try:
+            await asyncio.wait_for(bridge.done.wait(), timeout=args.timeout)
+        except asyncio.TimeoutError:
+            timed_out = True
+            logger.warning(f"Hết thời gian chờ, còn {len(bridge.pending)} job chưa có phản hồi")
+        finally:
+            client_metrics = client.metrics.snapshot()
+            client_task.cancel()
+            await asyncio.gather(client_task, return_exceptions=True)
+            await client.disconnect()
+            await client.dispatcher.cancel_all()
+            await client.printer_inventory.stop()
+            await client.print_handler.health.stop()
+            client.print_handler.preparer.shutdown()
+            client.print_handler.executor.shutdown()
+            client.print_handler.raw_tcp.close_all()
+
+    for printer in printers:
+        printer.stop()
+
+    finished_at = bridge.finished_at or time.perf_counter()
+    elapsed = finished_at - (bridge.started_at or finished_at)
+    all_latencies = [value for values in bridge.latencies.values() for value in values]
+
+    return {
+        'benchmark': 'websocket_print_client',
+        'timestamp': datetime.now().isoformat(),
+        'revision': git_revision(),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform()
+        },
+        'config': {
+            'jobs': args.jobs,
+            'rate': args.rate,
+            'mix': mix,
+            'printers': args.printers,
+            'printer_bytes_per_second': args.printer_bps,
+            'concurrency': args.concurrency,
+            'clients': args.clients,
+            'pdf_kb': args.pdf_kb,
+            'image_width': args.image_width,
+            'seed': args.seed
+        },
+        'results': {
+            'timed_out': timed_out,
+            'elapsed_s': round(elapsed, 3),
+            'sent': len(plan),
+            'completed': bridge.completed,
+            'failed': bridge.failed,
+            'busy': bridge.busy,
+            'flow_control_pauses': bridge.paused,
+            'throughput_jobs_per_s': round(bridge.completed / elapsed, 2) if elapsed > 0 else None,
+            'ingress_bytes': bridge.bytes_sent,
+            'printer_bytes': sum(printer.bytes_received for printer in printers),
+            'latency': summarize_ms(all_latencies),
+            'latency_by_type': {name: summarize_ms(values) for name, values in sorted(bridge.latencies.items())}
+        },
+        'peak_rss_bytes': peak_rss_bytes(),
+        'stages': stages.summary(),
+        # Số liệu client tự ghi (histogram theo bucket, nhãn máy in/loại nội dung)
+        'client_metrics': client_metrics
+    }
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='Benchmark WebSocket Print Client')
+    parser.add_argument('--jobs', type=int, default=500, help='Tổng số job gửi')
+    parser.add_argument('--rate', type=float, default=50.0, help='Số job gửi mỗi giây')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix('text=70,html=10,pdf=10,image=10'),
+                        help='Tỉ lệ loại nội dung, ví dụ text=70,html=10,pdf=10,image=10')
+    parser.add_argument('--printers', type=int, default=2, help='Số máy in giả lập')
+    parser.add_argument('--printer-bps', type=float, default=2 * 1024 * 1024,
+                        help='Tốc độ nhận của máy in giả lập (bytes/giây, 0 = không giới hạn)')
+    parser.add_argument('--concurrency', type=int, default=4, help='max_concurrent_jobs của client')
+    parser.add_argument('--clients', type=int, default=4, help='Số clientId (tab trình duyệt) giả lập')
+    parser.add_argument('--pdf-kb', type=int, default=200, help='Kích thước PDF mẫu (KB)')
+    parser.add_argument('--image-width', type=int, default=800, help='Độ rộng ảnh mẫu (pixel)')
+    parser.add_argument('--seed', type=int, default=1, help='Seed cho nội dung và thứ tự job')
+    parser.add_argument('--timeout', type=float, default=300.0, help='Thời gian chờ tối đa (giây)')
+    parser.add_argument('--output', help='Ghi kết quả JSON ra file (mặc định in ra stdout)')
+    parser.add_argument('--log-level', default='WARNING', help='Mức log của client trong lúc đo')
+    args = parser.parse_args(argv)
+    if not args.printer_bps:
+        args.printer_bps = None
+
+    # Log của client ảnh hưởng đáng kể tới kết quả: mặc định chỉ ghi cảnh báo
+    setup_logging(level=args.log_level.upper(), log_file='websocket_client.log')
+
+    report = asyncio.run(run_benchmark(args))
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+        results = report['results']
+        print(f"✅ {results['completed']}/{results['sent']} job, {results['throughput_jobs_per_s']} job/s, "
+              f"p99 {results['latency'].get('p99_ms')} ms -> {args.output}")
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Codec Benchmark
+So sánh chi phí decode/encode tin nhắn: json chuẩn + dict (cách cũ) với message_codec (thư viện JSON nhanh nếu có,
+struct có kiểu). Chạy: python codec_benchmark.py [--json]
+"""
+
+import argparse
+import base64
+import json
+import os
+import sys
+import timeit
+from datetime import datetime
+from typing import Any, Callable, Dict, List
+
+import message_codec
+from message_codec import PrintResponse
+
+
+def make_messages() -> Dict[str, str]:
+    """Tin nhắn print mẫu với các kích thước thường gặp"""
+    receipt = "\n".join(f"Mat hang {i:02d}    x{i % 5 + 1}    {i * 1000:>10,}" for i in range(30))
+    html = "<table>" + "".join(f"<tr><td>Mat hang {i}</td><td>{i * 1000}</td></tr>" for i in range(600)) + "</table>"
+
+    def print_message(content: str, content_type: str) -> str:
+        return json.dumps({
+            'type': 'print',
+            'jobId': 'job-1',
+            'clientId': 'pos-1',
+            'printer': 'Bep',
+            'content': content,
+            'options': {'content_type': content_type}
+        })
+
+    def pdf(size: int) -> str:
+        return 'data:application/pdf;base64,' + base64.b64encode(os.urandom(size)).decode('ascii')
+
+    return {
+        'text 1KB': print_message(receipt, 'text'),
+        'html 30KB': print_message(html, 'html'),
+        'pdf 1MB': print_message(pdf(768 * 1024), 'pdf'),
+        'pdf 8MB': print_message(pdf(6 * 1024 * 1024), 'pdf')
+    }
+
+
+def decode_baseline(raw: str):
+    """Cách cũ: json.loads rồi đọc từng trường bằng get"""
+    message_data = json.loads(raw)
+    message_type = message_data.get('type')
+    content = message_data.get('content', '')
+    printer_name = message_data.get('printer')
+    options = message_data.get('options', {})
+    if 'content_type' not in options:
+        options['content_type'] = 'text'
+    return message_type, content, printer_name, options
+
+
+def decode_codec(raw: str):
+    message = message_codec.decode(raw)
+    return message.type, message.content, message.printer, message.options
+
+
+def decode_codec_stdlib(raw: str):
+    """Chỉ phần kiểm tra struct, JSON vẫn bằng thư viện chuẩn"""
+    message = message_codec.from_dict(json.loads(raw))
+    return message.type, message.content, message.printer, message.options
+
+
+def encode_baseline():
+    return json.dumps({
+        'type': 'print',
+        'success': True,
+        'data': {
+            'printer': 'Bep',
+            'content_length': 1024,
+            'timestamp': datetime.now().isoformat(),
+            'documentHash': 'ab' * 32
+        },
+        'jobId': 'job-1'
+    })
+
+
+def encode_codec():
+    return message_codec.dumps(PrintResponse(
+        success=True,
+        printer='Bep',
+        content_length=1024,
+        timestamp=datetime.now().isoformat(),
+        document_hash='ab' * 32,
+        job_id='job-1'
+    ).to_dict())
+
+
+def measure(func: Callable[[], Any], min_time: float = 0.2) -> float:
+    """Thời gian trung bình mỗi lần gọi (giây), lấy lần chạy nhanh nhất trong 3 lần"""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    number = max(1, int(number * min_time / 0.2))
+    return min(timer.repeat(repeat=3, number=number)) / number
+
+
+def run() -> List[Dict[str, Any]]:
+    results = []
+    for name, raw in make_messages().items():
+        baseline = measure(lambda: decode_baseline(raw))
+        codec = measure(lambda: decode_codec(raw))
+        validation_only = measure(lambda: decode_codec_stdlib(raw))
+        results.append({
+            'case': f"decode {name}",
+            'baseline_us': round(baseline * 1e6, 2),
+            'codec_us': round(codec * 1e6, 2),
+            'codec_stdlib_us': round(validation_only * 1e6, 2),
+            'speedup': round(baseline / codec, 2)
+        })
+
+    baseline = measure(encode_baseline)
+    codec = measure(encode_codec)
+    results.append({
+        'case': 'encode print response',
+        'baseline_us': round(baseline * 1e6, 2),
+        'codec_us': round(codec * 1e6, 2),
+        'codec_stdlib_us': None,
+        'speedup': round(baseline / codec, 2)
+    })
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark message codec')
+    parser.add_argument('--json', action='store_true', help='In kết quả dạng JSON')
+    args = parser.parse_args(argv)
+
+    results = run()
+    if args.json:
+        print(json.dumps({'engine': message_codec.ENGINE, 'results': results}, indent=2))
+        return
+
+    print(f"JSON engine: {message_codec.ENGINE} (Python {sys.version.split()[0]})")
+    print(f"{'case':<26}{'json+dict (us)':>16}{'codec (us)':>14}{'codec/json (us)':>18}{'speedup':>10}")
+    for row in results:
+        stdlib = '-' if row['codec_stdlib_us'] is None else f"{row['codec_stdlib_us']:.2f}"
+        print(f"{row['case']:<26}{row['baseline_us']:>16.2f}{row['codec_us']:>14.2f}{stdlib:>18}{row['speedup']:>9.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Connection Manager
+Quản lý kết nối WebSocket tới server: kiểm tra sống bằng ping/pong, kết nối lại theo exponential backoff có jitter
+(lần đầu gần như ngay lập tức) và giữ kết quả job trong bộ đệm có giới hạn khi mất kết nối để gửi lại sau khi
+kết nối lại
+"""
+
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Union
+
+import websockets
+
+logger = logging.getLogger(__name__)
+
+Payload = Union[str, bytes]
+
+
+class ConnectionManager:
+    def __init__(self, url: str, ping_interval: Optional[float] = 10.0, ping_timeout: Optional[float] = 10.0,
+                 open_timeout: float = 10.0, backoff_initial: float = 0.05, backoff_max: float = 10.0,
+                 backoff_factor: float = 2.0, stable_after: float = 5.0,
+                 max_buffered_messages: int = 1000, max_buffered_bytes: int = 16 * 1024 * 1024):
+        self.url = url
+        # Server không trả pong trong ping_timeout giây: coi như mất kết nối (không chờ TCP timeout)
+        self.ping_interval = ping_interval
+        self.ping_timeout = ping_timeout
+        self.open_timeout = open_timeout
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.backoff_factor = backoff_factor
+        # Kết nối sống lâu hơn ngưỡng này thì lần kết nối lại sau bắt đầu lại từ độ trễ nhỏ nhất
+        self.stable_after = stable_after
+        self.max_buffered_messages = max(1, int(max_buffered_messages))
+        self.max_buffered_bytes = max(1, int(max_buffered_bytes))
+        self.websocket = None
+        self._attempts = 0
+        self._connected_at: Optional[float] = None
+        self._buffer: Deque[Payload] = deque()
+        self._buffered_bytes = 0
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._stats = {'connects': 0, 'failures': 0, 'buffered': 0, 'flushed': 0, 'dropped': 0}
+
+    @property
+    def connected(self) -> bool:
+        if self.websocket is None:
+            return False
+        # websockets >= 13 (asyncio mới) dùng state, bản cũ dùng open
+        state = getattr(self.websocket, 'state', None)
+        if state is not None:
+            return state == websockets.protocol.State.OPEN
+        return bool(getattr(self.websocket, 'open', False))
+
+    def _get_flush_lock(self) -> asyncio.Lock:
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        return self._flush_lock
+
+    async def connect(self) -> bool:
+        """Kết nối một lần; lỗi được ghi log và trả về False"""
+        try:
+            self.websocket = await websockets.connect(
+                self.url,
+                ping_interval=self.ping_interval,
+                ping_timeout=self.ping_timeout,
+                open_timeout=self.open_timeout
+            )
+            self._connected_at = time.monotonic()
+            self._stats['connects'] += 1
+            return True
+        except Exception as e:
+            self.websocket = None
+            self._attempts += 1
+            self._stats['failures'] += 1
+            logger.error(f"❌ Lỗi kết nối WebSocket: {e}")
+            return False
+
+    def next_delay(self) -> float:
+        """Thời gian chờ trước lần kết nối tiếp theo (full jitter: ngẫu nhiên trong [0, backoff])"""
+        backoff = min(self.backoff_max, self.backoff_initial * self.backoff_factor ** max(0, self._attempts - 1))
+        return random.uniform(0, backoff)
+
+    def connection_lost(self):
+        """Ghi nhận mất kết nối; kết nối đã ổn định thì lần thử lại đầu tiên gần như ngay lập tức"""
+        if self._connected_at is not None and time.monotonic() - self._connected_at >= self.stable_after:
+            self._attempts = 0
+        else:
+            self._attempts += 1
+        self._connected_at = None
+
+    async def recv(self) -> Payload:
+        """Chờ tin nhắn tiếp theo (không polling); ConnectionClosed khi mất kết nối hoặc server không trả pong"""
+        return await self.websocket.recv()
+
+    async def send(self, payload: Payload, buffer: bool = False) -> bool:
+        """Gửi tin nhắn; với buffer=True, tin nhắn được giữ lại khi mất kết nối để gửi sau khi kết nối lại.
+
+        Trả về True nếu đã gửi hoặc đã đưa vào bộ đệm, False nếu không gửi được.
+        """
+        if not buffer:
+            # Tin nhắn tức thời (flowControl, queued...): mất kết nối thì bỏ qua
+            if not self.connected:
+                return False
+            try:
+                await self.websocket.send(payload)
+                return True
+            except websockets.exceptions.ConnectionClosed:
+                return False
+
+        if self.connected and not self._buffer:
+            try:
+                await self.websocket.send(payload)
+                return True
+            except websockets.exceptions.ConnectionClosed:
+                pass
+
+        self._append(payload)
+        if self.connected:
+            # Còn tin nhắn cũ trong bộ đệm: gửi theo đúng thứ tự
+            await self.flush()
+        return True
+
+    def _append(self, payload: Payload):
+        self._buffer.append(payload)
+        self._buffered_bytes += len(payload)
+        self._stats['buffered'] += 1
+        # Bộ đệm đầy: bỏ tin nhắn cũ nhất
+        while len(self._buffer) > 1 and (
+            len(self._buffer) > self.max_buffered_messages or self._buffered_bytes > self.max_buffered_bytes
+        ):
+            dropped = self._buffer.popleft()
+            self._buffered_bytes -= len(dropped)
+            self._stats['dropped'] += 1
+            logger.warning(f"⚠️ Bộ đệm gửi đầy, bỏ tin nhắn cũ ({len(dropped)} bytes)")
+
+    async def flush(self) -> int:
+        """Gửi lần lượt các tin nhắn trong bộ đệm; dừng lại (giữ nguyên phần còn lại) nếu mất kết nối"""
+        sent = 0
+        async with self._get_flush_lock():
+            while self._buffer and self.connected:
+                payload = self._buffer[0]
+                try:
+                    await self.websocket.send(payload)
+                except websockets.exceptions.ConnectionClosed:
+                    break
+                # Trong lúc chờ gửi, tin nhắn có thể đã bị bỏ do bộ đệm đầy
+                if self._buffer and self._buffer[0] is payload:
+                    self._buffer.popleft()
+                    self._buffered_bytes -= len(payload)
+                sent += 1
+        if sent:
+            self._stats['flushed'] += sent
+            logger.info(f"📤 Đã gửi lại {sent} tin nhắn trong bộ đệm")
+        return sent
+
+    async def close(self):
+        websocket, self.websocket = self.websocket, None
+        if websocket is not None:
+            await websocket.close()
+
+    def stats(self) -> Dict[str, Any]:
+        stats = dict(self._stats)
+        stats.update({
+            'connected': self.connected,
+            'pendingMessages': len(self._buffer),
+            'pendingBytes': self._buffered_bytes
+        })
+        return stats
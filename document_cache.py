@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Document Cache
+Cache tài liệu đã decode theo hash nội dung (SHA-256), giới hạn dung lượng, loại bỏ theo LRU
+"""
+
+import hashlib
+import threading
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, NamedTuple, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+BytesLike = Union[bytes, bytearray, memoryview]
+
+
+class CachedDocument(NamedTuple):
+    data: BytesLike
+    content_type: str
+
+
+class DocumentCache:
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, max_document_bytes: Optional[int] = None):
+        self.max_bytes = max_bytes
+        # Tài liệu quá lớn sẽ đẩy hết các tài liệu khác ra, không cache
+        self.max_document_bytes = max_document_bytes if max_document_bytes is not None else max_bytes // 4
+        self._entries: 'OrderedDict[str, CachedDocument]' = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    @staticmethod
+    def compute_hash(data: BytesLike) -> str:
+        """Hash nội dung tài liệu (SHA-256 dạng hex)"""
+        return hashlib.sha256(data).hexdigest()
+
+    def put(self, data: BytesLike, content_type: str, doc_hash: Optional[str] = None) -> str:
+        """Lưu tài liệu vào cache, trả về hash"""
+        if doc_hash is None:
+            doc_hash = self.compute_hash(data)
+        size = len(data)
+        if size > self.max_document_bytes:
+            return doc_hash
+
+        with self._lock:
+            existing = self._entries.pop(doc_hash, None)
+            if existing is not None:
+                self._total_bytes -= len(existing.data)
+            self._entries[doc_hash] = CachedDocument(data, content_type)
+            self._total_bytes += size
+
+            while self._total_bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._total_bytes -= len(evicted.data)
+                self._stats['evictions'] += 1
+
+        return doc_hash
+
+    def get(self, doc_hash: str) -> Optional[CachedDocument]:
+        """Lấy tài liệu theo hash, đánh dấu vừa dùng"""
+        with self._lock:
+            entry = self._entries.get(doc_hash)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(doc_hash)
+            self._stats['hits'] += 1
+            return entry
+
+    def __contains__(self, doc_hash: str) -> bool:
+        with self._lock:
+            return doc_hash in self._entries
+
+    def clear(self):
+        """Xóa toàn bộ cache"""
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Thống kê hit/miss và dung lượng cache"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['bytes'] = self._total_bytes
+        return stats
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Document Preparer
+Chạy phần chuẩn bị tài liệu tốn CPU (decode base64, render HTML, raster hình ảnh) trong process pool riêng
+để không tranh GIL với event loop; tài liệu lớn được chuyển qua shared memory, tài liệu nhỏ xử lý ngay
+"""
+
+import asyncio
+import binascii
+import hashlib
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple, Union
+
+from html_renderer import HTMLRendererPool
+
+logger = logging.getLogger(__name__)
+
+BytesLike = Union[bytes, bytearray, memoryview]
+PrepareFunc = Callable[[Union[str, BytesLike], Dict[str, Any]], Any]
+
+# Dưới ngưỡng này chi phí IPC lớn hơn phần việc: xử lý ngay trong process hiện tại
+DEFAULT_INLINE_THRESHOLD = 256 * 1024
+
+# Từ ngưỡng này dữ liệu đầu vào được đặt vào shared memory thay vì pickle qua pipe
+DEFAULT_SHARED_MEMORY_THRESHOLD = 1024 * 1024
+
+
+class SharedPayload(NamedTuple):
+    name: str
+    size: int
+
+
+# Renderer HTML riêng của mỗi worker process (tạo và làm nóng khi worker khởi động)
+_worker_html_renderer: Optional[HTMLRendererPool] = None
+
+
+def _get_worker_html_renderer() -> HTMLRendererPool:
+    global _worker_html_renderer
+    if _worker_html_renderer is None:
+        _worker_html_renderer = HTMLRendererPool(size=1)
+        _worker_html_renderer.warm_up()
+    return _worker_html_renderer
+
+
+def _init_worker():
+    _get_worker_html_renderer()
+
+
+def decode_document(content: Union[str, BytesLike], options: Dict[str, Any]) -> Tuple[bytes, str]:
+    """Decode data URL base64, trả về (dữ liệu, hash SHA-256)"""
+    if isinstance(content, str):
+        comma = content.index(',', 0, 100)
+    else:
+        comma = bytes(content[:100]).index(b',')
+    # a2b_base64 đọc thẳng từ chuỗi/buffer (kể cả shared memory), không tạo bản sao trung gian
+    data = binascii.a2b_base64(content[comma + 1:])
+    return data, hashlib.sha256(data).hexdigest()
+
+
+def render_html(content: Union[str, BytesLike], options: Dict[str, Any]) -> bytes:
+    """Render HTML thành văn bản bằng renderer của worker"""
+    if not isinstance(content, str):
+        content = str(content, 'utf-8')
+    text = _get_worker_html_renderer().render(content, options.get('line_width'))
+    return text.encode(options.get('encoding', 'utf-8'))
+
+
+def _attach_shared_memory(name: str) -> shared_memory.SharedMemory:
+    try:
+        # Python 3.13+: process gửi dữ liệu chịu trách nhiệm unlink
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+def _run_task(func: PrepareFunc, payload: Union[str, BytesLike, SharedPayload], options: Dict[str, Any]) -> Any:
+    """Chạy trong worker: gắn shared memory (nếu có) rồi gọi hàm chuẩn bị"""
+    if not isinstance(payload, SharedPayload):
+        return func(payload, options)
+
+    shm = _attach_shared_memory(payload.name)
+    try:
+        view = shm.buf[:payload.size]
+        try:
+            return func(view, options)
+        finally:
+            view.release()
+    finally:
+        shm.close()
+
+
+class DocumentPreparer:
+    def __init__(self, max_workers: Optional[int] = None,
+                 inline_threshold: int = DEFAULT_INLINE_THRESHOLD,
+                 shared_memory_threshold: int = DEFAULT_SHARED_MEMORY_THRESHOLD):
+        # Chừa một core cho event loop và thread gửi dữ liệu tới máy in
+        self.max_workers = max_workers or max(1, min(4, (os.cpu_count() or 2) - 1))
+        self.inline_threshold = inline_threshold
+        self.shared_memory_threshold = shared_memory_threshold
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        # Không tạo được process (môi trường bị giới hạn): dùng thread pool
+        self._disabled = False
+
+    def should_offload(self, content: Union[str, BytesLike, None]) -> bool:
+        """Tài liệu đủ lớn để đáng chuyển sang process pool"""
+        return content is not None and len(content) >= self.inline_threshold
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    # spawn giống Windows và không fork process đang có nhiều thread
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker
+                )
+                logger.info(f"Đã khởi tạo process pool chuẩn bị tài liệu ({self.max_workers} worker)")
+            return self._executor
+
+    def _reset_executor(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _share(self, content: Union[str, BytesLike]) -> Tuple[shared_memory.SharedMemory, SharedPayload]:
+        """Chép dữ liệu vào shared memory một lần; worker đọc trực tiếp không qua pipe"""
+        data = content.encode('utf-8') if isinstance(content, str) else content
+        size = len(data)
+        shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        shm.buf[:size] = data
+        return shm, SharedPayload(shm.name, size)
+
+    async def run(self, func: PrepareFunc, content: Union[str, BytesLike], options: Optional[Dict[str, Any]] = None,
+                  inline: Optional[PrepareFunc] = None) -> Any:
+        """Chạy hàm chuẩn bị: tài liệu nhỏ chạy ngay (bằng inline nếu có), tài liệu lớn chạy trong process pool.
+
+        func phải là hàm cấp module (pickle được) và nhận (content, options).
+        """
+        if options is None:
+            options = {}
+        if not self.should_offload(content):
+            return (inline or func)(content, options)
+
+        loop = asyncio.get_event_loop()
+        if self._disabled:
+            return await loop.run_in_executor(None, func, content, options)
+
+        shm = None
+        try:
+            payload: Union[str, BytesLike, SharedPayload] = content
+            if len(content) >= self.shared_memory_threshold:
+                shm, payload = self._share(content)
+
+            try:
+                future = loop.run_in_executor(self._get_executor(), _run_task, func, payload, options)
+            except Exception as e:
+                logger.warning(f"Không dùng được process pool, chuẩn bị tài liệu bằng thread: {e}")
+                self._disabled = True
+                self._reset_executor()
+                return await loop.run_in_executor(None, func, content, options)
+
+            try:
+                return await future
+            except BrokenProcessPool as e:
+                # Worker bị dừng đột ngột: tạo lại pool cho job sau, job này chạy bằng thread
+                logger.warning(f"Process pool chuẩn bị tài liệu bị lỗi, chạy lại bằng thread: {e}")
+                self._reset_executor()
+                return await loop.run_in_executor(None, func, content, options)
+        finally:
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+
+    def shutdown(self):
+        """Dừng process pool"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+HTML Renderer
+Render HTML dạng hóa đơn/nhãn đơn giản thành văn bản sẵn sàng gửi máy in, chạy trong process (thuần Python)
+"""
+
+import logging
+import queue
+import re
+import textwrap
+from html.parser import HTMLParser
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Độ rộng dòng mặc định (ký tự) cho giấy in nhiệt 80mm
+DEFAULT_LINE_WIDTH = 48
+
+BLOCK_TAGS = {
+    'p', 'div', 'section', 'article', 'header', 'footer', 'main',
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'ul', 'ol', 'li', 'table',
+    'thead', 'tbody', 'tfoot', 'center', 'pre', 'blockquote', 'body', 'html'
+}
+SKIP_TAGS = {'head', 'script', 'style', 'title', 'template'}
+VOID_TAGS = {'br', 'hr', 'img', 'meta', 'link', 'input'}
+
+_WHITESPACE = re.compile(r'\s+')
+_TEXT_ALIGN = re.compile(r'text-align\s*:\s*(left|center|right)', re.IGNORECASE)
+
+
+class TextHTMLRenderer(HTMLParser):
+    """Chuyển HTML thành các dòng văn bản có căn lề theo độ rộng giấy"""
+
+    def __init__(self, width: int = DEFAULT_LINE_WIDTH):
+        super().__init__(convert_charrefs=True)
+        self.width = width
+        self._reset_state()
+
+    def _reset_state(self):
+        self._lines: List[str] = []
+        self._inline: List[str] = []
+        self._align_stack: List[Optional[str]] = []
+        self._skip_depth = 0
+        self._pre_depth = 0
+        self._row: Optional[List[str]] = None
+        self._cell: Optional[List[str]] = None
+
+    def render(self, html: str, width: Optional[int] = None) -> str:
+        """Render một tài liệu HTML; renderer được tái sử dụng giữa các job"""
+        self.reset()
+        self._reset_state()
+        if width:
+            self.width = width
+        self.feed(html)
+        self.close()
+        self._flush_inline()
+        # Bỏ dòng trống thừa ở đầu và cuối
+        while self._lines and not self._lines[0].strip():
+            self._lines.pop(0)
+        while self._lines and not self._lines[-1].strip():
+            self._lines.pop()
+        return '\n'.join(self._lines) + '\n'
+
+    def _current_align(self) -> Optional[str]:
+        for align in reversed(self._align_stack):
+            if align:
+                return align
+        return None
+
+    def _tag_align(self, tag: str, attrs) -> Optional[str]:
+        if tag == 'center':
+            return 'center'
+        attrs = dict(attrs)
+        align = attrs.get('align')
+        if align:
+            return align.lower()
+        match = _TEXT_ALIGN.search(attrs.get('style') or '')
+        return match.group(1).lower() if match else None
+
+    def _emit(self, text: str, align: Optional[str] = None):
+        """Ghi một đoạn văn bản thành các dòng đã ngắt và căn lề"""
+        if self._pre_depth:
+            self._lines.extend(text.split('\n'))
+            return
+        wrapped = textwrap.wrap(text, self.width) or ['']
+        for line in wrapped:
+            if align == 'center':
+                line = line.center(self.width).rstrip()
+            elif align == 'right':
+                line = line.rjust(self.width)
+            self._lines.append(line)
+
+    def _flush_inline(self):
+        text = ''.join(self._inline)
+        self._inline = []
+        if not self._pre_depth:
+            text = text.strip()
+        if text:
+            self._emit(text, self._current_align())
+
+    def _format_row(self, cells: List[str]) -> str:
+        """Căn cột cho một hàng bảng: cột đầu căn trái, các cột sau căn phải"""
+        if not cells:
+            return ''
+        if len(cells) == 1:
+            return cells[0][:self.width]
+        if len(cells) == 2:
+            left, right = cells
+            space = self.width - len(right) - 1
+            return left[:max(space, 0)].ljust(max(space, 0)) + ' ' + right
+        first_width = self.width - (len(cells) - 1) * (self.width // (len(cells) + 1))
+        other_width = self.width // (len(cells) + 1)
+        parts = [cells[0][:first_width - 1].ljust(first_width)]
+        parts.extend(cell[:other_width].rjust(other_width) for cell in cells[1:])
+        return ''.join(parts)[:self.width]
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self._skip_depth += 1
+            return
+        if self._skip_depth:
+            return
+
+        if tag == 'br':
+            if self._cell is not None:
+                self._cell.append(' ')
+            else:
+                self._flush_inline()
+            return
+        if tag == 'hr':
+            self._flush_inline()
+            self._lines.append('-' * self.width)
+            return
+        if tag == 'tr':
+            self._flush_inline()
+            self._row = []
+            return
+        if tag in ('td', 'th'):
+            self._cell = []
+            return
+        if tag in BLOCK_TAGS:
+            self._flush_inline()
+            if tag == 'pre':
+                self._pre_depth += 1
+            if tag not in VOID_TAGS:
+                self._align_stack.append(self._tag_align(tag, attrs))
+            if tag == 'li':
+                self._inline.append('- ')
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+            return
+        if self._skip_depth:
+            return
+
+        if tag in ('td', 'th'):
+            if self._cell is not None and self._row is not None:
+                self._row.append(_WHITESPACE.sub(' ', ''.join(self._cell)).strip())
+            self._cell = None
+            return
+        if tag == 'tr':
+            if self._row is not None:
+                self._emit_row(self._row)
+            self._row = None
+            return
+        if tag in BLOCK_TAGS:
+            self._flush_inline()
+            if tag == 'pre':
+                self._pre_depth = max(0, self._pre_depth - 1)
+            if self._align_stack:
+                self._align_stack.pop()
+            if tag in ('p', 'h1', 'h2', 'h3', 'table'):
+                self._lines.append('')
+
+    def _emit_row(self, cells: List[str]):
+        line = self._format_row(cells)
+        align = self._current_align() if len(cells) == 1 else None
+        if align == 'center':
+            line = line.center(self.width).rstrip()
+        elif align == 'right':
+            line = line.rjust(self.width)
+        self._lines.append(line)
+
+    def handle_data(self, data):
+        if self._skip_depth:
+            return
+        if self._cell is not None:
+            self._cell.append(data)
+            return
+        if self._pre_depth:
+            self._inline.append(data)
+        else:
+            self._inline.append(_WHITESPACE.sub(' ', data))
+
+
+class HTMLRendererPool:
+    """Pool renderer dùng lại giữa các job, khởi tạo và làm nóng sẵn khi khởi động"""
+
+    WARM_UP_HTML = (
+        '<html><head><style>p{}</style></head><body><center><h1>Warm up</h1></center>'
+        '<table><tr><td>Item</td><td>1</td><td>0</td></tr></table><hr><p>&nbsp;</p></body></html>'
+    )
+
+    def __init__(self, size: int = 2, width: int = DEFAULT_LINE_WIDTH):
+        self.size = size
+        self.width = width
+        self._pool: 'queue.LifoQueue[TextHTMLRenderer]' = queue.LifoQueue()
+        self._created = 0
+
+    def warm_up(self):
+        """Tạo sẵn renderer và render thử một lần để nạp sẵn code path"""
+        while self._created < self.size:
+            renderer = TextHTMLRenderer(self.width)
+            renderer.render(self.WARM_UP_HTML)
+            self._created += 1
+            self._pool.put(renderer)
+        logger.debug(f"Đã làm nóng {self.size} HTML renderer")
+
+    def render(self, html: str, width: Optional[int] = None) -> str:
+        """Render HTML bằng một renderer trong pool (an toàn giữa các thread)"""
+        try:
+            renderer = self._pool.get_nowait()
+        except queue.Empty:
+            # Pool đang bận hết: tạo renderer tạm, không giữ lại
+            renderer = TextHTMLRenderer(self.width)
+        try:
+            return renderer.render(html, width or self.width)
+        finally:
+            renderer.width = self.width
+            if self._pool.qsize() < self.size:
+                self._pool.put(renderer)
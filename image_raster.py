@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Image Raster
+Chuyển hình ảnh thành lệnh raster ESC/POS (GS v 0) cho máy in nhiệt/nhãn: scale theo DPI và khổ giấy,
+dither 1-bit bằng NumPy (vector hóa), cache kết quả theo hash ảnh và kích thước đích
+"""
+
+import io
+import logging
+from typing import Any, Dict, Optional, Union
+
+from document_cache import DocumentCache
+
+logger = logging.getLogger(__name__)
+
+BytesLike = Union[bytes, bytearray, memoryview]
+
+# Máy in nhiệt 80mm: vùng in 72mm ở 203 DPI (576 chấm)
+DEFAULT_DPI = 203
+DEFAULT_PRINTABLE_WIDTH_MM = 72.0
+
+# Số dòng chấm tối đa mỗi lệnh GS v 0 (nhiều máy in giới hạn chiều cao một ảnh raster)
+DEFAULT_BAND_HEIGHT = 256
+
+DITHER_MODES = ('bayer', 'floyd', 'threshold')
+
+# Ma trận Bayer 8x8 cho ordered dithering
+BAYER_8X8 = (
+    (0, 32, 8, 40, 2, 34, 10, 42),
+    (48, 16, 56, 24, 50, 18, 58, 26),
+    (12, 44, 4, 36, 14, 46, 6, 38),
+    (60, 28, 52, 20, 62, 30, 54, 22),
+    (3, 35, 11, 43, 1, 33, 9, 41),
+    (51, 19, 59, 27, 49, 17, 57, 25),
+    (15, 47, 7, 39, 13, 45, 5, 37),
+    (63, 31, 55, 23, 61, 29, 53, 21)
+)
+
+
+class ImageRasterError(Exception):
+    pass
+
+
+def _import_backends():
+    """Import numpy và Pillow khi cần (thư viện tùy chọn)"""
+    try:
+        import numpy as np
+        from PIL import Image, ImageOps
+    except ImportError as e:
+        raise ImageRasterError(f"Cần cài numpy và Pillow để raster hình ảnh: {e}")
+    return np, Image, ImageOps
+
+
+def is_available() -> bool:
+    """Kiểm tra numpy và Pillow đã được cài"""
+    try:
+        _import_backends()
+        return True
+    except ImageRasterError:
+        return False
+
+
+def target_width(options: Dict[str, Any]) -> int:
+    """Độ rộng vùng in tính bằng chấm (bội số của 8)"""
+    if options.get('width_px'):
+        width = int(options['width_px'])
+        return max(8, width - width % 8)
+    dpi = float(options.get('dpi', DEFAULT_DPI))
+    width_mm = float(options.get('paper_width_mm', DEFAULT_PRINTABLE_WIDTH_MM))
+    # 203 DPI là 8 chấm/mm: làm tròn tới bội số gần nhất của 8 (72mm -> 576 chấm)
+    return max(8, round(width_mm / 25.4 * dpi / 8) * 8)
+
+
+def _to_bitmap(image_bytes: BytesLike, options: Dict[str, Any]):
+    """Decode, scale và dither ảnh thành mảng bool (True là chấm đen)"""
+    np, Image, ImageOps = _import_backends()
+
+    dither = options.get('dither', 'bayer')
+    if dither not in DITHER_MODES:
+        raise ImageRasterError(f"Kiểu dither không hỗ trợ: {dither}")
+
+    image = Image.open(io.BytesIO(image_bytes))
+    image = ImageOps.exif_transpose(image)
+
+    # Nền trong suốt được in như giấy trắng
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGBA', image.size, (255, 255, 255, 255))
+        image = Image.alpha_composite(background, image)
+    image = image.convert('L')
+
+    # Chỉ thu nhỏ ảnh rộng hơn khổ giấy, trừ khi yêu cầu fit_width
+    width = target_width(options)
+    if image.width > width or (options.get('fit_width') and image.width != width):
+        height = max(1, round(image.height * width / image.width))
+        image = image.resize((width, height), Image.LANCZOS)
+
+    if dither == 'floyd':
+        # Floyd-Steinberg có phụ thuộc tuần tự giữa các pixel: dùng bản cài đặt C của Pillow
+        return np.asarray(image.convert('1')) == 0
+
+    pixels = np.asarray(image, dtype=np.uint8)
+    if dither == 'threshold':
+        return pixels < int(options.get('threshold', 128))
+
+    matrix = (np.array(BAYER_8X8, dtype=np.float32) + 0.5) * (255.0 / 64.0)
+    rows, cols = pixels.shape
+    thresholds = np.tile(matrix, (rows // 8 + 1, cols // 8 + 1))[:rows, :cols]
+    return pixels < thresholds
+
+
+def _encode_escpos(bits, band_height: int) -> bytes:
+    """Đóng gói bitmap thành các lệnh GS v 0, mỗi lệnh tối đa band_height dòng"""
+    np, _, _ = _import_backends()
+
+    # Mỗi byte chứa 8 chấm, bit cao là chấm bên trái; hàng được đệm 0 (trắng) tới bội số của 8
+    packed = np.packbits(bits, axis=1)
+    rows, width_bytes = packed.shape
+    parts = []
+    for start in range(0, rows, band_height):
+        band = packed[start:start + band_height]
+        height = band.shape[0]
+        parts.append(bytes((
+            0x1D, 0x76, 0x30, 0x00,
+            width_bytes & 0xFF, width_bytes >> 8,
+            height & 0xFF, height >> 8
+        )))
+        parts.append(band.tobytes())
+    return b''.join(parts)
+
+
+def rasterize_image(image_bytes: BytesLike, options: Dict[str, Any],
+                    band_height: int = DEFAULT_BAND_HEIGHT) -> bytes:
+    """Chuyển hình ảnh thành lệnh raster ESC/POS (không cache, chạy được trong process pool)"""
+    bits = _to_bitmap(image_bytes, options)
+    data = _encode_escpos(bits, band_height)
+    logger.debug(f"Đã raster hình ảnh {bits.shape[1]}x{bits.shape[0]} chấm ({len(data)} bytes)")
+    return data
+
+
+class ImageRasterizer:
+    def __init__(self, cache_bytes: int = 16 * 1024 * 1024, band_height: int = DEFAULT_BAND_HEIGHT):
+        self.band_height = band_height
+        # Cache lệnh raster đã tạo: logo in lặp lại không phải decode/scale/dither lại
+        self.cache = DocumentCache(max_bytes=cache_bytes)
+
+    @staticmethod
+    def cache_key(image_hash: str, options: Dict[str, Any]) -> str:
+        return ':'.join((
+            image_hash,
+            str(target_width(options)),
+            options.get('dither', 'bayer'),
+            str(options.get('threshold', 128)),
+            '1' if options.get('fit_width') else '0'
+        ))
+
+    def lookup(self, image_hash: str, options: Dict[str, Any]) -> Optional[BytesLike]:
+        """Lấy lệnh raster đã cache cho ảnh với cùng kích thước đích"""
+        cached = self.cache.get(self.cache_key(image_hash, options))
+        return cached.data if cached is not None else None
+
+    def remember(self, image_hash: str, options: Dict[str, Any], data: BytesLike):
+        self.cache.put(data, 'raw', doc_hash=self.cache_key(image_hash, options))
+
+    def rasterize(self, image_bytes: BytesLike, options: Optional[Dict[str, Any]] = None,
+                  image_hash: Optional[str] = None) -> BytesLike:
+        """Trả về lệnh raster ESC/POS cho hình ảnh, dùng cache nếu đã tạo với cùng kích thước đích"""
+        if options is None:
+            options = {}
+        if image_hash is None:
+            image_hash = DocumentCache.compute_hash(image_bytes)
+
+        data = self.lookup(image_hash, options)
+        if data is None:
+            data = rasterize_image(image_bytes, options, self.band_height)
+            self.remember(image_hash, options, data)
+        return data
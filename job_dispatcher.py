@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Job Dispatcher
+Điều phối job in chạy đồng thời: song song giữa các máy in; trong từng máy in xếp hàng theo
+độ ưu tiên và chia đều (weighted fair queueing) giữa các client gửi job
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+JobFactory = Callable[[], Awaitable[Any]]
+
+# Trọng số của từng lớp ưu tiên: lớp trọng số cao được phục vụ nhiều hơn nhưng lớp thấp không bị bỏ đói
+PRIORITY_WEIGHTS = {
+    'interactive': 16.0,
+    'normal': 4.0,
+    'bulk': 1.0,
+    'test': 1.0
+}
+DEFAULT_PRIORITY = 'normal'
+
+# Thời gian ước lượng cho một đơn vị cost khi làn chưa chạy job nào
+DEFAULT_SECONDS_PER_COST = 1.0
+
+
+class QueuedJob(NamedTuple):
+    finish: float
+    seq: int
+    start: float
+    flow: Tuple[str, str]
+    cost: float
+    job: JobFactory
+    future: asyncio.Future
+
+
+class FairQueue:
+    """Hàng đợi của một làn máy in theo start-time fair queueing.
+
+    Mỗi luồng (clientId, lớp ưu tiên) có thẻ kết thúc ảo tăng dần theo cost / trọng số; job có thẻ nhỏ nhất
+    chạy trước. Job trong cùng một luồng giữ thứ tự FIFO, luồng mới (ví dụ một hóa đơn) không phải chờ
+    sau toàn bộ job của luồng đang dồn nhiều job.
+    """
+
+    def __init__(self, client_weights: Optional[Dict[str, float]] = None):
+        self.client_weights = client_weights or {}
+        self._heap: List[QueuedJob] = []
+        self._seq = itertools.count()
+        self._virtual_time = 0.0
+        self._flow_finish: Dict[Tuple[str, str], float] = {}
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def push(self, job: JobFactory, future: asyncio.Future, client_id: str = '',
+             priority: str = DEFAULT_PRIORITY, cost: float = 1.0) -> QueuedJob:
+        weight = PRIORITY_WEIGHTS.get(priority, PRIORITY_WEIGHTS[DEFAULT_PRIORITY])
+        weight *= self.client_weights.get(client_id, 1.0)
+        flow = (client_id, priority)
+        start = max(self._virtual_time, self._flow_finish.get(flow, 0.0))
+        finish = start + max(cost, 0.0) / weight
+        self._flow_finish[flow] = finish
+        entry = QueuedJob(finish, next(self._seq), start, flow, cost, job, future)
+        heapq.heappush(self._heap, entry)
+        return entry
+
+    def pop(self) -> QueuedJob:
+        entry = heapq.heappop(self._heap)
+        self._virtual_time = max(self._virtual_time, entry.start)
+        # Bỏ luồng đã hết job để bảng không lớn dần
+        for flow in [flow for flow, finish in self._flow_finish.items() if finish <= self._virtual_time]:
+            del self._flow_finish[flow]
+        return entry
+
+    def ahead_of(self, entry: QueuedJob) -> Tuple[int, float]:
+        """Số job và tổng cost xếp trước một job"""
+        count = 0
+        cost = 0.0
+        for other in self._heap:
+            if other < entry:
+                count += 1
+                cost += other.cost
+        return count, cost
+
+    def drain(self) -> Iterator[QueuedJob]:
+        while self._heap:
+            yield heapq.heappop(self._heap)
+        self._flow_finish.clear()
+
+
+class JobDispatcher:
+    def __init__(self, max_concurrent: int = 4, client_weights: Optional[Dict[str, float]] = None):
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.client_weights = client_weights or {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._lanes: Dict[str, FairQueue] = {}
+        self._workers: Dict[str, asyncio.Task] = {}
+        self._free_tasks: Set[asyncio.Task] = set()
+        # Job đang chờ trong làn (để báo vị trí hàng đợi) và job đang chạy của từng làn
+        self._queued: Dict[asyncio.Future, Tuple[str, QueuedJob]] = {}
+        self._running: Dict[str, Tuple[float, float]] = {}
+        # Thời gian chạy trung bình cho một đơn vị cost của từng làn (EWMA)
+        self._seconds_per_cost: Dict[str, float] = {}
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        """Tạo semaphore trong event loop đang chạy"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        return self._semaphore
+
+    def submit(self, lane: Optional[str], job: JobFactory, client_id: Optional[str] = None,
+               priority: Optional[str] = None, cost: float = 1.0) -> asyncio.Future:
+        """Đưa job vào làn của máy in theo độ ưu tiên và client gửi; lane=None chạy ngay, không xếp hàng"""
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+
+        if lane is None:
+            task = loop.create_task(self._run_job(job, future))
+            self._free_tasks.add(task)
+            task.add_done_callback(self._free_tasks.discard)
+            return future
+
+        queue = self._lanes.get(lane)
+        if queue is None:
+            queue = self._lanes[lane] = FairQueue(self.client_weights)
+        entry = queue.push(job, future, client_id or '', priority or DEFAULT_PRIORITY, cost)
+        self._queued[future] = (lane, entry)
+
+        if lane not in self._workers:
+            self._workers[lane] = loop.create_task(self._lane_worker(lane))
+
+        return future
+
+    def queue_status(self, future: asyncio.Future) -> Optional[Dict[str, Any]]:
+        """Vị trí trong hàng đợi và thời gian chờ ước lượng (giây) của job chưa chạy"""
+        queued = self._queued.get(future)
+        if queued is None:
+            return None
+        lane, entry = queued
+        position, cost_ahead = self._lanes[lane].ahead_of(entry)
+
+        seconds_per_cost = self._seconds_per_cost.get(lane, DEFAULT_SECONDS_PER_COST)
+        expected_wait = cost_ahead * seconds_per_cost
+        running = self._running.get(lane)
+        if running is not None:
+            running_cost, started = running
+            position += 1
+            expected_wait += max(0.0, running_cost * seconds_per_cost - (time.monotonic() - started))
+
+        return {
+            'queuePosition': position,
+            'expectedWait': round(expected_wait, 1)
+        }
+
+    async def _lane_worker(self, lane: str):
+        """Chạy lần lượt các job trong một làn cho tới khi làn rỗng"""
+        queue = self._lanes[lane]
+        try:
+            while queue:
+                # Chọn job sau khi có slot để job ưu tiên đến muộn vẫn được xét
+                async with self._get_semaphore():
+                    if not queue:
+                        break
+                    entry = queue.pop()
+                    self._queued.pop(entry.future, None)
+                    await self._run_job(entry.job, entry.future, lane, entry.cost)
+        finally:
+            self._workers.pop(lane, None)
+            if not queue:
+                self._lanes.pop(lane, None)
+
+    async def _run_job(self, job: JobFactory, future: asyncio.Future, lane: Optional[str] = None, cost: float = 1.0):
+        """Chạy một job, ghi nhận thời gian chạy của làn để ước lượng thời gian chờ"""
+        if future.cancelled():
+            return
+        started = time.monotonic()
+        if lane is not None:
+            self._running[lane] = (cost, started)
+        try:
+            result = await job()
+            if not future.done():
+                future.set_result(result)
+        except asyncio.CancelledError:
+            if not future.done():
+                future.cancel()
+            raise
+        except Exception as e:
+            logger.error(f"❌ Lỗi khi chạy job: {e}")
+            if not future.done():
+                future.set_exception(e)
+            # Tránh cảnh báo "exception was never retrieved" khi không ai chờ kết quả
+            future.exception()
+        finally:
+            if lane is not None:
+                self._running.pop(lane, None)
+                sample = (time.monotonic() - started) / max(cost, 1e-6)
+                average = self._seconds_per_cost.get(lane)
+                self._seconds_per_cost[lane] = sample if average is None else average + 0.2 * (sample - average)
+
+    def pending_count(self, lane: Optional[str] = None) -> int:
+        """Số job đang chờ trong một làn (hoặc tất cả các làn)"""
+        if lane is not None:
+            return len(self._lanes.get(lane, ()))
+        return sum(len(queue) for queue in self._lanes.values())
+
+    def queue_depths(self) -> Dict[str, int]:
+        """Số job đang chờ của từng làn"""
+        return {lane: len(queue) for lane, queue in self._lanes.items()}
+
+    def in_flight(self) -> Dict[Optional[str], int]:
+        """Số job đang chạy của từng làn; job không xếp hàng (lane=None) tính chung"""
+        running: Dict[Optional[str], int] = {lane: 1 for lane in self._running}
+        if self._free_tasks:
+            running[None] = len(self._free_tasks)
+        return running
+
+    def active_lanes(self) -> int:
+        """Số làn máy in đang có worker chạy"""
+        return len(self._workers)
+
+    async def cancel_all(self):
+        """Hủy toàn bộ job đang chờ và đang chạy"""
+        for queue in self._lanes.values():
+            for entry in queue.drain():
+                entry.future.cancel()
+        self._queued.clear()
+
+        tasks = list(self._workers.values()) + list(self._free_tasks)
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        self._lanes.clear()
+        self._workers.clear()
+        self._free_tasks.clear()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Job Results
+Ghi nhớ kết quả job theo jobId do bên gửi đặt (kèm clientId nếu có, để jobId của các client khác nhau không
+trùng nhau): job gửi lại (retry sau timeout, kết nối lại) nhận lại kết quả cũ
+thay vì in lần nữa; job trùng với job đang chạy chờ chung kết quả
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class JobResultCache:
+    def __init__(self, max_entries: int = 1000, ttl: float = 600.0):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = ttl
+        # khóa job (xem key()) -> (thời điểm xong, phản hồi), cũ nhất ở đầu
+        self._done: 'OrderedDict[Any, Tuple[float, Dict[str, Any]]]' = OrderedDict()
+        self._running: Dict[Any, asyncio.Future] = {}
+        self._stats = {'hits': 0, 'joined': 0}
+
+    @staticmethod
+    def is_valid_id(job_id: Any) -> bool:
+        return isinstance(job_id, (str, int)) and not isinstance(job_id, bool) and job_id != ''
+
+    @staticmethod
+    def key(job_id: Any, client_id: Any = None) -> Any:
+        """Khóa của job: (clientId, jobId) khi tin nhắn có clientId, chỉ jobId nếu không"""
+        if isinstance(client_id, str) and client_id:
+            return client_id, job_id
+        return job_id
+
+    def _expire(self):
+        deadline = time.monotonic() - self.ttl
+        while self._done:
+            job_id, (finished_at, _) = next(iter(self._done.items()))
+            if finished_at > deadline and len(self._done) <= self.max_entries:
+                break
+            del self._done[job_id]
+
+    def get(self, job_id: Any) -> Optional[Dict[str, Any]]:
+        """Phản hồi của job đã xong (còn hạn) hoặc None"""
+        self._expire()
+        entry = self._done.get(job_id)
+        if entry is None:
+            return None
+        self._stats['hits'] += 1
+        return entry[1]
+
+    def running(self, job_id: Any) -> Optional[asyncio.Future]:
+        """Future nhận phản hồi của job đang chạy (None nếu job bị hủy) để job trùng chờ chung"""
+        future = self._running.get(job_id)
+        if future is not None:
+            self._stats['joined'] += 1
+        return future
+
+    def start(self, job_id: Any):
+        if job_id not in self._running:
+            self._running[job_id] = asyncio.get_event_loop().create_future()
+
+    def finish(self, job_id: Any, response: Dict[str, Any]):
+        """Ghi nhận phản hồi của job; chỉ giữ job thành công để job lỗi gửi lại vẫn được in lại"""
+        future = self._running.pop(job_id, None)
+        if future is not None and not future.done():
+            future.set_result(response)
+        if response.get('success'):
+            self._done[job_id] = (time.monotonic(), response)
+            self._done.move_to_end(job_id)
+            self._expire()
+
+    def abandon(self, job_id: Any):
+        """Job kết thúc mà không có phản hồi (bị hủy, lỗi ngoài dự kiến)"""
+        future = self._running.pop(job_id, None)
+        if future is not None and not future.done():
+            future.set_result(None)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = dict(self._stats)
+        stats.update({'cached': len(self._done), 'running': len(self._running)})
+        return stats
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Logging Setup
+Ghi log không chặn event loop: các handler (file xoay vòng theo dung lượng, console) chạy trong thread riêng
+qua hàng đợi; bản ghi chỉ được format trong thread đó. Payload tin nhắn lớn được rút gọn và có thể lấy mẫu
+"""
+
+import atexit
+import logging
+import logging.handlers
+import multiprocessing
+import queue
+import random
+import re
+import sys
+from typing import Any, Optional
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# Số ký tự payload tối đa được ghi vào log
+DEFAULT_PAYLOAD_LIMIT = 300
+
+# Data URL base64 trong payload được thay bằng kích thước
+_DATA_URL = re.compile(r'data:([\w.+-]+/[\w.+-]+);base64,[A-Za-z0-9+/=]{64,}')
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[logging.Handler] = None
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler không format bản ghi trong thread gọi log: việc format dồn sang thread ghi log"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class PayloadSummary:
+    """Rút gọn payload khi (và chỉ khi) bản ghi log được format"""
+
+    __slots__ = ('payload', 'limit')
+
+    def __init__(self, payload: Any, limit: int = DEFAULT_PAYLOAD_LIMIT):
+        self.payload = payload
+        self.limit = limit
+
+    def __str__(self) -> str:
+        payload = self.payload
+        if isinstance(payload, (bytes, bytearray, memoryview)):
+            return f"<binary {len(payload)} bytes>"
+        # Tin nhắn dạng dict: rút gọn từng giá trị trước khi repr (không repr cả nội dung nhiều MB)
+        text = payload if isinstance(payload, str) else repr(_shorten(payload, self.limit))
+        size = len(text)
+        # Chỉ xét phần đầu: payload nhiều MB không bị quét toàn bộ
+        head = _DATA_URL.sub(
+            lambda m: f"data:{m.group(1)};base64,<{len(m.group(0))} ký tự>",
+            text[:self.limit * 4]
+        )
+        if len(head) > self.limit:
+            head = head[:self.limit]
+        if len(head) < size:
+            return f"{head}... ({size} ký tự)"
+        return head
+
+
+def _shorten(value: Any, limit: int) -> Any:
+    if isinstance(value, str) and len(value) > limit:
+        return f"{value[:limit]}... ({len(value)} ký tự)"
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return f"<binary {len(value)} bytes>"
+    if isinstance(value, dict):
+        return {key: _shorten(item, limit) for key, item in value.items()}
+    if isinstance(value, (list, tuple)) and len(value) > 10:
+        return [_shorten(item, limit) for item in value[:10]] + [f"... ({len(value)} phần tử)"]
+    return value
+
+
+def summarize_payload(payload: Any, limit: int = DEFAULT_PAYLOAD_LIMIT) -> PayloadSummary:
+    return PayloadSummary(payload, limit)
+
+
+class PayloadSampler:
+    """Chỉ ghi một phần log payload ở mức DEBUG (rate=1.0 ghi tất cả, 0.01 ghi 1%)"""
+
+    def __init__(self, rate: float = 1.0):
+        self.rate = rate
+
+    def __call__(self, logger: logging.Logger) -> bool:
+        if not logger.isEnabledFor(logging.DEBUG):
+            return False
+        return self.rate >= 1.0 or random.random() < self.rate
+
+
+payload_sampler = PayloadSampler()
+
+
+def setup_logging(level: int = logging.INFO, log_file: Optional[str] = 'websocket_client.log',
+                  max_bytes: int = 10 * 1024 * 1024, backup_count: int = 5,
+                  payload_sample_rate: Optional[float] = None,
+                  console: bool = True) -> Optional[logging.handlers.QueueListener]:
+    """Cấu hình root logger ghi qua hàng đợi; gọi lại lần nữa không tạo thêm handler.
+
+    Trong process con (worker của process pool) không làm gì: chỉ process chính ghi và xoay vòng file log.
+    """
+    global _listener, _queue_handler
+
+    if multiprocessing.parent_process() is not None:
+        return None
+
+    if payload_sample_rate is not None:
+        payload_sampler.rate = payload_sample_rate
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    if _listener is not None:
+        return _listener
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers = []
+    if log_file:
+        # Xoay vòng theo dung lượng: giữ backup_count file cũ, không để log lớn vô hạn
+        file_handler = logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8'
+        )
+        file_handler.setFormatter(formatter)
+        handlers.append(file_handler)
+    if console:
+        stream_handler = logging.StreamHandler(sys.stdout)
+        stream_handler.setFormatter(formatter)
+        handlers.append(stream_handler)
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    _queue_handler = _DeferredQueueHandler(log_queue)
+    root.addHandler(_queue_handler)
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    # Ghi nốt các bản ghi còn trong hàng đợi khi thoát
+    atexit.register(stop_logging)
+    return _listener
+
+
+def stop_logging():
+    """Dừng thread ghi log sau khi ghi hết các bản ghi đang chờ"""
+    global _listener, _queue_handler
+    listener, _listener = _listener, None
+    if _queue_handler is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        _queue_handler = None
+    if listener is not None:
+        listener.stop()
@@ -8,12 +8,15 @@ Kết nối với Node.js WebSocket Server
 import sys
 import os
 import asyncio
+import logging
+from logging_setup import setup_logging
 from websocket_print_client import WebSocketPrintClient
 
 async def main():
     """
     Entry point chính của ứng dụng
     """
+    setup_logging(level=logging.INFO, log_file='websocket_client.log')
     print("🖨️  WebSocket Print Client")
     print("🔌 Kết nối với Node.js WebSocket Server")
     print("🚀 Đang khởi động client...")
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Message Codec
+Mã hóa/giải mã tin nhắn WebSocket: dùng orjson hoặc ujson nếu có cài (nhanh hơn nhiều với payload base64 lớn),
+không có thì dùng json chuẩn. Tin nhắn print/printTest/getPrinters được kiểm tra một lần khi decode thành struct
+có kiểu; struct vẫn đọc được như dict (get, in) cho phần điều phối dùng chung với các loại tin nhắn khác
+"""
+
+import abc
+import json
+import logging
+from collections.abc import Mapping
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+BytesLike = Union[bytes, bytearray, memoryview]
+
+CONTENT_TYPES = ('text', 'raw', 'html', 'pdf', 'image')
+
+
+class MessageError(ValueError):
+    """Tin nhắn không parse được hoặc sai cấu trúc"""
+
+    def __init__(self, message: str, message_type: Optional[str] = None, job_id: Any = None):
+        super().__init__(message)
+        self.message_type = message_type
+        self.job_id = job_id
+
+
+def _select_engine():
+    """Chọn thư viện JSON nhanh nhất đang có: orjson > ujson > json"""
+    try:
+        import orjson
+
+        def dumps(obj: Any) -> str:
+            # orjson trả về bytes UTF-8; WebSocket text frame cần str
+            return orjson.dumps(obj).decode('utf-8')
+
+        return 'orjson', orjson.loads, dumps
+    except ImportError:
+        pass
+
+    try:
+        import ujson
+
+        def dumps(obj: Any) -> str:
+            return ujson.dumps(obj, ensure_ascii=False)
+
+        return 'ujson', ujson.loads, dumps
+    except ImportError:
+        pass
+
+    return 'json', json.loads, json.dumps
+
+
+ENGINE, _loads, _dumps = _select_engine()
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    try:
+        return _loads(data)
+    except ValueError as e:
+        raise MessageError(f"JSON không hợp lệ: {e}")
+
+
+def dumps(obj: Any) -> str:
+    return _dumps(obj)
+
+
+class Message(Mapping):
+    """Struct tin nhắn đã kiểm tra; đọc như dict gốc để dùng chung với dispatcher/admission"""
+
+    raw: Dict[str, Any]
+
+    def __getitem__(self, key: str) -> Any:
+        return self.raw[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.raw)
+
+    def __len__(self) -> int:
+        return len(self.raw)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.raw.get(key, default)
+
+
+def _optional_str(data: Dict[str, Any], key: str, message_type: str) -> Optional[str]:
+    value = data.get(key)
+    if value is not None and not isinstance(value, str):
+        raise MessageError(f"{key} phải là chuỗi", message_type, data.get('jobId'))
+    return value or None
+
+
+@dataclass(eq=False)
+class PrintMessage(Message):
+    content: Union[str, BytesLike]
+    printer: Optional[str]
+    options: Dict[str, Any]
+    job_id: Any = None
+    client_id: Optional[str] = None
+    raw: Dict[str, Any] = field(default_factory=dict, repr=False)
+
+    type = 'print'
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'PrintMessage':
+        job_id = data.get('jobId')
+        content = data.get('content', '')
+        if not isinstance(content, (str, bytes, bytearray, memoryview)):
+            raise MessageError('content phải là chuỗi', cls.type, job_id)
+        options = data.get('options')
+        if options is None:
+            options = {}
+        elif not isinstance(options, dict):
+            raise MessageError('options phải là object', cls.type, job_id)
+        content_type = options.get('content_type', 'text')
+        if content_type not in CONTENT_TYPES:
+            raise MessageError(f"content_type không hỗ trợ: {content_type}", cls.type, job_id)
+        return cls(
+            content=content,
+            printer=_optional_str(data, 'printer', cls.type),
+            # Mặc định in dạng text
+            options={**options, 'content_type': content_type},
+            job_id=job_id,
+            client_id=data.get('clientId'),
+            raw=data
+        )
+
+
+@dataclass(eq=False)
+class PrintTestMessage(Message):
+    printer: Optional[str]
+    job_id: Any = None
+    raw: Dict[str, Any] = field(default_factory=dict, repr=False)
+
+    type = 'printTest'
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'PrintTestMessage':
+        return cls(printer=_optional_str(data, 'printer', cls.type), job_id=data.get('jobId'), raw=data)
+
+
+@dataclass(eq=False)
+class GetPrintersMessage(Message):
+    refresh: bool = False
+    raw: Dict[str, Any] = field(default_factory=dict, repr=False)
+
+    type = 'getPrinters'
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'GetPrintersMessage':
+        return cls(refresh=bool(data.get('refresh')), raw=data)
+
+
+MESSAGE_TYPES: Dict[str, Callable[[Dict[str, Any]], Message]] = {
+    PrintMessage.type: PrintMessage.from_dict,
+    PrintTestMessage.type: PrintTestMessage.from_dict,
+    GetPrintersMessage.type: GetPrintersMessage.from_dict
+}
+
+
+def from_dict(data: Any) -> Union[Message, Dict[str, Any], Any]:
+    """Chuyển dict thành struct nếu là loại tin nhắn có kiểu; loại khác giữ nguyên dict"""
+    if not isinstance(data, dict):
+        return data
+    # Header của job nhị phân chưa có content: kiểm tra khi đã ghép đủ body
+    if data.get('binary') is True and 'content' not in data:
+        return data
+    parse = MESSAGE_TYPES.get(data.get('type'))
+    return parse(data) if parse is not None else data
+
+
+def decode(data: Union[str, bytes]) -> Union[Message, Dict[str, Any], Any]:
+    """Parse và kiểm tra tin nhắn một lần; MessageError nếu không hợp lệ"""
+    return from_dict(loads(data))
+
+
+class Response(abc.ABC):
+    """Phản hồi có kiểu; to_dict() tạo đúng cấu trúc JSON gửi cho server"""
+
+    @abc.abstractmethod
+    def to_dict(self) -> Dict[str, Any]:
+        ...
+
+
+@dataclass
+class PrintResponse(Response):
+    success: bool
+    printer: Optional[str] = None
+    content_length: Optional[int] = None
+    timestamp: Optional[str] = None
+    document_hash: Optional[str] = None
+    spool_id: Optional[str] = None
+    job_id: Any = None
+    error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        response: Dict[str, Any] = {'type': 'print', 'success': self.success}
+        if self.timestamp is not None:
+            data: Dict[str, Any] = {
+                'printer': self.printer,
+                'content_length': self.content_length,
+                'timestamp': self.timestamp
+            }
+            if self.document_hash:
+                data['documentHash'] = self.document_hash
+            if self.spool_id:
+                data['spoolId'] = self.spool_id
+            response['data'] = data
+        # Trả lại jobId để bên gửi ghép phản hồi với job khi nhiều job chạy song song
+        if self.job_id is not None:
+            response['jobId'] = self.job_id
+        if self.error is not None:
+            response['error'] = self.error
+        return response
+
+
+@dataclass
+class PrintTestResponse(Response):
+    success: bool
+    data: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        response: Dict[str, Any] = {'type': 'printTest', 'success': self.success}
+        if self.data is not None:
+            response['data'] = self.data
+        if self.error is not None:
+            response['error'] = self.error
+        return response
+
+
+@dataclass
+class GetPrintersResponse(Response):
+    success: bool
+    printers: List[Dict[str, Any]] = field(default_factory=list)
+    default_printer: Optional[str] = None
+    updated_at: Optional[str] = None
+    error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        if not self.success:
+            return {'type': 'getPrinters', 'success': False, 'error': self.error}
+        return {
+            'type': 'getPrinters',
+            'success': True,
+            'data': {
+                'printers': self.printers,
+                'count': len(self.printers),
+                'defaultPrinter': self.default_printer,
+                'updatedAt': self.updated_at
+            }
+        }
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Metrics
+Bộ đếm, histogram thời gian theo giai đoạn và gauge (độ sâu hàng đợi, job đang chạy) gắn nhãn máy in và loại
+nội dung. Ghi nhận chỉ là vài phép cộng trong bộ nhớ; định dạng (JSON cho tin nhắn metrics, text Prometheus cho
+HTTP) chỉ chạy khi có người đọc
+"""
+
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+# Ngưỡng bucket (giây) của histogram thời gian: từ 0,1 mili giây (parse JSON) tới hàng chục giây (máy in chậm)
+DEFAULT_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0
+)
+
+METRIC_PREFIX = 'print_client_'
+
+# Nhãn máy in/loại nội dung của job đang xử lý, để các giai đoạn bên trong (decode, render...) không phải truyền tay
+_job_labels: contextvars.ContextVar[Dict[str, str]] = contextvars.ContextVar('metrics_job_labels', default={})
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'count', 'sum')
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        # Phần tử cuối là bucket +Inf
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Ước lượng quantile bằng cận trên của bucket chứa nó"""
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return self.buckets[index] if index < len(self.buckets) else float('inf')
+        return float('inf')
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((name, '' if value is None else str(value)) for name, value in labels.items()))
+
+
+def _escape_label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(key: LabelKey, extra: Iterable[Tuple[str, str]] = ()) -> str:
+    items = list(key) + list(extra)
+    if not items:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape_label(value)}"' for name, value in items) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class MetricsRegistry:
+    def __init__(self, enabled: bool = True, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.buckets = tuple(sorted(buckets))
+        # Ghi nhận từ cả event loop lẫn thread gửi dữ liệu tới máy in
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+        self._gauges: Dict[str, Dict[LabelKey, float]] = {}
+        # Gauge tính khi đọc (độ sâu hàng đợi...): không tốn gì lúc xử lý job
+        self._gauge_callbacks: Dict[str, Callable[[], Iterable[Tuple[Dict[str, Any], float]]]] = {}
+        self._help: Dict[str, str] = {}
+        self.started_at = time.time()
+
+    def describe(self, name: str, help_text: str):
+        self._help[name] = help_text
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        """Tăng bộ đếm"""
+        if not self.enabled:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def observe(self, name: str, seconds: float, **labels):
+        """Ghi một mẫu thời gian vào histogram"""
+        if not self.enabled:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def set_gauge(self, name: str, value: float, **labels):
+        if not self.enabled:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            self._gauges.setdefault(name, {})[key] = value
+
+    def gauge_callback(self, name: str, func: Callable[[], Iterable[Tuple[Dict[str, Any], float]]], help_text: str = ''):
+        """Đăng ký gauge tính khi đọc; func trả về các cặp (nhãn, giá trị)"""
+        self._gauge_callbacks[name] = func
+        if help_text:
+            self._help[name] = help_text
+
+    @contextmanager
+    def job_labels(self, **labels) -> Iterator[None]:
+        """Gắn nhãn (máy in, loại nội dung...) cho các giai đoạn đo bên trong job hiện tại"""
+        token = _job_labels.set({**_job_labels.get(), **labels})
+        try:
+            yield
+        finally:
+            _job_labels.reset(token)
+
+    def current_labels(self) -> Dict[str, str]:
+        return _job_labels.get()
+
+    @contextmanager
+    def stage(self, stage: str, **labels) -> Iterator[None]:
+        """Đo thời gian một giai đoạn vào histogram stage_seconds (nhãn job hiện tại + nhãn truyền vào)"""
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe('stage_seconds', time.perf_counter() - started,
+                         stage=stage, **{**_job_labels.get(), **labels})
+
+    def _read_gauges(self) -> Dict[str, Dict[LabelKey, float]]:
+        with self._lock:
+            gauges = {name: dict(series) for name, series in self._gauges.items()}
+        for name, func in self._gauge_callbacks.items():
+            try:
+                gauges[name] = {_label_key(labels): value for labels, value in func()}
+            except Exception as e:
+                logger.error(f"Lỗi khi đọc gauge {name}: {e}")
+        return gauges
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Dạng JSON cho tin nhắn metrics: bộ đếm, gauge và tóm tắt histogram (mili giây)"""
+        with self._lock:
+            counters = {
+                name: [{'labels': dict(key), 'value': value} for key, value in series.items()]
+                for name, series in self._counters.items()
+            }
+            histograms = {}
+            for name, series in self._histograms.items():
+                entries = []
+                for key, histogram in series.items():
+                    entries.append({
+                        'labels': dict(key),
+                        'count': histogram.count,
+                        'sumMs': round(histogram.sum * 1000, 3),
+                        'meanMs': round(histogram.sum / histogram.count * 1000, 3) if histogram.count else None,
+                        'p50Ms': self._quantile_ms(histogram, 0.5),
+                        'p90Ms': self._quantile_ms(histogram, 0.9),
+                        'p99Ms': self._quantile_ms(histogram, 0.99)
+                    })
+                histograms[name] = entries
+
+        gauges = {
+            name: [{'labels': dict(key), 'value': value} for key, value in series.items()]
+            for name, series in self._read_gauges().items()
+        }
+        return {
+            'uptime': round(time.time() - self.started_at, 1),
+            'counters': counters,
+            'gauges': gauges,
+            'histograms': histograms
+        }
+
+    @staticmethod
+    def _quantile_ms(histogram: Histogram, q: float) -> Optional[float]:
+        value = histogram.quantile(q)
+        if value is None or value == float('inf'):
+            # Vượt bucket lớn nhất: không ước lượng được
+            return None
+        return round(value * 1000, 3)
+
+    def render_prometheus(self) -> str:
+        """Định dạng text exposition của Prometheus"""
+        lines: List[str] = []
+
+        def header(name: str, metric_type: str):
+            full_name = METRIC_PREFIX + name
+            if name in self._help:
+                lines.append(f"# HELP {full_name} {self._help[name]}")
+            lines.append(f"# TYPE {full_name} {metric_type}")
+            return full_name
+
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                full_name = header(name, 'counter')
+                for key, value in series.items():
+                    lines.append(f"{full_name}{_format_labels(key)} {_format_value(value)}")
+
+            for name, series in sorted(self._histograms.items()):
+                full_name = header(name, 'histogram')
+                for key, histogram in series.items():
+                    cumulative = 0
+                    for index, count in enumerate(histogram.counts):
+                        cumulative += count
+                        bound = histogram.buckets[index] if index < len(histogram.buckets) else float('inf')
+                        lines.append(
+                            f"{full_name}_bucket{_format_labels(key, (('le', _format_value(bound)),))} {cumulative}"
+                        )
+                    lines.append(f"{full_name}_sum{_format_labels(key)} {_format_value(histogram.sum)}")
+                    lines.append(f"{full_name}_count{_format_labels(key)} {histogram.count}")
+
+        for name, series in sorted(self._read_gauges().items()):
+            full_name = header(name, 'gauge')
+            for key, value in series.items():
+                lines.append(f"{full_name}{_format_labels(key)} {_format_value(value)}")
+
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsServer:
+    """HTTP endpoint tối giản (GET /metrics) cho Prometheus, chỉ nghe trên máy local"""
+
+    def __init__(self, registry: MetricsRegistry, host: str = '127.0.0.1', port: int = 9464):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self) -> bool:
+        try:
+            self._server = await asyncio.start_server(self._handle, self.host, self.port)
+            self.port = self._server.sockets[0].getsockname()[1]
+            logger.info(f"📈 Metrics tại http://{self.host}:{self.port}/metrics")
+            return True
+        except OSError as e:
+            logger.error(f"❌ Không mở được cổng metrics {self.host}:{self.port}: {e}")
+            return False
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5.0)
+            # Bỏ qua header của request
+            while True:
+                line = await asyncio.wait_for(reader.readline(), timeout=5.0)
+                if line in (b'\r\n', b'\n', b''):
+                    break
+
+            parts = request_line.decode('latin-1').split()
+            path = parts[1].split('?', 1)[0] if len(parts) >= 2 else ''
+            if len(parts) >= 2 and parts[0] == 'GET' and path in ('/metrics', '/'):
+                status = '200 OK'
+                body = self.registry.render_prometheus().encode('utf-8')
+                content_type = 'text/plain; version=0.0.4; charset=utf-8'
+            else:
+                status = '404 Not Found'
+                body = b'Not Found\n'
+                content_type = 'text/plain; charset=utf-8'
+
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode('latin-1') + body
+            )
+            await writer.drain()
+        except Exception as e:
+            logger.debug(f"Lỗi phục vụ metrics: {e}")
+        finally:
+            writer.close()
@@ -1,36 +1,114 @@
-import win32print
-import win32api
-import win32con
+try:
+    import win32print
+    import win32api
+    import win32con
+except ImportError:
+    # Không có pywin32 (Linux/macOS): chỉ in được qua backend TCP RAW
+    win32print = win32api = win32con = None
 import tempfile
 import os
 import logging
 import asyncio
+import threading
+import time
+from collections.abc import Mapping
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, List, Optional, Any
+from typing import Dict, Iterable, List, Optional, Any, Tuple, Union
+from printer_pool import PrinterHandlePool
+from print_stream import PrintStream
+from document_cache import DocumentCache
+from spool_store import SpoolStore
+from html_renderer import HTMLRendererPool
+from template_engine import CompiledTemplate, TemplateRegistry
+from image_raster import ImageRasterizer, ImageRasterError, rasterize_image
+from document_preparer import DocumentPreparer, decode_document, render_html
+from raw_tcp_backend import RawTcpBackend
+from metrics import MetricsRegistry
+from printer_executor import (
+    DEFAULT_CALL_TIMEOUT, PrinterBusyError, PrinterCallCancelled, PrinterExecutor, PrinterTimeoutError,
+    cancellable_pages
+)
+from printer_health import PrinterHealth, PrinterUnavailableError
 
 logger = logging.getLogger(__name__)
 
+BytesLike = Union[bytes, bytearray, memoryview]
+
+# Kích thước block khi đọc file để gửi dần tới máy in
+SPOOL_BLOCK_SIZE = 64 * 1024
+
+# Loại nội dung được cache theo hash để in lại bằng printRef
+CACHEABLE_CONTENT_TYPES = ('pdf', 'image', 'raw')
+
+# Loại nội dung mặc định được lưu vào spool để in lại bằng reprint (option keep để bật/tắt)
+KEEP_CONTENT_TYPES = ('pdf',)
+
+# Số tài liệu tối đa gộp vào một job spool khi in theo lô
+MAX_BATCH_PAGES_PER_JOB = 200
+
 class PrintHandler:
-    def __init__(self):
+    def __init__(self, probe_timeout: float = 2.0, probe_workers: int = 8,
+                 network_printers: Optional[Dict[str, str]] = None, metrics: Optional[MetricsRegistry] = None,
+                 io_workers: int = 8, printer_concurrency: int = 1,
+                 call_timeout: Optional[float] = DEFAULT_CALL_TIMEOUT, allow_tcp_addresses: bool = False):
         self.default_printer = None
+        # Mọi lời gọi spooler/file chạy trong pool riêng có giới hạn, timeout từng lời gọi (option timeout)
+        # và số lời gọi đồng thời theo máy in
+        self.executor = PrinterExecutor(
+            max_workers=io_workers,
+            per_printer_limit=printer_concurrency,
+            default_timeout=call_timeout
+        )
+        # Thời gian từng giai đoạn (decode, render, mở máy in, ghi dữ liệu...) theo máy in và loại nội dung
+        self.metrics = metrics or MetricsRegistry()
+        self.handle_pool = PrinterHandlePool()
+        # Máy in mạng gửi RAW thẳng qua cổng 9100, không qua spooler: {"Bep": "192.168.1.50:9100"}
+        self.raw_tcp = RawTcpBackend(network_printers, allow_addresses=allow_tcp_addresses)
+        # Pool riêng cho việc kiểm tra trạng thái máy in, có deadline cho từng máy in
+        self.probe_timeout = probe_timeout
+        self._probe_executor = ThreadPoolExecutor(max_workers=probe_workers, thread_name_prefix='printer-probe')
+        self._probe_lock = threading.Lock()
+        self._probes_in_flight: Dict[str, Future] = {}
+        # Circuit breaker theo máy in: máy in đang lỗi bị fail nhanh, probe định kỳ khi half-open
+        self.health = PrinterHealth(probe=self._probe_printers)
+        self.document_cache = DocumentCache()
+        self.spool_store = SpoolStore()
+        # Renderer HTML trong process, làm nóng sẵn để job đầu tiên không phải chờ
+        self.html_renderer = HTMLRendererPool()
+        self.html_renderer.warm_up()
+        self.templates = TemplateRegistry()
+        self.image_rasterizer = ImageRasterizer()
+        # Chuẩn bị tài liệu lớn (decode, render, raster) trong process pool, tài liệu nhỏ xử lý ngay
+        self.preparer = DocumentPreparer()
         self._initialize_default_printer()
         
     def _initialize_default_printer(self):
         """Khởi tạo máy in mặc định"""
         try:
-            self.default_printer = win32print.GetDefaultPrinter()
+            if win32print is not None:
+                self.default_printer = win32print.GetDefaultPrinter()
+            elif self.raw_tcp.printers:
+                self.default_printer = next(iter(self.raw_tcp.printers))
             logger.info(f"Máy in mặc định: {self.default_printer}")
         except Exception as e:
             logger.warning(f"Không thể lấy máy in mặc định: {e}")
             
-    def get_available_printers(self) -> List[Dict[str, Any]]:
+    async def get_available_printers(self) -> List[Dict[str, Any]]:
         """Lấy danh sách máy in có sẵn"""
         printers = []
         try:
-            printer_enum = win32print.EnumPrinters(
+            if win32print is None:
+                return await self._get_network_printers()
+            
+            printer_enum = await self.executor.run(
+                win32print.EnumPrinters,
                 win32print.PRINTER_ENUM_LOCAL | win32print.PRINTER_ENUM_CONNECTIONS
             )
             
+            # Kiểm tra trạng thái tất cả máy in song song, máy in không trả lời kịp là Unknown
+            probes = await self._probe_printers([printer[2] for printer in printer_enum])
+            
             for printer in printer_enum:
                 printer_info = {
                     'name': printer[2],
@@ -38,28 +116,280 @@ class PrintHandler:
                     'status': 'Available'
                 }
                 
-                # Kiểm tra trạng thái máy in
-                try:
-                    handle = win32print.OpenPrinter(printer[2])
-                    printer_status = win32print.GetPrinter(handle, 2)
-                    win32print.ClosePrinter(handle)
-                    
+                printer_status = probes.get(printer[2])
+                if isinstance(printer_status, dict):
                     if printer_status['Status'] == 0:
                         printer_info['status'] = 'Ready'
                     else:
                         printer_info['status'] = 'Busy/Error'
-                        
-                except Exception:
+                else:
                     printer_info['status'] = 'Unknown'
                     
                 printers.append(printer_info)
                 
         except Exception as e:
             logger.error(f"Lỗi khi lấy danh sách máy in: {e}")
-            
+        
+        printers.extend(await self._get_network_printers())
+        return printers
+    
+    async def _get_network_printers(self) -> List[Dict[str, Any]]:
+        """Danh sách máy in mạng TCP RAW đã đăng ký, kiểm tra kết nối song song"""
+        names = list(self.raw_tcp.printers)
+        probes = await self._probe_printers(names)
+        printers = []
+        for name in names:
+            host, port = self.raw_tcp.printers[name]
+            printers.append({
+                'name': name,
+                'server': f"{host}:{port}",
+                'status': 'Ready' if isinstance(probes.get(name), dict) else 'Unknown',
+                'backend': 'raw_tcp'
+            })
         return printers
     
-    async def print_content(self, content: str, options: Dict[str, Any] = None) -> bool:
+    def watch_printer_changes(self, on_change, stop_event) -> None:
+        """Theo dõi thay đổi máy in của spooler (thêm/xóa/đổi trạng thái) và gọi on_change"""
+        find_first = getattr(win32print, 'FindFirstPrinterChangeNotification', None) if win32print is not None else None
+        if find_first is None:
+            logger.info("Spooler không hỗ trợ thông báo thay đổi, chỉ dùng TTL cho cache máy in")
+            return
+        
+        import win32event
+        
+        # PRINTER_CHANGE_PRINTER: thêm, xóa, thay đổi cấu hình/trạng thái máy in
+        change_flags = getattr(win32print, 'PRINTER_CHANGE_PRINTER', 0x000000FF)
+        server_handle = win32print.OpenPrinter(None)
+        change_handle = find_first(server_handle, change_flags, 0, None)
+        try:
+            while not stop_event.is_set():
+                result = win32event.WaitForSingleObject(change_handle, 1000)
+                if result != win32event.WAIT_OBJECT_0:
+                    continue
+                win32print.FindNextPrinterChangeNotification(change_handle, None)
+                on_change()
+        finally:
+            win32print.FindClosePrinterChangeNotification(change_handle)
+            win32print.ClosePrinter(server_handle)
+    
+    async def cache_document(self, content: Union[str, BytesLike], content_type: str) -> Tuple[Optional[str], Union[str, BytesLike]]:
+        """Decode tài liệu (base64 hoặc bytes) một lần và lưu vào cache theo hash nội dung.
+        
+        Trả về (hash, dữ liệu đã decode); nội dung không cache được trả về (None, content).
+        """
+        if content_type not in CACHEABLE_CONTENT_TYPES:
+            return None, content
+        
+        if isinstance(content, (bytes, bytearray, memoryview)):
+            data = content
+            if self.preparer.should_offload(data):
+                # hashlib nhả GIL với dữ liệu lớn: tính hash trong pool của PrintHandler, không cần process pool
+                doc_hash = await self.executor.run(self.document_cache.compute_hash, data)
+            else:
+                doc_hash = self.document_cache.compute_hash(data)
+        elif content.startswith('data:') and ';base64,' in content[:100]:
+            data, doc_hash = await self._decode_document(content)
+        else:
+            # Đường dẫn file hoặc RAW dạng chuỗi: giữ nguyên
+            return None, content
+        
+        self.document_cache.put(data, content_type, doc_hash=doc_hash)
+        return doc_hash, data
+    
+    async def _decode_document(self, content: str) -> Tuple[bytes, str]:
+        """Decode data URL base64 (trong process pool nếu lớn), trả về (dữ liệu, hash)"""
+        with self.metrics.stage('decode'):
+            return await self.preparer.run(decode_document, content)
+    
+    async def print_cached_document(self, doc_hash: str, options: Dict[str, Any] = None) -> Optional[bool]:
+        """In tài liệu đã cache theo hash; trả về None nếu không có trong cache"""
+        entry = self.document_cache.get(doc_hash)
+        if entry is None:
+            return None
+        return await self.print_content(entry.data, {
+            **(options or {}),
+            'content_type': entry.content_type
+        })
+    
+    async def keep_document(self, data: Union[str, BytesLike], content_type: str, options: Dict[str, Any] = None) -> Optional[str]:
+        """Lưu tài liệu đã decode vào spool store để in lại sau; trả về spool ID hoặc None"""
+        if options is None:
+            options = {}
+        if not options.get('keep', content_type in KEEP_CONTENT_TYPES):
+            return None
+        if isinstance(data, str):
+            # PDF/hình ảnh dạng chuỗi là đường dẫn hoặc base64 chưa decode: không lưu
+            if content_type not in ('text', 'raw', 'html'):
+                return None
+            # HTML luôn được đọc lại bằng UTF-8; text/raw giữ đúng bytes sẽ gửi tới máy in
+            encoding = 'utf-8' if content_type == 'html' else options.get('encoding', 'utf-8')
+            data = data.encode(encoding)
+        
+        try:
+            with self.metrics.stage('spool_store'):
+                return await self.executor.run(
+                    self.spool_store.store,
+                    data,
+                    content_type,
+                    {'printer': options.get('printer')}
+                )
+        except Exception as e:
+            logger.error(f"Lỗi khi lưu tài liệu vào spool: {e}")
+            return None
+    
+    async def reprint(self, spool_id: str, options: Dict[str, Any] = None) -> Optional[bool]:
+        """In lại job đã lưu trong spool; trả về None nếu không tìm thấy"""
+        if options is None:
+            options = {}
+        # Tra index spool (có thể đọc đĩa) trong pool riêng, không trên event loop
+        entry = await self.executor.run(self.spool_store.get, spool_id)
+        if entry is None:
+            return None
+        
+        printer_name = options.get('printer') or entry['metadata'].get('printer') or self.default_printer
+        # In lại qua print_content theo loại đã lưu (hình ảnh được raster lại, HTML được render lại)
+        try:
+            data = await self.executor.run(self._read_file, entry['path'])
+        except Exception as e:
+            logger.error(f"Lỗi khi đọc job spool {spool_id}: {e}")
+            return False
+        return await self.print_content(data, {
+            **options,
+            'printer': printer_name,
+            'content_type': entry['content_type']
+        })
+    
+    async def _prepare_raw_payload(self, content: Union[str, BytesLike], content_type: str, options: Dict[str, Any]) -> Optional[BytesLike]:
+        """Chuyển nội dung thành bytes gửi thẳng tới máy in; None nếu cần đường in riêng (HTML qua IE, file)"""
+        if content_type == 'html':
+            if options.get('html_renderer', 'text') == 'ie':
+                return None
+            return await self._prepare_html(content, options)
+        
+        image_hash = None
+        if isinstance(content, (bytes, bytearray, memoryview)):
+            data = content
+        elif content_type in ('text', 'raw'):
+            return content.encode(options.get('encoding', 'utf-8'))
+        elif content_type in ('pdf', 'image') and content.startswith('data:') and ';base64,' in content[:100]:
+            data, image_hash = await self._decode_document(content)
+        else:
+            return None
+        
+        if content_type == 'image':
+            return await self._prepare_image(data, options, image_hash)
+        return data
+    
+    async def print_batch(self, items: List[Dict[str, Any]], options: Dict[str, Any] = None) -> Dict[str, Any]:
+        """In nhiều tài liệu trong một lần gọi.
+        
+        Tài liệu gửi thẳng được (text, raw, HTML đã render, PDF/hình ảnh đã decode) được gom theo máy in,
+        mỗi tài liệu là một trang trong cùng một job spool. HTML qua IE và đường dẫn file được in riêng.
+        """
+        if options is None:
+            options = {}
+        
+        results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+        groups: Dict[str, List[Tuple[int, BytesLike]]] = {}
+        individual: List[Tuple[int, Union[str, BytesLike], Dict[str, Any]]] = []
+        
+        for index, item in enumerate(items):
+            # Tài liệu sai cấu trúc chỉ làm hỏng chính nó, không hỏng cả lô
+            if not isinstance(item, Mapping):
+                results[index] = {'index': index, 'id': None, 'printer': None,
+                                  'success': False, 'error': 'Item must be an object'}
+                continue
+            printer_name = item.get('printer') or options.get('printer') or self.default_printer
+            results[index] = {'index': index, 'id': item.get('id'), 'printer': printer_name}
+            
+            try:
+                item_options = item.get('options') or {}
+                if not isinstance(item_options, Mapping):
+                    raise ValueError('options must be an object')
+                item_options = {**options, **item_options}
+                item_options.setdefault('content_type', 'text')
+                item_options['printer'] = printer_name
+                content = item.get('content', '')
+                data = await self._prepare_raw_payload(content, item_options['content_type'], item_options)
+            except Exception as e:
+                results[index].update({'success': False, 'error': str(e)})
+                continue
+            
+            if data is None or item_options.get('separate_job'):
+                individual.append((index, content, item_options))
+            else:
+                groups.setdefault(printer_name, []).append((index, data))
+        
+        async def run_group(printer_name: str, group: List[Tuple[int, BytesLike]]) -> int:
+            jobs = 0
+            for start in range(0, len(group), MAX_BATCH_PAGES_PER_JOB):
+                part = group[start:start + MAX_BATCH_PAGES_PER_JOB]
+                try:
+                    success = await self._call_printer(
+                        self._sync_print_pages,
+                        [(data,) for _, data in part],
+                        printer_name,
+                        options,
+                        printer_name=printer_name,
+                        options=options
+                    )
+                except Exception as e:
+                    logger.error(f"Lỗi khi gửi lô tới máy in {printer_name}: {e}")
+                    success = False
+                jobs += 1
+                for index, _ in part:
+                    results[index]['success'] = success
+                    if not success:
+                        results[index]['error'] = 'Print failed'
+            return jobs
+        
+        async def run_individual(index: int, content: Union[str, BytesLike], item_options: Dict[str, Any]) -> int:
+            success = await self.print_content(content, item_options)
+            results[index]['success'] = success
+            if not success:
+                results[index]['error'] = 'Print failed'
+            return 1
+        
+        job_counts = await asyncio.gather(
+            *(run_group(printer_name, group) for printer_name, group in groups.items()),
+            *(run_individual(*entry) for entry in individual)
+        )
+        
+        succeeded = sum(1 for result in results if result.get('success'))
+        logger.info(f"Đã in lô {len(items)} tài liệu trong {sum(job_counts)} job ({succeeded} thành công)")
+        return {
+            'items': results,
+            'count': len(items),
+            'succeeded': succeeded,
+            'failed': len(items) - succeeded,
+            'jobs': sum(job_counts)
+        }
+    
+    def register_template(self, name: str, source: str, options: Dict[str, Any] = None) -> CompiledTemplate:
+        """Đăng ký template hóa đơn/nhãn để in bằng printTemplate"""
+        if options is None:
+            options = {}
+        return self.templates.register(
+            name,
+            source,
+            content_type=options.get('content_type', 'text'),
+            encoding=options.get('encoding', 'utf-8')
+        )
+    
+    async def print_template(self, name: str, variables: Dict[str, Any] = None, options: Dict[str, Any] = None) -> Optional[bool]:
+        """In template đã đăng ký với các biến; trả về None nếu chưa có template"""
+        template = self.templates.get(name)
+        if template is None:
+            return None
+        
+        data = template.render(variables)
+        return await self.print_content(data, {
+            **(options or {}),
+            'content_type': template.content_type,
+            'encoding': template.encoding
+        })
+    
+    async def print_content(self, content: Union[str, BytesLike], options: Dict[str, Any] = None) -> bool:
         """In nội dung"""
         if options is None:
             options = {}
@@ -71,6 +401,8 @@ class PrintHandler:
             
             if content_type == 'text':
                 return await self._print_text(content, printer_name, options)
+            elif content_type == 'raw':
+                return await self._print_raw(content, printer_name, options)
             elif content_type == 'html':
                 return await self._print_html(content, printer_name, options)
             elif content_type == 'pdf':
@@ -85,47 +417,140 @@ class PrintHandler:
             logger.error(f"Lỗi khi in: {e}")
             return False
     
-    async def _print_text(self, text: str, printer_name: str, options: Dict[str, Any]) -> bool:
+    async def _print_text(self, text: Union[str, BytesLike], printer_name: str, options: Dict[str, Any]) -> bool:
         """In văn bản thuần túy"""
         try:
-            # Tạo file tạm thời trong thư mục dự án
-            project_dir = os.path.dirname(os.path.abspath(__file__))
-            temp_file_path = os.path.join(project_dir, f"temp_print.txt")
-            with open(temp_file_path, 'w', encoding='utf-8') as temp_file:
-                temp_file.write(text)
+            if isinstance(text, (bytes, bytearray, memoryview)):
+                data = text
+            else:
+                data = text.encode(options.get('encoding', 'utf-8'))
+            return await self._print_bytes(data, printer_name, options)
             
-            # In file
-            success = await self._print_file(temp_file_path, printer_name, options)
+        except Exception as e:
+            logger.error(f"Lỗi khi in văn bản: {e}")
+            return False
+    
+    async def _print_raw(self, data: Union[str, BytesLike], printer_name: str, options: Dict[str, Any]) -> bool:
+        """In dữ liệu RAW (ESC/POS, ZPL...) gửi thẳng tới máy in"""
+        try:
+            if isinstance(data, str):
+                data = data.encode(options.get('encoding', 'utf-8'))
+            return await self._print_bytes(data, printer_name, options)
             
-            # Xóa file tạm
+        except Exception as e:
+            logger.error(f"Lỗi khi in dữ liệu RAW: {e}")
+            return False
+    
+    async def _print_bytes(self, data: BytesLike, printer_name: str, options: Dict[str, Any]) -> bool:
+        """In dữ liệu trong bộ nhớ, chỉ dùng file tạm khi có option spool_via_file"""
+        if options.get('spool_via_file'):
+            temp_file_path = await self.executor.run(self._write_temp_file, data, '.prn')
             try:
-                os.unlink(temp_file_path)
-            except Exception:
-                pass
-                
-            return success
+                return await self._print_file(temp_file_path, printer_name, options)
+            finally:
+                await self._remove_temp_file(temp_file_path)
+        
+        try:
+            return await self._call_printer(
+                self._sync_print_bytes,
+                memoryview(data),
+                printer_name,
+                options,
+                printer_name=printer_name,
+                options=options
+            )
             
         except Exception as e:
-            logger.error(f"Lỗi khi in văn bản: {e}")
+            logger.error(f"Lỗi khi gửi dữ liệu tới máy in {printer_name}: {e}")
+            return False
+    
+    async def _call_printer(self, func, *args, printer_name: Optional[str], options: Dict[str, Any]) -> bool:
+        """Gửi job tới máy in qua circuit breaker: fail nhanh khi máy in đang lỗi, ghi nhận kết quả"""
+        printer_name = printer_name or self.default_printer
+        try:
+            self.health.acquire(printer_name)
+        except PrinterUnavailableError as e:
+            logger.warning(str(e))
             return False
+        
+        try:
+            success = await self.executor.run(func, *args, printer=printer_name, timeout=options.get('timeout'))
+        except (asyncio.CancelledError, PrinterBusyError):
+            # Bị hủy hoặc hết giờ chờ lượt (máy in bận job khác): lời gọi chưa tới máy in, không phải lỗi
+            self.health.release(printer_name)
+            raise
+        except Exception as e:
+            self.health.record_failure(printer_name, e)
+            raise
+        
+        if success:
+            self.health.record_success(printer_name)
+        else:
+            self.health.record_failure(printer_name, 'Print failed')
+        return success
+    
+    def _write_temp_file(self, data: Union[str, BytesLike], suffix: str) -> str:
+        """Ghi dữ liệu ra file tạm có tên duy nhất cho backend cần đường dẫn file (chuỗi ghi ở chế độ văn bản)"""
+        with self.metrics.stage('temp_file'):
+            mode = 'w' if isinstance(data, str) else 'w+b'
+            with tempfile.NamedTemporaryFile(mode=mode, suffix=suffix, delete=False) as temp_file:
+                temp_file.write(data)
+                return temp_file.name
     
-    async def _print_html(self, html_content: str, printer_name: str, options: Dict[str, Any]) -> bool:
-        """In nội dung HTML"""
+    async def _remove_temp_file(self, file_path: str):
+        """Xóa file tạm trong pool của PrintHandler; lỗi xóa chỉ được bỏ qua"""
         try:
-            # Tạo file HTML tạm thời trong thư mục dự án
-            project_dir = os.path.dirname(os.path.abspath(__file__))
-            temp_file_path = os.path.join(project_dir, f"temp_print.html")
-            with open(temp_file_path, 'w', encoding='utf-8') as temp_file:
-                temp_file.write(html_content)
+            await self.executor.run(self._unlink_quietly, file_path)
+        except Exception:
+            pass
+    
+    @staticmethod
+    def _unlink_quietly(file_path: str):
+        try:
+            os.unlink(file_path)
+        except FileNotFoundError:
+            pass
+    
+    @staticmethod
+    def _read_file(file_path: str) -> bytes:
+        with open(file_path, 'rb') as f:
+            return f.read()
+    
+    def _render_html(self, html_content: Union[str, BytesLike], options: Dict[str, Any]) -> bytes:
+        """Render HTML thành văn bản bằng renderer trong process"""
+        if not isinstance(html_content, str):
+            html_content = bytes(html_content).decode('utf-8')
+        text = self.html_renderer.render(html_content, options.get('line_width'))
+        return text.encode(options.get('encoding', 'utf-8'))
+    
+    async def _prepare_html(self, html_content: Union[str, BytesLike], options: Dict[str, Any]) -> bytes:
+        """Render HTML: tài liệu lớn trong process pool, tài liệu nhỏ bằng renderer trong process"""
+        with self.metrics.stage('render_html'):
+            return await self.preparer.run(render_html, html_content, options, inline=self._render_html)
+    
+    async def _print_html(self, html_content: Union[str, BytesLike], printer_name: str, options: Dict[str, Any]) -> bool:
+        """In nội dung HTML (mặc định render trong process; html_renderer='ie' dùng Internet Explorer)"""
+        if options.get('html_renderer', 'text') != 'ie':
+            try:
+                data = await self._prepare_html(html_content, options)
+                return await self._print_bytes(data, printer_name, options)
+                
+            except Exception as e:
+                logger.error(f"Lỗi khi in HTML: {e}")
+                return False
+        
+        try:
+            if isinstance(html_content, str):
+                html_content = html_content.encode('utf-8')
+            
+            # Tạo file HTML tạm thời (tên duy nhất để các job không ghi đè nhau)
+            temp_file_path = await self.executor.run(self._write_temp_file, html_content, '.html')
             
             # Sử dụng trình duyệt mặc định để in HTML
             success = await self._print_html_file(temp_file_path, printer_name, options)
             
             # Xóa file tạm
-            try:
-                os.unlink(temp_file_path)
-            except Exception:
-                pass
+            await self._remove_temp_file(temp_file_path)
                 
             return success
             
@@ -133,101 +558,89 @@ class PrintHandler:
             logger.error(f"Lỗi khi in HTML: {e}")
             return False
     
-    async def _print_pdf(self, pdf_data: str, printer_name: str, options: Dict[str, Any]) -> bool:
-        """In file PDF (từ base64 hoặc đường dẫn)"""
+    async def _print_pdf(self, pdf_data: Union[str, BytesLike], printer_name: str, options: Dict[str, Any]) -> bool:
+        """In file PDF (từ bytes, base64 hoặc đường dẫn)"""
         try:
-            import base64
+            # Dữ liệu đã decode sẵn: gửi thẳng từ bộ nhớ
+            if isinstance(pdf_data, (bytes, bytearray, memoryview)):
+                return await self._print_bytes(pdf_data, printer_name, options)
             
             # Kiểm tra xem có phải base64 không
             if pdf_data.startswith('data:application/pdf;base64,'):
                 # Decode base64
-                pdf_base64 = pdf_data.split(',')[1]
-                pdf_bytes = base64.b64decode(pdf_base64)
+                pdf_bytes, _ = await self._decode_document(pdf_data)
                 
-                # Tạo file PDF trong thư mục hiện tại với tên có timestamp
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                pdf_filename = f"printed_pdf_{timestamp}.pdf"
-                temp_file_path = os.path.join(os.getcwd(), pdf_filename)
+                # Lưu PDF vào spool store (giới hạn dung lượng/tuổi) để có thể in lại
+                await self.keep_document(pdf_bytes, 'pdf', {**options, 'printer': printer_name})
                 
-                with open(temp_file_path, 'wb') as pdf_file:
-                    pdf_file.write(pdf_bytes)
-                    
-                logger.info(f"Đã lưu file PDF: {temp_file_path}")
-            else:
-                # Giả sử là đường dẫn file
-                temp_file_path = pdf_data
+                # In PDF từ bytes đã decode, không đọc lại file
+                return await self._print_bytes(pdf_bytes, printer_name, options)
             
-            # In PDF
-            success = await self._print_file(temp_file_path, printer_name, options)
-            
-            # Không xóa file PDF để có thể mở sau khi in
-            if success and pdf_data.startswith('data:application/pdf;base64,'):
-                logger.info(f"File PDF đã được in và lưu tại: {temp_file_path}")
-                    
-            return success
+            # Giả sử là đường dẫn file
+            return await self._print_file(pdf_data, printer_name, options)
             
         except Exception as e:
             logger.error(f"Lỗi khi in PDF: {e}")
             return False
     
-    async def _print_image(self, image_data: str, printer_name: str, options: Dict[str, Any]) -> bool:
+    async def _print_image(self, image_data: Union[str, BytesLike], printer_name: str, options: Dict[str, Any]) -> bool:
         """In hình ảnh"""
         try:
-            import base64
-            
-            # Xử lý dữ liệu hình ảnh base64
-            if image_data.startswith('data:image/'):
+            image_hash = None
+            if isinstance(image_data, (bytes, bytearray, memoryview)):
+                # Dữ liệu đã decode sẵn
+                image_bytes = image_data
+            elif image_data.startswith('data:image/'):
                 # Decode base64
-                header, image_base64 = image_data.split(',', 1)
-                image_bytes = base64.b64decode(image_base64)
-                
-                # Xác định định dạng file
-                if 'jpeg' in header or 'jpg' in header:
-                    suffix = '.jpg'
-                elif 'png' in header:
-                    suffix = '.png'
-                elif 'gif' in header:
-                    suffix = '.gif'
-                else:
-                    suffix = '.png'  # mặc định
-                
-                # Tạo file hình ảnh tạm thời
-                with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as temp_file:
-                    temp_file.write(image_bytes)
-                    temp_file_path = temp_file.name
+                image_bytes, image_hash = await self._decode_document(image_data)
+            elif options.get('raster', True):
+                # Giả sử là đường dẫn file: đọc để raster
+                image_bytes = await self.executor.run(self._read_file, image_data)
             else:
-                # Giả sử là đường dẫn file
-                temp_file_path = image_data
+                return await self._print_file(image_data, printer_name, options)
             
-            # In hình ảnh
-            success = await self._print_file(temp_file_path, printer_name, options)
-            
-            # Xóa file tạm nếu đã tạo
-            if image_data.startswith('data:image/'):
-                try:
-                    os.unlink(temp_file_path)
-                except Exception:
-                    pass
-                    
-            return success
+            data = await self._prepare_image(image_bytes, options, image_hash)
+            return await self._print_bytes(data, printer_name, options)
             
         except Exception as e:
             logger.error(f"Lỗi khi in hình ảnh: {e}")
             return False
     
+    async def _prepare_image(self, image_bytes: BytesLike, options: Dict[str, Any], image_hash: Optional[str] = None) -> BytesLike:
+        """Chuyển hình ảnh thành lệnh raster ESC/POS; option raster=false để gửi nguyên dữ liệu ảnh"""
+        if not options.get('raster', True):
+            return image_bytes
+        try:
+            if image_hash is None:
+                if self.preparer.should_offload(image_bytes):
+                    # Ảnh lớn: tính hash trong pool của PrintHandler, không trên event loop
+                    image_hash = await self.executor.run(self.image_rasterizer.cache.compute_hash, image_bytes)
+                else:
+                    image_hash = self.image_rasterizer.cache.compute_hash(image_bytes)
+            data = self.image_rasterizer.lookup(image_hash, options)
+            if data is None:
+                # Decode/scale/dither tốn CPU: ảnh lớn chạy trong process pool
+                with self.metrics.stage('raster_image'):
+                    data = await self.preparer.run(rasterize_image, image_bytes, options)
+                self.image_rasterizer.remember(image_hash, options, data)
+            return data
+        except ImageRasterError as e:
+            # Thiếu numpy/Pillow: giữ cách cũ, gửi nguyên dữ liệu ảnh
+            logger.warning(f"Không raster được hình ảnh, gửi dữ liệu gốc: {e}")
+            return image_bytes
+    
     async def _print_file(self, file_path: str, printer_name: str, options: Dict[str, Any]) -> bool:
         """In file sử dụng Windows API"""
         try:
-            # Chạy trong thread pool để tránh blocking
-            loop = asyncio.get_event_loop()
-            success = await loop.run_in_executor(
-                None, 
-                self._sync_print_file, 
-                file_path, 
-                printer_name, 
-                options
+            # Chạy trong pool của máy in để tránh blocking
+            return await self._call_printer(
+                self._sync_print_file,
+                file_path,
+                printer_name,
+                options,
+                printer_name=printer_name,
+                options=options
             )
-            return success
             
         except Exception as e:
             logger.error(f"Lỗi khi in file {file_path}: {e}")
@@ -236,53 +649,97 @@ class PrintHandler:
     def _sync_print_file(self, file_path: str, printer_name: str, options: Dict[str, Any]) -> bool:
         """In file đồng bộ sử dụng win32print API"""
         try:
-            # Sử dụng win32print để in trực tiếp
+            # Đọc nguyên bytes theo từng block, không decode/encode lại và không nạp cả file vào bộ nhớ
+            with open(file_path, 'rb') as f:
+                blocks = iter(lambda: f.read(SPOOL_BLOCK_SIZE), b'')
+                success = self._sync_print_chunks(blocks, printer_name, options)
+            
+            if success:
+                logger.info(f"Đã gửi file {file_path} tới máy in {printer_name or self.default_printer}")
+            return success
+                
+        except Exception as e:
+            logger.error(f"Lỗi khi in file {file_path}: {e}")
+            return False
+    
+    def _sync_print_bytes(self, data: memoryview, printer_name: str, options: Dict[str, Any]) -> bool:
+        """Gửi dữ liệu trong bộ nhớ tới máy in bằng WritePrinter"""
+        return self._sync_print_chunks((data,), printer_name, options)
+    
+    def _sync_print_chunks(self, chunks: Iterable[BytesLike], printer_name: str, options: Dict[str, Any]) -> bool:
+        """Gửi lần lượt các chunk trong cùng một job in bằng WritePrinter"""
+        return self._sync_print_pages((chunks,), printer_name, options)
+    
+    def _sync_print_pages(self, pages: Iterable[Iterable[BytesLike]], printer_name: str, options: Dict[str, Any]) -> bool:
+        """Gửi nhiều trang (mỗi trang gồm nhiều chunk) trong cùng một job in"""
+        try:
             if not printer_name:
                 printer_name = self.default_printer
+            # Chạy trong thread pool: nhãn máy in/loại nội dung truyền trực tiếp
+            labels = {'printer': printer_name, 'content_type': options.get('content_type', 'text')}
+            # Dừng giữa các chunk nếu lời gọi đã timeout/bị hủy
+            pages = cancellable_pages(pages)
             
-            # Mở máy in
-            printer_handle = win32print.OpenPrinter(printer_name)
+            # Máy in mạng: gửi thẳng qua TCP, không qua spooler
+            if self.raw_tcp.handles(printer_name):
+                with self.metrics.stage('tcp_send', **labels):
+                    total = self.raw_tcp.send_pages(printer_name, pages)
+                self.metrics.inc('printer_bytes_total', total, printer=printer_name)
+                logger.info(f"Đã gửi {total} bytes tới máy in {printer_name} qua TCP")
+                return True
             
-            try:
-                # Đọc nội dung file
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                
+            # Sử dụng win32print để in trực tiếp
+            # Mượn handle máy in từ pool
+            started = time.perf_counter()
+            with self.handle_pool.checkout(printer_name) as printer_handle:
                 # Tạo job in
                 job_info = ("Python Print Job", None, "RAW")
                 job_id = win32print.StartDocPrinter(printer_handle, 1, job_info)
+                self.metrics.observe('stage_seconds', time.perf_counter() - started, stage='open_printer', **labels)
                 
+                started = time.perf_counter()
                 try:
-                    # Bắt đầu trang
-                    win32print.StartPagePrinter(printer_handle)
-                    
-                    # Gửi dữ liệu
-                    win32print.WritePrinter(printer_handle, content.encode('utf-8'))
-                    
-                    # Kết thúc trang
-                    win32print.EndPagePrinter(printer_handle)
+                    total = 0
+                    for chunks in pages:
+                        # Bắt đầu trang
+                        win32print.StartPagePrinter(printer_handle)
+                        
+                        # Gửi dữ liệu
+                        for chunk in chunks:
+                            win32print.WritePrinter(printer_handle, chunk)
+                            total += len(chunk)
+                        
+                        # Kết thúc trang
+                        win32print.EndPagePrinter(printer_handle)
                     
-                    logger.info(f"Đã gửi file {file_path} tới máy in {printer_name}")
+                    self.metrics.inc('printer_bytes_total', total, printer=printer_name)
+                    logger.info(f"Đã gửi {total} bytes tới máy in {printer_name}")
                     return True
                     
                 finally:
                     # Kết thúc job
                     win32print.EndDocPrinter(printer_handle)
-                    
-            finally:
-                # Đóng máy in
-                win32print.ClosePrinter(printer_handle)
+                    self.metrics.observe('stage_seconds', time.perf_counter() - started, stage='write_printer', **labels)
                 
+        except PrinterCallCancelled:
+            # Job đã timeout/bị hủy phía event loop: dừng gửi, không tính là lỗi máy in
+            logger.warning(f"Đã dừng gửi dữ liệu tới máy in {printer_name} (job bị hủy)")
+            return False
         except Exception as e:
-            logger.error(f"Lỗi khi in file {file_path}: {e}")
+            logger.error(f"Lỗi khi gửi dữ liệu tới máy in {printer_name}: {e}")
+            self.metrics.inc('printer_errors_total', printer=printer_name)
             return False
     
+    def open_stream(self, printer_name: str = None, options: Dict[str, Any] = None) -> 'PrintStream':
+        """Tạo job in dạng stream để gửi dữ liệu tới máy in theo từng chunk"""
+        if options is None:
+            options = {}
+        return PrintStream(self, printer_name or self.default_printer, options)
+    
     async def _print_html_file(self, html_file_path: str, printer_name: str, options: Dict[str, Any]) -> bool:
         """In file HTML sử dụng trình duyệt"""
         try:
             # Sử dụng Internet Explorer để in HTML (có sẵn trên Windows)
-            import subprocess
-            
             # Tạo script VBS để in HTML
             vbs_script = f'''
 Set ie = CreateObject("InternetExplorer.Application")
@@ -295,57 +752,135 @@ ie.ExecWB 6, 2
 ie.Quit
 '''
             
-            with tempfile.NamedTemporaryFile(mode='w', suffix='.vbs', delete=False) as vbs_file:
-                vbs_file.write(vbs_script)
-                vbs_file_path = vbs_file.name
+            vbs_file_path = await self.executor.run(self._write_temp_file, vbs_script, '.vbs')
             
-            # Chạy script VBS
-            loop = asyncio.get_event_loop()
-            result = await loop.run_in_executor(
-                None,
-                lambda: subprocess.run(
-                    ['cscript', '//NoLogo', vbs_file_path],
-                    capture_output=True,
-                    text=True
-                )
+            # Chạy script VBS như tiến trình con bất đồng bộ: không giữ thread nào trong lúc IE in
+            timeout = options.get('timeout', self.executor.default_timeout)
+            process = await asyncio.create_subprocess_exec(
+                'cscript', '//NoLogo', vbs_file_path,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
             )
-            
-            # Xóa file VBS tạm
             try:
-                os.unlink(vbs_file_path)
-            except Exception:
-                pass
+                _, stderr = await asyncio.wait_for(process.communicate(), timeout)
+            except asyncio.TimeoutError:
+                # Quá hạn: dừng script, không để IE chạy treo
+                process.kill()
+                await process.wait()
+                raise PrinterTimeoutError(f"Script in HTML không xong trong {timeout}s")
+            except asyncio.CancelledError:
+                process.kill()
+                await process.wait()
+                raise
+            finally:
+                # Xóa file VBS tạm
+                await self._remove_temp_file(vbs_file_path)
             
-            if result.returncode == 0:
+            if process.returncode == 0:
                 logger.info(f"Đã in file HTML {html_file_path}")
                 return True
             else:
-                logger.error(f"Lỗi khi in HTML: {result.stderr}")
+                logger.error(f"Lỗi khi in HTML: {stderr.decode(errors='replace')}")
                 return False
                 
         except Exception as e:
             logger.error(f"Lỗi khi in HTML: {e}")
             return False
     
-    def get_printer_status(self, printer_name: str = None) -> Dict[str, Any]:
+    def _get_printer_info(self, printer_name: str) -> Dict[str, Any]:
+        """Đọc thông tin máy in (GetPrinter level 2)"""
+        if self.raw_tcp.handles(printer_name):
+            return self.raw_tcp.probe(printer_name)
+        with self.handle_pool.checkout(printer_name) as handle:
+            return win32print.GetPrinter(handle, 2)
+    
+    async def _probe_printers(self, printer_names: List[str], timeout: float = None) -> Dict[str, Any]:
+        """Đọc thông tin nhiều máy in song song với deadline.
+        
+        Kết quả cho mỗi máy in là dict thông tin, Exception nếu lỗi, hoặc None nếu quá hạn.
+        Máy in còn probe cũ chưa xong sẽ không được probe thêm để tránh dồn thread bị treo.
+        """
+        if timeout is None:
+            timeout = self.probe_timeout
+        
+        results: Dict[str, Any] = {}
+        futures: Dict[str, Future] = {}
+        with self._probe_lock:
+            for printer_name in printer_names:
+                if printer_name in futures or printer_name in results:
+                    continue
+                if printer_name in self._probes_in_flight:
+                    results[printer_name] = None
+                    continue
+                future = self._probe_executor.submit(self._get_printer_info, printer_name)
+                self._probes_in_flight[printer_name] = future
+                futures[printer_name] = future
+        
+        # Đăng ký callback ngoài lock: future đã xong sẽ gọi callback ngay trong thread này
+        for printer_name, future in futures.items():
+            future.add_done_callback(lambda f, name=printer_name: self._probe_finished(name, f))
+        
+        if futures:
+            # Chờ trên event loop, không giữ thread nào trong lúc chờ máy in trả lời
+            waiters = [asyncio.wrap_future(future) for future in futures.values()]
+            for waiter in waiters:
+                # Kết quả đọc từ future gốc bên dưới; đánh dấu lỗi đã được xử lý
+                waiter.add_done_callback(lambda w: w.cancelled() or w.exception())
+            await asyncio.wait(waiters, timeout=timeout)
+        
+        for printer_name, future in futures.items():
+            if not future.done():
+                future.cancel()
+                logger.warning(f"Máy in {printer_name} không phản hồi trong {timeout}s")
+                results[printer_name] = None
+            elif future.exception() is not None:
+                results[printer_name] = future.exception()
+            else:
+                results[printer_name] = future.result()
+            # Trường Status cập nhật circuit breaker của máy in
+            self.health.record_status(printer_name, results[printer_name])
+        
+        return results
+    
+    def _probe_finished(self, printer_name: str, future: Future):
+        """Xóa probe đã xong khỏi danh sách đang chạy"""
+        with self._probe_lock:
+            if self._probes_in_flight.get(printer_name) is future:
+                del self._probes_in_flight[printer_name]
+    
+    def _format_printer_status(self, printer_name: str, printer_info: Any) -> Dict[str, Any]:
+        """Chuyển kết quả probe thành dict trạng thái"""
+        if printer_info is None:
+            return {
+                'name': printer_name,
+                'status': 'Unknown',
+                'error': 'Timeout'
+            }
+        
+        if isinstance(printer_info, Exception):
+            logger.error(f"Lỗi khi lấy trạng thái máy in {printer_name}: {printer_info}")
+            return {
+                'name': printer_name,
+                'status': 'Error',
+                'error': str(printer_info)
+            }
+        
+        return {
+            'name': printer_name,
+            'status': 'Ready' if printer_info['Status'] == 0 else 'Busy/Error',
+            'jobs_count': printer_info['cJobs'],
+            'location': printer_info.get('pLocation', ''),
+            'comment': printer_info.get('pComment', '')
+        }
+    
+    async def get_printer_status(self, printer_name: str = None) -> Dict[str, Any]:
         """Lấy trạng thái máy in"""
         if printer_name is None:
             printer_name = self.default_printer
             
         try:
-            handle = win32print.OpenPrinter(printer_name)
-            printer_info = win32print.GetPrinter(handle, 2)
-            win32print.ClosePrinter(handle)
-            
-            status = {
-                'name': printer_name,
-                'status': 'Ready' if printer_info['Status'] == 0 else 'Busy/Error',
-                'jobs_count': printer_info['cJobs'],
-                'location': printer_info.get('pLocation', ''),
-                'comment': printer_info.get('pComment', '')
-            }
-            
-            return status
+            probes = await self._probe_printers([printer_name])
+            return self._format_printer_status(printer_name, probes.get(printer_name))
             
         except Exception as e:
             logger.error(f"Lỗi khi lấy trạng thái máy in {printer_name}: {e}")
@@ -355,6 +890,16 @@ ie.Quit
                 'error': str(e)
             }
     
+    async def get_printers_status(self, printer_names: List[str]) -> List[Dict[str, Any]]:
+        """Lấy trạng thái nhiều máy in cùng lúc (song song, có deadline)"""
+        try:
+            probes = await self._probe_printers(printer_names)
+            return [self._format_printer_status(name, probes.get(name)) for name in printer_names]
+            
+        except Exception as e:
+            logger.error(f"Lỗi khi lấy trạng thái các máy in: {e}")
+            return [{'name': name, 'status': 'Error', 'error': str(e)} for name in printer_names]
+    
     async def print_test_page(self, printer_name: str = None) -> Dict[str, Any]:
         """In trang thử nghiệm"""
         if printer_name is None:
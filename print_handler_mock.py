@@ -19,7 +19,7 @@ class PrintHandler:
         self.default_printer = "Default_Printer_macOS"
         logger.info(f"Mock Print Handler initialized with default printer: {self.default_printer}")
         
-    def get_available_printers(self) -> List[Dict[str, Any]]:
+    async def get_available_printers(self) -> List[Dict[str, Any]]:
         """Mock: Trả về danh sách máy in giả lập"""
         mock_printers = [
             {
@@ -110,7 +110,7 @@ class PrintHandler:
                 'timestamp': datetime.now().isoformat()
             }
     
-    def get_printer_status(self, printer_name: str = None) -> Dict[str, Any]:
+    async def get_printer_status(self, printer_name: str = None) -> Dict[str, Any]:
         """Mock: Trả về trạng thái máy in"""
         if printer_name is None:
             printer_name = self.default_printer
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Print Stream
+Job in dạng stream: StartDocPrinter một lần, WritePrinter cho từng chunk khi chunk tới
+(máy in mạng TCP RAW: ghi thẳng từng chunk vào kết nối)
+"""
+
+import asyncio
+import contextlib
+import logging
+import tempfile
+from typing import Any, Dict, Optional
+
+try:
+    import win32print
+except ImportError:
+    win32print = None
+
+logger = logging.getLogger(__name__)
+
+# Số chunk tối đa chờ ghi; khi đầy write() sẽ chờ, tạo backpressure lên socket
+DEFAULT_MAX_PENDING_CHUNKS = 4
+# Giới hạn tổng dung lượng một job stream
+DEFAULT_MAX_STREAM_BYTES = 512 * 1024 * 1024
+
+
+class PrintStreamError(Exception):
+    pass
+
+
+def stream_byte_limit(options: Dict[str, Any]) -> int:
+    """Giới hạn dung lượng job stream: max_stream_bytes do bên gửi đặt chỉ được giảm, không vượt DEFAULT_MAX_STREAM_BYTES"""
+    value = options.get('max_stream_bytes')
+    if not isinstance(value, int) or isinstance(value, bool) or value <= 0:
+        return DEFAULT_MAX_STREAM_BYTES
+    return min(value, DEFAULT_MAX_STREAM_BYTES)
+
+
+class PrintStream:
+    def __init__(self, handler, printer_name: str, options: Dict[str, Any]):
+        self.handler = handler
+        self.printer_name = printer_name
+        self.options = options
+        self.spool_via_file = bool(options.get('spool_via_file'))
+        self.max_bytes = stream_byte_limit(options)
+        self.bytes_written = 0
+        self.chunks_written = 0
+        self._pending_bytes = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._writer: Optional[asyncio.Task] = None
+        self._error: Optional[BaseException] = None
+        self._stack = contextlib.ExitStack()
+        self._handle = None
+        self._connection = None
+        self._spool_file = None
+        self._closed = False
+        self._done = False
+        # Job gửi thẳng tới máy in được tính vào circuit breaker (spool_via_file đi qua _print_file)
+        self._tracked = False
+
+    async def start(self):
+        """Mở job in (hoặc file spool) và khởi động writer"""
+        loop = asyncio.get_event_loop()
+        if not self.spool_via_file:
+            # Máy in đang lỗi: từ chối ngay, không mở job
+            self.handler.health.acquire(self.printer_name)
+            self._tracked = True
+        try:
+            if self.spool_via_file:
+                await self._run(self._sync_open_spool_file)
+            else:
+                await self._run(self._sync_start_doc)
+        except Exception as e:
+            self._record(e)
+            self._error = e
+            self._closed = True
+            self._done = True
+            await self._run(self._sync_close, True)
+            await self._remove_spool_file()
+            raise
+
+        self._queue = asyncio.Queue(
+            maxsize=self.options.get('max_pending_chunks', DEFAULT_MAX_PENDING_CHUNKS)
+        )
+        self._writer = loop.create_task(self._write_loop())
+
+    async def _run(self, func, *args):
+        """Chạy lời gọi máy in trong pool của PrintHandler (timeout theo option timeout).
+
+        Không giới hạn theo máy in: stream giữ handle/kết nối riêng suốt job, các lời gọi của nó
+        không tranh lượt với job khác
+        """
+        return await self.handler.executor.run(func, *args, timeout=self.options.get('timeout'))
+
+    def _sync_open_spool_file(self):
+        """Tạo file spool tạm (spool_via_file)"""
+        self._spool_file = tempfile.NamedTemporaryFile(suffix='.prn', delete=False)
+
+    def _sync_start_doc(self):
+        """Mượn handle (hoặc kết nối TCP) và bắt đầu job RAW trên máy in"""
+        raw_tcp = self.handler.raw_tcp
+        if raw_tcp.handles(self.printer_name):
+            self._connection = self._stack.enter_context(raw_tcp.checkout(self.printer_name))
+            return
+        handle = self._stack.enter_context(self.handler.handle_pool.checkout(self.printer_name))
+        job_info = ("Python Print Job", None, "RAW")
+        win32print.StartDocPrinter(handle, 1, job_info)
+        self._stack.callback(win32print.EndDocPrinter, handle)
+        win32print.StartPagePrinter(handle)
+        self._handle = handle
+
+    async def write(self, chunk) -> None:
+        """Đưa một chunk vào hàng đợi ghi; chờ nếu hàng đợi đã đầy"""
+        if self._closed:
+            raise PrintStreamError('Stream đã đóng')
+        if self._error is not None:
+            raise PrintStreamError(f'Lỗi ghi stream: {self._error}')
+        if self.bytes_written + self._pending_bytes + len(chunk) > self.max_bytes:
+            raise PrintStreamError(f'Stream vượt quá giới hạn {self.max_bytes} bytes')
+        self._pending_bytes += len(chunk)
+        await self._queue.put(chunk)
+
+    async def _write_loop(self):
+        """Ghi lần lượt các chunk trong executor"""
+        while True:
+            chunk = await self._queue.get()
+            if chunk is None:
+                return
+            self._pending_bytes -= len(chunk)
+            if self._error is not None:
+                # Bỏ qua phần còn lại sau khi đã lỗi, chỉ giải phóng hàng đợi
+                continue
+            try:
+                await self._run(self._sync_write, chunk)
+                self.bytes_written += len(chunk)
+                self.chunks_written += 1
+            except Exception as e:
+                logger.error(f"Lỗi khi ghi stream tới máy in {self.printer_name}: {e}")
+                self._error = e
+
+    def _sync_write(self, chunk):
+        """Ghi một chunk tới máy in hoặc file spool"""
+        if self._spool_file is not None:
+            self._spool_file.write(chunk)
+        elif self._connection is not None:
+            self._connection.sendall(chunk)
+        else:
+            win32print.WritePrinter(self._handle, chunk)
+
+    async def finish(self) -> bool:
+        """Ghi hết các chunk còn lại và kết thúc job"""
+        if self._closed:
+            return False
+        self._closed = True
+        await self._queue.put(None)
+        await self._writer
+        self._done = True
+
+        if self._error is not None:
+            self._record(self._error)
+            await self._run(self._sync_close, True)
+            return False
+
+        try:
+            if self._spool_file is not None:
+                await self._run(self._spool_file.close)
+                return await self.handler._print_file(self._spool_file.name, self.printer_name, self.options)
+
+            if self._handle is not None:
+                await self._run(win32print.EndPagePrinter, self._handle)
+            await self._run(self._sync_close, False)
+            self._record(None)
+            logger.info(f"Đã stream {self.bytes_written} bytes ({self.chunks_written} chunk) tới máy in {self.printer_name}")
+            return True
+
+        except Exception as e:
+            logger.error(f"Lỗi khi kết thúc stream tới máy in {self.printer_name}: {e}")
+            self._record(e)
+            await self._run(self._sync_close, True)
+            return False
+        finally:
+            await self._remove_spool_file()
+
+    async def abort(self):
+        """Hủy job stream, bỏ các chunk đang chờ"""
+        if self._done:
+            return
+        self._closed = True
+        self._done = True
+        if self._error is None:
+            # Hủy từ phía bên gửi: không phải lỗi máy in
+            if self._tracked:
+                self.handler.health.release(self.printer_name)
+                self._tracked = False
+            self._error = PrintStreamError('Stream bị hủy')
+        else:
+            self._record(self._error)
+        if self._writer is not None:
+            while not self._queue.empty():
+                self._queue.get_nowait()
+            await self._queue.put(None)
+            await self._writer
+
+        await self._run(self._sync_close, True)
+        await self._remove_spool_file()
+
+    def _record(self, error: Optional[BaseException]):
+        """Ghi kết quả job stream vào circuit breaker của máy in (một lần mỗi job)"""
+        if not self._tracked:
+            return
+        self._tracked = False
+        if error is None:
+            self.handler.health.record_success(self.printer_name)
+        else:
+            self.handler.health.record_failure(self.printer_name, error)
+
+    def _sync_close(self, failed: bool):
+        """Kết thúc job và trả handle; handle của job lỗi sẽ bị đóng hẳn"""
+        if self._spool_file is not None:
+            self._spool_file.close()
+        if failed:
+            exc = self._error or PrintStreamError('Stream lỗi')
+            self._stack.__exit__(type(exc), exc, exc.__traceback__)
+        else:
+            self._stack.close()
+
+    async def _remove_spool_file(self):
+        """Xóa file spool tạm nếu có (trong pool của PrintHandler)"""
+        if self._spool_file is not None:
+            await self.handler._remove_temp_file(self._spool_file.name)
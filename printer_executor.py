@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Printer Executor
+Pool thread riêng, có giới hạn, cho mọi lời gọi spooler/hệ điều hành của PrintHandler: event loop không bao giờ
+chờ driver. Mỗi lời gọi có timeout; số lời gọi đồng thời tới cùng một máy in bị giới hạn. Khi timeout hoặc bị hủy,
+thread đang chạy được báo dừng (check_cancelled) và máy in chỉ nhận lời gọi mới khi thread đó thật sự xong
+"""
+
+import asyncio
+import contextvars
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+# Timeout mặc định cho một lời gọi tới máy in (giây); None là không giới hạn
+DEFAULT_CALL_TIMEOUT = 120.0
+
+# Cờ hủy của lời gọi đang chạy trong thread hiện tại
+_cancel_event: contextvars.ContextVar[Optional[threading.Event]] = contextvars.ContextVar(
+    'printer_call_cancel', default=None
+)
+
+
+class PrinterTimeoutError(Exception):
+    """Lời gọi tới máy in không xong trong thời gian cho phép"""
+
+
+class PrinterBusyError(PrinterTimeoutError):
+    """Hết thời gian chờ lượt của máy in (máy in đang bận job khác); lời gọi chưa chạy"""
+
+
+class PrinterCallCancelled(Exception):
+    """Lời gọi bị hủy từ phía event loop (timeout, job bị hủy)"""
+
+
+def check_cancelled():
+    """Gọi giữa các bước dài trong thread (ví dụ giữa các chunk) để dừng sớm khi lời gọi đã bị hủy"""
+    event = _cancel_event.get()
+    if event is not None and event.is_set():
+        raise PrinterCallCancelled('Lời gọi tới máy in đã bị hủy')
+
+
+def cancellable_pages(pages: Iterable[Iterable[Any]]) -> Iterator[Iterator[Any]]:
+    """Bọc các trang/chunk để kiểm tra cờ hủy trước mỗi chunk"""
+    for chunks in pages:
+        check_cancelled()
+        yield _cancellable_chunks(chunks)
+
+
+def _cancellable_chunks(chunks: Iterable[Any]) -> Iterator[Any]:
+    for chunk in chunks:
+        check_cancelled()
+        yield chunk
+
+
+class PrinterExecutor:
+    def __init__(self, max_workers: int = 8, per_printer_limit: int = 1,
+                 default_timeout: Optional[float] = DEFAULT_CALL_TIMEOUT):
+        self.max_workers = max(1, int(max_workers))
+        self.per_printer_limit = max(1, int(per_printer_limit))
+        self.default_timeout = default_timeout
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='printer-io')
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._active: Dict[str, int] = {}
+        self._waiting: Dict[str, int] = {}
+        self._stats = {'calls': 0, 'timeouts': 0, 'cancelled': 0}
+
+    def _semaphore(self, printer: str) -> asyncio.Semaphore:
+        semaphore = self._semaphores.get(printer)
+        if semaphore is None:
+            semaphore = self._semaphores[printer] = asyncio.Semaphore(self.per_printer_limit)
+        return semaphore
+
+    async def run(self, func: Callable[..., Any], *args: Any, printer: Optional[str] = None,
+                  timeout: Optional[float] = None) -> Any:
+        """Chạy func(*args) trong pool; printer giới hạn đồng thời theo máy in, timeout tính cả lúc chờ lượt.
+
+        Timeout raise PrinterTimeoutError (PrinterBusyError nếu hết giờ khi còn chờ lượt);
+        bị hủy thì raise CancelledError như bình thường.
+        """
+        if timeout is None:
+            timeout = self.default_timeout
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        self._stats['calls'] += 1
+
+        semaphore = self._semaphore(printer) if printer else None
+        if semaphore is not None:
+            self._waiting[printer] = self._waiting.get(printer, 0) + 1
+            try:
+                await asyncio.wait_for(semaphore.acquire(), timeout)
+            except asyncio.TimeoutError:
+                self._stats['timeouts'] += 1
+                raise PrinterBusyError(f"Máy in {printer} bận quá {timeout}s")
+            finally:
+                self._waiting[printer] -= 1
+            self._active[printer] = self._active.get(printer, 0) + 1
+
+        # Chép context (nhãn metrics, jobId) sang thread và gắn cờ hủy riêng cho lời gọi này
+        cancel_event = threading.Event()
+        context = contextvars.copy_context()
+        context.run(_cancel_event.set, cancel_event)
+        try:
+            future = self._executor.submit(context.run, func, *args)
+        except BaseException:
+            if semaphore is not None:
+                self._release(printer, semaphore)
+            raise
+        if semaphore is not None:
+            # Chỉ nhả lượt khi thread thật sự xong: thread treo trong driver vẫn giữ lượt của máy in
+            future.add_done_callback(lambda _: self._release_threadsafe(loop, printer, semaphore))
+
+        try:
+            remaining = None if deadline is None else max(0.0, deadline - loop.time())
+            return await asyncio.wait_for(asyncio.wrap_future(future), remaining)
+        except asyncio.TimeoutError:
+            cancel_event.set()
+            self._stats['timeouts'] += 1
+            raise PrinterTimeoutError(
+                f"Máy in {printer} không phản hồi trong {timeout}s" if printer
+                else f"Lời gọi không xong trong {timeout}s"
+            )
+        except asyncio.CancelledError:
+            cancel_event.set()
+            self._stats['cancelled'] += 1
+            raise
+
+    def _release(self, printer: str, semaphore: asyncio.Semaphore):
+        self._active[printer] -= 1
+        semaphore.release()
+
+    def _release_threadsafe(self, loop: asyncio.AbstractEventLoop, printer: str, semaphore: asyncio.Semaphore):
+        try:
+            loop.call_soon_threadsafe(self._release, printer, semaphore)
+        except RuntimeError:
+            # Event loop đã đóng: không còn ai chờ lượt
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        stats = dict(self._stats)
+        stats.update({
+            'workers': self.max_workers,
+            'perPrinterLimit': self.per_printer_limit,
+            'active': {name: count for name, count in self._active.items() if count},
+            'waiting': {name: count for name, count in self._waiting.items() if count}
+        })
+        return stats
+
+    def shutdown(self):
+        """Dừng nhận lời gọi mới; lời gọi chưa chạy bị hủy, thread đang chạy không bị chờ"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Printer Health
+Circuit breaker theo máy in: sau nhiều lần lỗi liên tiếp, hoặc khi GetPrinter báo lỗi (offline, kẹt giấy, hết giấy...),
+job tới máy in đó bị từ chối ngay thay vì giữ thread chờ driver. Hết thời gian chờ, breaker chuyển half-open:
+máy in được probe định kỳ và một job được chạy thử; thành công thì đóng lại, lỗi thì mở tiếp với thời gian chờ gấp đôi
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# Bit lỗi trong trường Status của PRINTER_INFO_2; các bit còn lại (bận, đang in, tạm dừng...) không phải lỗi
+PRINTER_STATUS_FAULTS = {
+    0x00000002: 'error',
+    0x00000008: 'paper_jam',
+    0x00000010: 'paper_out',
+    0x00000040: 'paper_problem',
+    0x00000080: 'offline',
+    0x00000800: 'output_bin_full',
+    0x00001000: 'not_available',
+    0x00040000: 'no_toner',
+    0x00100000: 'user_intervention',
+    0x00200000: 'out_of_memory',
+    0x00400000: 'door_open',
+    0x00800000: 'server_unknown'
+}
+
+ProbeFunc = Callable[[List[str]], Awaitable[Any]]
+
+
+def status_faults(status: int) -> List[str]:
+    """Tên các lỗi trong trường Status (rỗng nếu máy in bình thường)"""
+    return [name for flag, name in PRINTER_STATUS_FAULTS.items() if status & flag]
+
+
+class PrinterUnavailableError(Exception):
+    """Máy in đang được coi là lỗi; job bị từ chối ngay"""
+
+    def __init__(self, printer_name: str, retry_after: float, reason: Optional[str] = None):
+        message = f"Máy in {printer_name} đang lỗi"
+        if reason:
+            message += f" ({reason})"
+        super().__init__(f"{message}, thử lại sau {retry_after:.1f}s")
+        self.printer_name = printer_name
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class _Breaker:
+    __slots__ = ('state', 'failures', 'reset_timeout', 'retry_at', 'trial', 'last_error', 'faults', 'changed_at')
+
+    def __init__(self, reset_timeout: float):
+        self.state = CLOSED
+        self.failures = 0
+        self.reset_timeout = reset_timeout
+        self.retry_at = 0.0
+        self.trial = False
+        self.last_error: Optional[str] = None
+        self.faults: List[str] = []
+        self.changed_at = time.monotonic()
+
+
+class PrinterHealth:
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 10.0,
+                 max_reset_timeout: float = 120.0, probe_interval: float = 5.0,
+                 probe: Optional[ProbeFunc] = None):
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.probe_interval = probe_interval
+        # Hàm probe nhận danh sách máy in; kết quả được ghi qua record_status (PrintHandler._probe_printers tự ghi)
+        self.probe = probe
+        self._breakers: Dict[str, _Breaker] = {}
+        self._probe_task: Optional[asyncio.Task] = None
+        self._stats = {'opened': 0, 'rejected': 0, 'recovered': 0}
+
+    def _breaker(self, printer_name: str) -> _Breaker:
+        breaker = self._breakers.get(printer_name)
+        if breaker is None:
+            breaker = self._breakers[printer_name] = _Breaker(self.reset_timeout)
+        return breaker
+
+    def state(self, printer_name: str) -> str:
+        breaker = self._breakers.get(printer_name)
+        return breaker.state if breaker is not None else CLOSED
+
+    def retry_after(self, printer_name: Optional[str]) -> Optional[float]:
+        """Số giây nên chờ nếu job tới máy in này sẽ bị từ chối ngay; None nếu job được chạy"""
+        breaker = self._breakers.get(printer_name) if printer_name else None
+        if breaker is None or breaker.state == CLOSED:
+            return None
+        if breaker.state == OPEN:
+            remaining = breaker.retry_at - time.monotonic()
+            return remaining if remaining > 0 else None
+        # Half-open: chỉ một job chạy thử tại một thời điểm
+        return self.probe_interval if breaker.trial else None
+
+    def acquire(self, printer_name: Optional[str]):
+        """Gọi trước khi gửi job tới máy in; raise PrinterUnavailableError nếu phải fail nhanh"""
+        if not printer_name:
+            return
+        retry_after = self.retry_after(printer_name)
+        breaker = self._breakers.get(printer_name)
+        if retry_after is not None:
+            self._stats['rejected'] += 1
+            raise PrinterUnavailableError(printer_name, retry_after, breaker.last_error)
+        if breaker is None or breaker.state == CLOSED:
+            return
+        if breaker.state == OPEN:
+            self._set_state(printer_name, breaker, HALF_OPEN)
+        breaker.trial = True
+
+    def release(self, printer_name: Optional[str]):
+        """Job bị hủy trước khi có kết quả: không tính thành công hay lỗi"""
+        breaker = self._breakers.get(printer_name) if printer_name else None
+        if breaker is not None:
+            breaker.trial = False
+
+    def record_success(self, printer_name: Optional[str]):
+        breaker = self._breakers.get(printer_name) if printer_name else None
+        if breaker is None:
+            return
+        if breaker.state != CLOSED:
+            self._stats['recovered'] += 1
+            logger.info(f"Máy in {printer_name} hoạt động lại")
+            self._set_state(printer_name, breaker, CLOSED)
+        breaker.failures = 0
+        breaker.reset_timeout = self.reset_timeout
+        breaker.trial = False
+        breaker.faults = []
+
+    def record_failure(self, printer_name: Optional[str], error: Any = None):
+        if not printer_name:
+            return
+        breaker = self._breaker(printer_name)
+        breaker.failures += 1
+        breaker.trial = False
+        if error is not None:
+            breaker.last_error = str(error) or type(error).__name__
+        if breaker.state == HALF_OPEN:
+            # Chạy thử vẫn lỗi: mở lại, chờ lâu hơn
+            self._open(printer_name, breaker, backoff=True)
+        elif breaker.state == CLOSED and breaker.failures >= self.failure_threshold:
+            self._open(printer_name, breaker)
+
+    def record_status(self, printer_name: str, printer_info: Any):
+        """Ghi nhận kết quả GetPrinter(handle, 2): dict thông tin, Exception nếu lỗi, None nếu quá hạn"""
+        if isinstance(printer_info, dict):
+            faults = status_faults(printer_info.get('Status', 0))
+            if faults:
+                breaker = self._breaker(printer_name)
+                breaker.faults = faults
+                breaker.last_error = ', '.join(faults)
+                if breaker.state == CLOSED:
+                    self._open(printer_name, breaker)
+                elif breaker.state == HALF_OPEN:
+                    self._open(printer_name, breaker, backoff=True)
+                return
+            breaker = self._breakers.get(printer_name)
+            if breaker is None or breaker.state == CLOSED:
+                return
+            breaker.faults = []
+            if breaker.state == OPEN:
+                # Máy in báo đã sẵn sàng: cho một job chạy thử ngay
+                self._set_state(printer_name, breaker, HALF_OPEN)
+            elif not breaker.trial:
+                self.record_success(printer_name)
+        elif isinstance(printer_info, Exception):
+            self.record_failure(printer_name, printer_info)
+        elif printer_info is None and self.state(printer_name) == HALF_OPEN:
+            # Probe quá hạn khi đang half-open: máy in vẫn treo
+            self.record_failure(printer_name, 'Timeout')
+
+    def _open(self, printer_name: str, breaker: _Breaker, backoff: bool = False):
+        if backoff:
+            breaker.reset_timeout = min(self.max_reset_timeout, breaker.reset_timeout * 2)
+        breaker.retry_at = time.monotonic() + breaker.reset_timeout
+        self._stats['opened'] += 1
+        logger.warning(f"Máy in {printer_name} tạm ngưng nhận job {breaker.reset_timeout:g}s ({breaker.last_error})")
+        self._set_state(printer_name, breaker, OPEN)
+
+    @staticmethod
+    def _set_state(printer_name: str, breaker: _Breaker, state: str):
+        if breaker.state != state:
+            logger.debug(f"Circuit breaker {printer_name}: {breaker.state} -> {state}")
+            breaker.state = state
+            breaker.changed_at = time.monotonic()
+
+    def snapshot(self, printer_name: str) -> Dict[str, Any]:
+        """Trạng thái breaker của máy in cho phản hồi getPrinters"""
+        breaker = self._breakers.get(printer_name)
+        if breaker is None:
+            return {'state': CLOSED, 'failures': 0}
+        data: Dict[str, Any] = {'state': breaker.state, 'failures': breaker.failures}
+        if breaker.state != CLOSED:
+            retry_after = self.retry_after(printer_name)
+            data['retryAfter'] = round(retry_after, 1) if retry_after is not None else 0
+            data['lastError'] = breaker.last_error
+            if breaker.faults:
+                data['faults'] = list(breaker.faults)
+        return data
+
+    def stats(self) -> Dict[str, Any]:
+        stats = dict(self._stats)
+        stats['printers'] = {
+            name: self.snapshot(name) for name, breaker in self._breakers.items() if breaker.state != CLOSED
+        }
+        return stats
+
+    def _due_for_probe(self) -> List[str]:
+        now = time.monotonic()
+        names = []
+        for name, breaker in self._breakers.items():
+            if breaker.state == HALF_OPEN and not breaker.trial:
+                names.append(name)
+            elif breaker.state == OPEN and now >= breaker.retry_at:
+                self._set_state(name, breaker, HALF_OPEN)
+                names.append(name)
+        return names
+
+    async def _probe_loop(self):
+        """Probe định kỳ các máy in half-open (hoặc đã hết thời gian chờ) để đóng breaker khi máy in ổn lại"""
+        while True:
+            await asyncio.sleep(self.probe_interval)
+            names = self._due_for_probe()
+            if not names:
+                continue
+            try:
+                await self.probe(names)
+            except Exception as e:
+                logger.warning(f"Không probe được máy in {', '.join(names)}: {e}")
+
+    def start(self):
+        if self.probe is not None and self._probe_task is None:
+            self._probe_task = asyncio.get_event_loop().create_task(self._probe_loop())
+
+    async def stop(self):
+        task, self._probe_task = self._probe_task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
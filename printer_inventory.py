@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Printer Inventory
+Cache danh sách máy in trong bộ nhớ, làm mới nền (stale-while-revalidate)
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+PrinterLoader = Callable[[], Union[List[Dict[str, Any]], Awaitable[List[Dict[str, Any]]]]]
+ChangeWatcher = Callable[[Callable[[], None], threading.Event], None]
+
+
+class PrinterInventory:
+    def __init__(self, loader: PrinterLoader, ttl: float = 30.0,
+                 refresh_interval: Optional[float] = 60.0,
+                 change_watcher: Optional[ChangeWatcher] = None):
+        self.loader = loader
+        self.ttl = ttl
+        self.refresh_interval = refresh_interval
+        self.change_watcher = change_watcher
+        self._printers: Optional[List[Dict[str, Any]]] = None
+        self._loaded_at = 0.0
+        self._updated_at: Optional[str] = None
+        # Có thay đổi trong lúc đang nạp: cần nạp lại sau khi xong
+        self._dirty = False
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._periodic_task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stop_event = threading.Event()
+        self._watcher_thread: Optional[threading.Thread] = None
+
+    @property
+    def updated_at(self) -> Optional[str]:
+        """Thời điểm dữ liệu cache được nạp gần nhất"""
+        return self._updated_at
+
+    def is_stale(self) -> bool:
+        """Cache đã quá TTL hoặc chưa có dữ liệu"""
+        return self._printers is None or time.monotonic() - self._loaded_at > self.ttl
+
+    async def get(self, force_refresh: bool = False) -> List[Dict[str, Any]]:
+        """Trả về danh sách máy in từ cache; dữ liệu cũ được trả ngay và làm mới nền"""
+        if self._printers is None or force_refresh:
+            await self.refresh()
+        elif self.is_stale():
+            self._schedule_refresh()
+
+        # Trả bản sao để nơi gọi có thể sửa (ví dụ thêm isDefault) mà không ảnh hưởng cache
+        return [dict(printer) for printer in self._printers or []]
+
+    async def refresh(self):
+        """Nạp lại danh sách máy in; các lời gọi đồng thời dùng chung một lần nạp"""
+        task = self._schedule_refresh()
+        await asyncio.shield(task)
+
+    def _schedule_refresh(self) -> asyncio.Task:
+        """Tạo task làm mới nếu chưa có task nào đang chạy"""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.get_event_loop().create_task(self._load())
+        return self._refresh_task
+
+    async def _load(self):
+        """Gọi loader (coroutine, hoặc hàm đồng bộ trong executor) để không chặn event loop"""
+        started = time.monotonic()
+        self._dirty = False
+        loop = asyncio.get_event_loop()
+        try:
+            if asyncio.iscoroutinefunction(self.loader):
+                printers = await self.loader()
+            else:
+                printers = await loop.run_in_executor(None, self.loader)
+            self._printers = printers
+            self._loaded_at = time.monotonic()
+            self._updated_at = datetime.now().isoformat()
+            logger.debug(f"Đã làm mới danh sách {len(printers)} máy in trong {self._loaded_at - started:.3f}s")
+        except Exception as e:
+            logger.error(f"Lỗi khi làm mới danh sách máy in: {e}")
+            if self._printers is None:
+                self._printers = []
+        
+        if self._dirty:
+            self._refresh_task = loop.create_task(self._load())
+
+    def invalidate(self):
+        """Đánh dấu cache cũ và làm mới nền ngay (gọi được từ thread khác)"""
+        self._loaded_at = 0.0
+        self._dirty = True
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._schedule_refresh()
+        else:
+            loop.call_soon_threadsafe(self._schedule_refresh)
+
+    def start(self):
+        """Nạp cache lần đầu, chạy làm mới định kỳ và theo dõi thay đổi máy in"""
+        self._loop = asyncio.get_event_loop()
+        self._stop_event.clear()
+        self._schedule_refresh()
+
+        if self.refresh_interval and self._periodic_task is None:
+            self._periodic_task = self._loop.create_task(self._periodic_refresh())
+
+        if self.change_watcher is not None and self._watcher_thread is None:
+            self._watcher_thread = threading.Thread(
+                target=self._run_watcher,
+                name='printer-change-watcher',
+                daemon=True
+            )
+            self._watcher_thread.start()
+
+    async def _periodic_refresh(self):
+        """Làm mới định kỳ để cache luôn ấm"""
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            self._schedule_refresh()
+
+    def _run_watcher(self):
+        """Chạy change watcher trong thread riêng"""
+        try:
+            self.change_watcher(self.invalidate, self._stop_event)
+        except Exception as e:
+            logger.warning(f"Không theo dõi được thay đổi máy in: {e}")
+
+    async def stop(self):
+        """Dừng làm mới nền và thread theo dõi"""
+        self._stop_event.set()
+        tasks = [task for task in (self._periodic_task, self._refresh_task) if task is not None]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        self._periodic_task = None
+        self._refresh_task = None
+        self._watcher_thread = None
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Printer Handle Pool
+Giữ và tái sử dụng handle win32print theo tên máy in thay vì OpenPrinter/ClosePrinter mỗi job
+"""
+
+import threading
+import time
+import logging
+from contextlib import contextmanager
+from typing import Any, Dict, List, Tuple
+
+try:
+    import win32print
+except ImportError:
+    win32print = None
+
+logger = logging.getLogger(__name__)
+
+
+class PrinterHandlePool:
+    def __init__(self, max_idle_per_printer: int = 2, idle_timeout: float = 300.0,
+                 health_check_interval: float = 30.0):
+        self.max_idle_per_printer = max_idle_per_printer
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+        # Mỗi phần tử: (handle, thời điểm trả về pool, thời điểm kiểm tra gần nhất)
+        self._idle: Dict[str, List[Tuple[Any, float, float]]] = {}
+        self._stats = {
+            'opened': 0,
+            'reused': 0,
+            'closed': 0,
+            'broken': 0,
+            'open_seconds': 0.0
+        }
+
+    @contextmanager
+    def checkout(self, printer_name: str):
+        """Mượn một handle cho máy in; handle lỗi sẽ bị đóng thay vì trả lại pool"""
+        handle, last_checked = self._acquire(printer_name)
+        try:
+            yield handle
+        except Exception:
+            self._discard(handle, broken=True)
+            raise
+        else:
+            self._release(printer_name, handle, last_checked)
+
+    def _acquire(self, printer_name: str) -> Tuple[Any, float]:
+        """Lấy handle rảnh còn tốt trong pool hoặc mở handle mới"""
+        if time.monotonic() - self._last_sweep > self.idle_timeout:
+            self.evict_idle()
+
+        while True:
+            with self._lock:
+                idle = self._idle.get(printer_name)
+                entry = idle.pop() if idle else None
+            if entry is None:
+                break
+
+            handle, released_at, last_checked = entry
+            now = time.monotonic()
+            if now - released_at > self.idle_timeout:
+                self._discard(handle)
+                continue
+            if now - last_checked > self.health_check_interval:
+                if not self._is_healthy(handle):
+                    self._discard(handle, broken=True)
+                    continue
+                last_checked = now
+
+            with self._lock:
+                self._stats['reused'] += 1
+            return handle, last_checked
+
+        if win32print is None:
+            raise RuntimeError('pywin32 không khả dụng, chỉ in được qua máy in mạng TCP RAW')
+        started = time.monotonic()
+        handle = win32print.OpenPrinter(printer_name)
+        now = time.monotonic()
+        with self._lock:
+            self._stats['opened'] += 1
+            self._stats['open_seconds'] += now - started
+        return handle, now
+
+    def _release(self, printer_name: str, handle: Any, last_checked: float):
+        """Trả handle về pool, đóng bớt nếu vượt giới hạn"""
+        with self._lock:
+            idle = self._idle.setdefault(printer_name, [])
+            if len(idle) < self.max_idle_per_printer:
+                idle.append((handle, time.monotonic(), last_checked))
+                return
+        self._discard(handle)
+
+    def _is_healthy(self, handle: Any) -> bool:
+        """Kiểm tra handle còn dùng được bằng GetPrinter"""
+        try:
+            win32print.GetPrinter(handle, 2)
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, handle: Any, broken: bool = False):
+        """Đóng handle"""
+        try:
+            win32print.ClosePrinter(handle)
+        except Exception as e:
+            logger.debug(f"Lỗi khi đóng handle máy in: {e}")
+        with self._lock:
+            self._stats['closed'] += 1
+            if broken:
+                self._stats['broken'] += 1
+
+    def evict_idle(self) -> int:
+        """Đóng các handle đã rảnh quá idle_timeout"""
+        now = time.monotonic()
+        expired = []
+        with self._lock:
+            self._last_sweep = now
+            for printer_name, idle in list(self._idle.items()):
+                keep = []
+                for entry in idle:
+                    if now - entry[1] > self.idle_timeout:
+                        expired.append(entry[0])
+                    else:
+                        keep.append(entry)
+                if keep:
+                    self._idle[printer_name] = keep
+                else:
+                    del self._idle[printer_name]
+
+        for handle in expired:
+            self._discard(handle)
+        return len(expired)
+
+    def invalidate(self, printer_name: str):
+        """Đóng toàn bộ handle rảnh của một máy in"""
+        with self._lock:
+            idle = self._idle.pop(printer_name, [])
+        for handle, _, _ in idle:
+            self._discard(handle)
+
+    def close_all(self):
+        """Đóng toàn bộ handle rảnh trong pool"""
+        with self._lock:
+            idle_lists = list(self._idle.values())
+            self._idle.clear()
+        for idle in idle_lists:
+            for handle, _, _ in idle:
+                self._discard(handle)
+
+    def stats(self) -> Dict[str, Any]:
+        """Thống kê mở/tái sử dụng handle để đo chi phí OpenPrinter"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['idle'] = sum(len(idle) for idle in self._idle.values())
+        return stats
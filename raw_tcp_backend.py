@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Raw TCP Backend
+Gửi job RAW thẳng tới máy in mạng qua cổng 9100 (JetDirect), không qua spooler Windows.
+Giữ kết nối lâu dài cho từng máy in (keepalive, tự kết nối lại) và gom nhiều chunk vào một lần gửi
+"""
+
+import itertools
+import logging
+import select
+import socket
+import socketserver
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+BytesLike = Union[bytes, bytearray, memoryview]
+Address = Tuple[str, int]
+
+DEFAULT_PORT = 9100
+ADDRESS_PREFIX = 'tcp://'
+
+# Gom chunk tới khoảng này rồi mới gửi (một lời gọi sendmsg cho nhiều buffer)
+PIPELINE_BYTES = 256 * 1024
+PIPELINE_MAX_BUFFERS = 64
+
+
+def parse_address(address: str) -> Address:
+    """'tcp://host:port', 'host:port' hoặc 'host' (cổng 9100)"""
+    if address.startswith(ADDRESS_PREFIX):
+        address = address[len(ADDRESS_PREFIX):]
+    address = address.rstrip('/')
+    if address.startswith('['):
+        # IPv6: [::1]:9100
+        host, _, rest = address[1:].partition(']')
+        port = rest.lstrip(':')
+        return host, int(port) if port else DEFAULT_PORT
+    host, _, port = address.rpartition(':')
+    if not host:
+        return address, DEFAULT_PORT
+    return host, int(port)
+
+
+def _enable_keepalive(sock: socket.socket, idle: int, interval: int, count: int):
+    """Bật TCP keepalive để phát hiện kết nối chết khi máy in tắt hoặc mất mạng"""
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    if hasattr(socket, 'TCP_KEEPIDLE'):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, idle)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, interval)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT, count)
+    elif hasattr(socket, 'SIO_KEEPALIVE_VALS'):
+        # Windows: (bật, thời gian chờ ms, chu kỳ ms)
+        sock.ioctl(socket.SIO_KEEPALIVE_VALS, (1, idle * 1000, interval * 1000))
+
+
+class RawTcpConnection:
+    def __init__(self, address: Address, connect_timeout: float, write_timeout: float,
+                 keepalive_idle: int, keepalive_interval: int, keepalive_count: int):
+        self.address = address
+        self.sock = socket.create_connection(address, timeout=connect_timeout)
+        self.sock.settimeout(write_timeout)
+        _enable_keepalive(self.sock, keepalive_idle, keepalive_interval, keepalive_count)
+        self.created_at = time.monotonic()
+        self.bytes_sent = 0
+
+    def is_alive(self) -> bool:
+        """Kết nối rảnh còn dùng được: máy in đóng kết nối thì socket đọc được và trả về b''"""
+        try:
+            readable, _, _ = select.select([self.sock], [], [], 0)
+            if not readable:
+                return True
+            data = self.sock.recv(4096)
+            # Một số máy in gửi byte trạng thái (ví dụ ESC/POS ASB): bỏ qua, kết nối vẫn sống
+            return bool(data)
+        except (OSError, ValueError):
+            return False
+
+    def sendall(self, data: BytesLike):
+        self.sock.sendall(data)
+        self.bytes_sent += len(data)
+
+    def send_chunks(self, chunks: Iterable[BytesLike]) -> int:
+        """Gửi các chunk theo lô: gom nhiều chunk nhỏ vào một lần gửi, không chờ phản hồi giữa các lô"""
+        total = 0
+        batch: List[BytesLike] = []
+        batch_bytes = 0
+        for chunk in chunks:
+            if not len(chunk):
+                continue
+            batch.append(chunk)
+            batch_bytes += len(chunk)
+            if batch_bytes >= PIPELINE_BYTES or len(batch) >= PIPELINE_MAX_BUFFERS:
+                self._send_batch(batch)
+                total += batch_bytes
+                batch = []
+                batch_bytes = 0
+        if batch:
+            self._send_batch(batch)
+            total += batch_bytes
+        return total
+
+    def _send_batch(self, buffers: List[BytesLike]):
+        if len(buffers) == 1 or not hasattr(self.sock, 'sendmsg'):
+            # Windows không có sendmsg: ghép lại rồi gửi một lần
+            data = buffers[0] if len(buffers) == 1 else b''.join(buffers)
+            self.sendall(data)
+            return
+
+        views = [memoryview(buffer) for buffer in buffers]
+        while views:
+            sent = self.sock.sendmsg(views)
+            self.bytes_sent += sent
+            while views and sent >= len(views[0]):
+                sent -= len(views[0])
+                views.pop(0)
+            if sent:
+                views[0] = views[0][sent:]
+
+    def close(self):
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class RawTcpBackend:
+    def __init__(self, printers: Optional[Dict[str, str]] = None, max_idle_per_printer: int = 1,
+                 idle_timeout: float = 120.0, connect_timeout: float = 5.0, write_timeout: float = 30.0,
+                 keepalive_idle: int = 30, keepalive_interval: int = 10, keepalive_count: int = 3,
+                 allow_addresses: bool = False):
+        self.printers: Dict[str, Address] = {}
+        # Tên máy in dạng tcp://host:port trong tin nhắn: tắt mặc định, nếu không bên gửi có thể bắt client
+        # mở kết nối và ghi dữ liệu tới bất kỳ máy nào trong mạng
+        self.allow_addresses = allow_addresses
+        # Máy in không giữ kết nối (ví dụ PCL/PostScript coi đóng kết nối là hết job)
+        self.non_persistent: Set[str] = set()
+        self.max_idle_per_printer = max_idle_per_printer
+        self.idle_timeout = idle_timeout
+        self.connect_timeout = connect_timeout
+        self.write_timeout = write_timeout
+        self.keepalive = (keepalive_idle, keepalive_interval, keepalive_count)
+        self._lock = threading.Lock()
+        # Mỗi phần tử: (kết nối, thời điểm trả về pool)
+        self._idle: Dict[Address, List[Tuple[RawTcpConnection, float]]] = {}
+        self._stats = {
+            'connected': 0,
+            'reused': 0,
+            'reconnected': 0,
+            'closed': 0,
+            'bytes': 0
+        }
+        for name, address in (printers or {}).items():
+            self.add_printer(name, address)
+
+    def add_printer(self, name: str, address: str, persistent: bool = True):
+        """Đăng ký máy in mạng theo tên hiển thị"""
+        self.printers[name] = parse_address(address)
+        if persistent:
+            self.non_persistent.discard(name)
+        else:
+            self.non_persistent.add(name)
+
+    def remove_printer(self, name: str):
+        address = self.printers.pop(name, None)
+        self.non_persistent.discard(name)
+        if address is not None:
+            self._close_idle(address)
+
+    def handles(self, printer_name: Optional[str]) -> bool:
+        """Máy in được gửi qua TCP RAW (đã đăng ký, hoặc tên dạng tcp://host:port nếu allow_addresses)"""
+        if not printer_name:
+            return False
+        return printer_name in self.printers or (self.allow_addresses and printer_name.startswith(ADDRESS_PREFIX))
+
+    def resolve(self, printer_name: str) -> Address:
+        address = self.printers.get(printer_name)
+        if address is not None:
+            return address
+        if not self.handles(printer_name):
+            raise ValueError(f"Máy in {printer_name} chưa được đăng ký trong network_printers")
+        return parse_address(printer_name)
+
+    def _connect(self, address: Address) -> RawTcpConnection:
+        connection = RawTcpConnection(address, self.connect_timeout, self.write_timeout, *self.keepalive)
+        with self._lock:
+            self._stats['connected'] += 1
+        logger.debug(f"Đã kết nối máy in {address[0]}:{address[1]}")
+        return connection
+
+    def _acquire(self, address: Address) -> Tuple[RawTcpConnection, bool]:
+        """Lấy kết nối rảnh còn sống hoặc mở kết nối mới; trả về (kết nối, có phải dùng lại)"""
+        while True:
+            with self._lock:
+                idle = self._idle.get(address)
+                entry = idle.pop() if idle else None
+            if entry is None:
+                return self._connect(address), False
+
+            connection, released_at = entry
+            if time.monotonic() - released_at > self.idle_timeout or not connection.is_alive():
+                self._discard(connection)
+                continue
+            with self._lock:
+                self._stats['reused'] += 1
+            return connection, True
+
+    def _release(self, printer_name: str, connection: RawTcpConnection):
+        if printer_name in self.non_persistent:
+            self._discard(connection)
+            return
+        with self._lock:
+            idle = self._idle.setdefault(connection.address, [])
+            if len(idle) < self.max_idle_per_printer:
+                idle.append((connection, time.monotonic()))
+                return
+        self._discard(connection)
+
+    def _discard(self, connection: RawTcpConnection):
+        connection.close()
+        with self._lock:
+            self._stats['closed'] += 1
+
+    def _close_idle(self, address: Address):
+        with self._lock:
+            idle = self._idle.pop(address, [])
+        for connection, _ in idle:
+            self._discard(connection)
+
+    @contextmanager
+    def checkout(self, printer_name: str):
+        """Mượn kết nối tới máy in; kết nối lỗi bị đóng thay vì trả lại pool"""
+        connection, _ = self._acquire(self.resolve(printer_name))
+        try:
+            yield connection
+        except Exception:
+            self._discard(connection)
+            raise
+        else:
+            self._release(printer_name, connection)
+
+    def send_pages(self, printer_name: str, pages: Iterable[Iterable[BytesLike]]) -> int:
+        """Gửi một job (nhiều trang, mỗi trang nhiều chunk) qua kết nối giữ sẵn; trả về số bytes đã gửi"""
+        address = self.resolve(printer_name)
+        chunks = itertools.chain.from_iterable(pages)
+        first = next(chunks, None)
+        if first is None:
+            return 0
+
+        # Kết nối dùng lại có thể đã bị máy in đóng: nếu lần ghi đầu lỗi thì kết nối lại và gửi lại chunk đầu
+        connection, reused = self._acquire(address)
+        try:
+            connection.sendall(first)
+        except OSError as e:
+            self._discard(connection)
+            if not reused:
+                raise
+            logger.info(f"Kết nối tới máy in {printer_name} đã đóng ({e}), kết nối lại")
+            with self._lock:
+                self._stats['reconnected'] += 1
+            connection = self._connect(address)
+            try:
+                connection.sendall(first)
+            except Exception:
+                self._discard(connection)
+                raise
+
+        try:
+            total = len(first) + connection.send_chunks(chunks)
+        except Exception:
+            self._discard(connection)
+            raise
+
+        self._release(printer_name, connection)
+        with self._lock:
+            self._stats['bytes'] += total
+        return total
+
+    def probe(self, printer_name: str) -> Dict[str, Any]:
+        """Kiểm tra máy in có kết nối được không; kết nối mở để kiểm tra được giữ lại cho job sau"""
+        address = self.resolve(printer_name)
+        connection, _ = self._acquire(address)
+        self._release(printer_name, connection)
+        return {
+            'Status': 0,
+            'cJobs': 0,
+            'pLocation': f"{address[0]}:{address[1]}",
+            'pComment': 'RAW TCP'
+        }
+
+    def close_all(self):
+        """Đóng toàn bộ kết nối rảnh"""
+        with self._lock:
+            addresses = list(self._idle)
+        for address in addresses:
+            self._close_idle(address)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['idle'] = sum(len(idle) for idle in self._idle.values())
+        return stats
+
+
+class _RawPrinterHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+            server.clients.add(self.request)
+        try:
+            while True:
+                data = self.request.recv(65536)
+                if not data:
+                    break
+                with server.lock:
+                    if server.keep_data:
+                        server.received.extend(data)
+                    server.bytes_received += len(data)
+                if server.bytes_per_second:
+                    # Giả lập tốc độ in cố định: đọc chậm lại để TCP tạo backpressure như máy in thật
+                    time.sleep(len(data) / server.bytes_per_second)
+        except OSError:
+            pass
+        finally:
+            with server.lock:
+                server.clients.discard(self.request)
+
+
+class _RawPrinterServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class LocalRawPrinter:
+    """Máy in giả lập nghe TCP trên máy local, dùng để thử backend RAW TCP không cần máy in thật"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, bytes_per_second: Optional[float] = None,
+                 keep_data: bool = True):
+        self._server = _RawPrinterServer((host, port), _RawPrinterHandler)
+        self._server.lock = threading.Lock()
+        self._server.bytes_per_second = bytes_per_second
+        # keep_data=False: chỉ đếm bytes, không giữ dữ liệu (chạy benchmark dài)
+        self._server.keep_data = keep_data
+        self._server.received = bytearray()
+        self._server.bytes_received = 0
+        self._server.connections = 0
+        self._server.clients = set()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def address(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"{ADDRESS_PREFIX}{host}:{port}"
+
+    @property
+    def received(self) -> bytes:
+        with self._server.lock:
+            return bytes(self._server.received)
+
+    @property
+    def bytes_received(self) -> int:
+        with self._server.lock:
+            return self._server.bytes_received
+
+    @property
+    def connections(self) -> int:
+        with self._server.lock:
+            return self._server.connections
+
+    def start(self) -> 'LocalRawPrinter':
+        self._thread = threading.Thread(target=self._server.serve_forever, name='local-raw-printer', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Dừng nghe và đóng các kết nối đang mở (giống máy in bị tắt)"""
+        self._server.shutdown()
+        self._server.server_close()
+        with self._server.lock:
+            clients = list(self._server.clients)
+        for sock in clients:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+if __name__ == '__main__':
+    import sys
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_PORT
+    printer = LocalRawPrinter('0.0.0.0', port).start()
+    logger.info(f"🖨️ Máy in giả lập đang nghe cổng {port} (Ctrl+C để dừng)")
+    try:
+        last = 0
+        while True:
+            time.sleep(1)
+            size = len(printer.received)
+            if size != last:
+                logger.info(f"Đã nhận {size} bytes qua {printer.connections} kết nối")
+                last = size
+    except KeyboardInterrupt:
+        printer.stop()
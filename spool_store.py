@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Spool Store
+Thư mục spool có quản lý: tên file theo job ID duy nhất, giới hạn dung lượng và tuổi, loại bỏ theo LRU
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Any, Dict, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+BytesLike = Union[bytes, bytearray, memoryview]
+
+INDEX_FILENAME = 'index.json'
+
+FILE_SUFFIXES = {
+    'pdf': '.pdf',
+    'image': '.img',
+    'raw': '.prn',
+    'text': '.txt',
+    'html': '.html'
+}
+
+
+class SpoolStore:
+    def __init__(self, directory: Optional[str] = None, max_bytes: int = 512 * 1024 * 1024,
+                 max_age: float = 7 * 24 * 3600, max_jobs: int = 10000, access_save_interval: float = 30.0):
+        if directory is None:
+            directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'spool')
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.max_jobs = max_jobs
+        # last_access chỉ cần cho thứ tự LRU: ghi gộp tối đa mỗi access_save_interval giây, không ghi mỗi lần đọc
+        self.access_save_interval = access_save_interval
+        self._lock = threading.Lock()
+        self._index: Dict[str, Dict[str, Any]] = {}
+        self._total_bytes = 0
+        self._loaded = False
+        self._dirty = False
+        self._saved_at = 0.0
+
+    def _ensure_loaded(self):
+        """Tạo thư mục và nạp index lần đầu (gọi khi đã giữ lock)"""
+        if self._loaded:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        index_path = os.path.join(self.directory, INDEX_FILENAME)
+        try:
+            with open(index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except FileNotFoundError:
+            index = {}
+        except Exception as e:
+            logger.warning(f"Không đọc được index spool, tạo index mới: {e}")
+            index = {}
+
+        # Bỏ các mục mà file đã bị xóa ngoài ý muốn
+        self._index = {
+            job_id: entry for job_id, entry in index.items()
+            if os.path.exists(os.path.join(self.directory, entry['file']))
+        }
+        self._total_bytes = sum(entry['size'] for entry in self._index.values())
+        self._loaded = True
+        self._saved_at = time.monotonic()
+
+    def _save_index(self):
+        """Ghi index ra đĩa (ghi file tạm rồi đổi tên để không hỏng index)"""
+        index_path = os.path.join(self.directory, INDEX_FILENAME)
+        temp_path = index_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._index, f)
+        os.replace(temp_path, index_path)
+        self._dirty = False
+        self._saved_at = time.monotonic()
+
+    def store(self, data: BytesLike, content_type: str, metadata: Optional[Dict[str, Any]] = None) -> str:
+        """Lưu job vào spool, trả về job ID"""
+        job_id = uuid.uuid4().hex
+        filename = job_id + FILE_SUFFIXES.get(content_type, '.bin')
+        now = time.time()
+
+        with self._lock:
+            self._ensure_loaded()
+            with open(os.path.join(self.directory, filename), 'wb') as f:
+                f.write(data)
+
+            self._index[job_id] = {
+                'file': filename,
+                'size': len(data),
+                'content_type': content_type,
+                'created': now,
+                'last_access': now,
+                'metadata': metadata or {}
+            }
+            self._total_bytes += len(data)
+            self._enforce_limits(keep=job_id)
+            self._save_index()
+
+        logger.info(f"Đã lưu job {job_id} vào spool ({len(data)} bytes)")
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Lấy thông tin job (kèm đường dẫn file), đánh dấu vừa dùng"""
+        with self._lock:
+            self._ensure_loaded()
+            entry = self._index.get(job_id)
+            if entry is None:
+                return None
+            entry['last_access'] = time.time()
+            self._dirty = True
+            if time.monotonic() - self._saved_at >= self.access_save_interval:
+                self._save_index()
+            return {**entry, 'id': job_id, 'path': os.path.join(self.directory, entry['file'])}
+
+    def flush(self):
+        """Ghi last_access còn chờ ra index (gọi khi dừng client)"""
+        with self._lock:
+            if self._loaded and self._dirty:
+                self._save_index()
+
+    def remove(self, job_id: str) -> bool:
+        """Xóa job khỏi spool"""
+        with self._lock:
+            self._ensure_loaded()
+            if job_id not in self._index:
+                return False
+            self._remove_entry(job_id)
+            self._save_index()
+            return True
+
+    def _remove_entry(self, job_id: str):
+        """Xóa file và mục index (gọi khi đã giữ lock)"""
+        entry = self._index.pop(job_id)
+        self._total_bytes -= entry['size']
+        try:
+            os.unlink(os.path.join(self.directory, entry['file']))
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Không xóa được file spool {entry['file']}: {e}")
+
+    def _enforce_limits(self, keep: Optional[str] = None):
+        """Xóa job quá tuổi, sau đó loại job ít dùng nhất cho tới khi đủ giới hạn"""
+        now = time.time()
+        for job_id in [job_id for job_id, entry in self._index.items()
+                       if job_id != keep and now - entry['created'] > self.max_age]:
+            self._remove_entry(job_id)
+
+        if self._total_bytes <= self.max_bytes and len(self._index) <= self.max_jobs:
+            return
+
+        candidates = sorted(
+            (entry['last_access'], job_id) for job_id, entry in self._index.items() if job_id != keep
+        )
+        for _, job_id in candidates:
+            if self._total_bytes <= self.max_bytes and len(self._index) <= self.max_jobs:
+                break
+            self._remove_entry(job_id)
+
+    def cleanup(self):
+        """Áp dụng lại giới hạn dung lượng/tuổi"""
+        with self._lock:
+            self._ensure_loaded()
+            self._enforce_limits()
+            self._save_index()
+
+    def stats(self) -> Dict[str, Any]:
+        """Thống kê spool"""
+        with self._lock:
+            self._ensure_loaded()
+            return {
+                'directory': self.directory,
+                'jobs': len(self._index),
+                'bytes': self._total_bytes
+            }
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Template Engine
+Template hóa đơn/nhãn đăng ký một lần, biên dịch thành các đoạn bytes tĩnh và slot biến
+"""
+
+import html
+import logging
+import re
+import threading
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# {{name}}, {{name:>10}} (format spec của Python), {{#items}}...{{/items}} (lặp danh sách)
+_TOKEN = re.compile(r'\{\{\s*([#/]?)([\w.]+)(?::([^}]*))?\s*\}\}')
+
+
+class TemplateError(Exception):
+    pass
+
+
+class Slot(NamedTuple):
+    name: str
+    spec: str
+
+
+class Section(NamedTuple):
+    name: str
+    segments: List[Any]
+
+
+Segment = Union[bytes, Slot, Section]
+
+
+def _lookup(variables: Dict[str, Any], name: str) -> Any:
+    """Lấy giá trị theo tên có dấu chấm (customer.name); {{.}} là phần tử hiện tại của section"""
+    if name == '.':
+        return variables.get('.', '')
+    value: Any = variables
+    for part in name.split('.'):
+        if isinstance(value, dict):
+            value = value.get(part, '')
+        else:
+            return ''
+    return value
+
+
+class CompiledTemplate:
+    def __init__(self, name: str, source: str, content_type: str = 'text', encoding: str = 'utf-8'):
+        self.name = name
+        self.content_type = content_type
+        self.encoding = encoding
+        self.segments = self._compile(source)
+        self.slots = sorted(self._collect_slots(self.segments))
+
+    def _compile(self, source: str) -> List[Segment]:
+        """Tách template thành đoạn tĩnh (đã encode sẵn), slot biến và section lặp"""
+        root: List[Segment] = []
+        stack: List[Tuple[str, List[Segment]]] = [('', root)]
+        position = 0
+
+        for match in _TOKEN.finditer(source):
+            static = source[position:match.start()]
+            if static:
+                stack[-1][1].append(static.encode(self.encoding))
+            position = match.end()
+
+            marker, name, spec = match.group(1), match.group(2), match.group(3) or ''
+            if marker == '#':
+                section = Section(name, [])
+                stack[-1][1].append(section)
+                stack.append((name, section.segments))
+            elif marker == '/':
+                if len(stack) == 1 or stack[-1][0] != name:
+                    raise TemplateError(f"Thẻ đóng {{{{/{name}}}}} không khớp trong template {self.name}")
+                stack.pop()
+            else:
+                stack[-1][1].append(Slot(name, spec))
+
+        if len(stack) > 1:
+            raise TemplateError(f"Thiếu thẻ đóng {{{{/{stack[-1][0]}}}}} trong template {self.name}")
+
+        static = source[position:]
+        if static:
+            root.append(static.encode(self.encoding))
+        return self._merge_static(root)
+
+    def _merge_static(self, segments: List[Segment]) -> List[Segment]:
+        """Gộp các đoạn tĩnh liền nhau"""
+        merged: List[Segment] = []
+        for segment in segments:
+            if isinstance(segment, Section):
+                segment = Section(segment.name, self._merge_static(segment.segments))
+            if isinstance(segment, bytes) and merged and isinstance(merged[-1], bytes):
+                merged[-1] = merged[-1] + segment
+            else:
+                merged.append(segment)
+        return merged
+
+    def _collect_slots(self, segments: List[Segment]) -> set:
+        """Tên biến của template, kể cả biến bên trong section ({{.}} không tính)"""
+        names = set()
+        for segment in segments:
+            if isinstance(segment, Slot):
+                if segment.name != '.':
+                    names.add(segment.name)
+            elif isinstance(segment, Section):
+                names.add(segment.name)
+                names |= self._collect_slots(segment.segments)
+        return names
+
+    def _format_value(self, value: Any, spec: str) -> bytes:
+        if value is None:
+            value = ''
+        text = format(value, spec) if spec else str(value)
+        if self.content_type == 'html':
+            text = html.escape(text)
+        return text.encode(self.encoding)
+
+    def _render_into(self, parts: List[bytes], segments: List[Segment], variables: Dict[str, Any]):
+        for segment in segments:
+            if isinstance(segment, bytes):
+                parts.append(segment)
+            elif isinstance(segment, Slot):
+                parts.append(self._format_value(_lookup(variables, segment.name), segment.spec))
+            else:
+                # Như Mustache: danh sách thì lặp, dict là một scope, giá trị khác chỉ xét đúng/sai
+                # (chạy một lần với {{.}} là giá trị đó)
+                value = _lookup(variables, segment.name)
+                if isinstance(value, (list, tuple)):
+                    items = value
+                else:
+                    items = [value] if value else []
+                for item in items:
+                    scope = {**variables, **item} if isinstance(item, dict) else {**variables, '.': item}
+                    self._render_into(parts, segment.segments, scope)
+
+    def render(self, variables: Optional[Dict[str, Any]] = None) -> bytes:
+        """Ghép đoạn tĩnh với giá trị biến, chỉ phần biến được format mỗi job"""
+        parts: List[bytes] = []
+        self._render_into(parts, self.segments, variables or {})
+        return b''.join(parts)
+
+
+class TemplateRegistry:
+    def __init__(self):
+        self._templates: Dict[str, CompiledTemplate] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, source: str, content_type: str = 'text', encoding: str = 'utf-8') -> CompiledTemplate:
+        """Biên dịch và lưu template (ghi đè template cùng tên)"""
+        template = CompiledTemplate(name, source, content_type, encoding)
+        with self._lock:
+            self._templates[name] = template
+        logger.info(f"Đã đăng ký template {name} ({len(template.slots)} biến)")
+        return template
+
+    def get(self, name: str) -> Optional[CompiledTemplate]:
+        with self._lock:
+            return self._templates.get(name)
+
+    def remove(self, name: str) -> bool:
+        with self._lock:
+            return self._templates.pop(name, None) is not None
+
+    def names(self) -> List[str]:
+        with self._lock:
+            return sorted(self._templates)
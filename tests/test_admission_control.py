@@ -0,0 +1,56 @@
+import asyncio
+
+from admission_control import AdmissionController
+
+
+def test_rejects_when_job_limit_reached():
+    admission = AdmissionController(max_jobs=2, max_bytes=1000)
+    first = admission.try_admit(10)
+    second = admission.try_admit(10)
+
+    assert first is not None and second is not None
+    assert admission.is_full()
+    assert admission.try_admit(10) is None
+    assert admission.stats()['rejected'] == 1
+
+    admission.release(first)
+    assert admission.try_admit(10) is not None
+
+
+def test_rejects_job_that_does_not_fit_bytes():
+    admission = AdmissionController(max_jobs=10, max_bytes=100)
+    ticket = admission.try_admit(60)
+    assert admission.try_admit(50) is None
+    assert admission.try_admit(40) is not None
+    assert admission.credits() == {'jobs': 8, 'bytes': 0}
+
+    admission.release(ticket)
+    assert admission.bytes == 40
+
+
+def test_empty_queue_admits_oversized_job():
+    admission = AdmissionController(max_jobs=4, max_bytes=100)
+    assert admission.try_admit(500) is not None
+    assert admission.try_admit(1) is None
+
+
+def test_wait_for_capacity_resumes_below_ratio():
+    async def scenario():
+        admission = AdmissionController(max_jobs=4, max_bytes=1000, resume_ratio=0.5)
+        tickets = [admission.try_admit(1) for _ in range(4)]
+        assert not await admission.wait_for_capacity(timeout=0.01)
+
+        waiter = asyncio.ensure_future(admission.wait_for_capacity(timeout=1.0))
+        admission.release(tickets.pop())
+        await asyncio.sleep(0)
+        # 3 job vẫn trên mức nhận lại (4 * 0.5)
+        assert not waiter.done()
+        admission.release(tickets.pop())
+        assert await waiter
+
+    asyncio.run(scenario())
+
+
+def test_retry_after_defaults_when_idle():
+    admission = AdmissionController()
+    assert admission.retry_after() == 1.0
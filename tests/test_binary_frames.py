@@ -0,0 +1,74 @@
+import asyncio
+
+from websocket_print_client import WebSocketPrintClient
+
+
+def run_client(scenario, **kwargs):
+    async def main():
+        client = WebSocketPrintClient(**kwargs)
+        sent = []
+
+        async def send_message(message):
+            sent.append(message)
+
+        client.send_message = send_message
+        try:
+            await scenario(client, sent)
+        finally:
+            await client.dispatcher.cancel_all()
+            client.print_handler.executor.shutdown()
+            client.print_handler.preparer.shutdown()
+
+    asyncio.run(main())
+
+
+def test_oversized_print_header_rejected_without_allocation():
+    async def scenario(client, sent):
+        await client._begin_binary_job({'type': 'print', 'jobId': 'j1', 'binary': True, 'size': 2 ** 45})
+        assert client._pending_binary is None
+        assert sent == [{'type': 'print', 'success': False, 'jobId': 'j1',
+                         'error': f'Binary body too large: {2 ** 45} > 1000 bytes'}]
+
+    run_client(scenario, max_queued_bytes=1000)
+
+
+def test_chunk_header_for_unknown_stream_bounded_by_stream_buffer():
+    async def scenario(client, sent):
+        header = {'type': 'printChunk', 'jobId': 'missing', 'seq': 0, 'binary': True, 'size': 50 * 1024 * 1024}
+        assert client._binary_size_limit(header) == 1024
+        await client._begin_binary_job(header)
+        assert client._pending_binary is None
+        assert sent[-1]['success'] is False and 'too large' in sent[-1]['error']
+
+    run_client(scenario, stream_buffer_bytes=1024)
+
+
+def test_undeclared_size_checked_on_first_frame():
+    async def scenario(client, sent):
+        await client._begin_binary_job({'type': 'print', 'jobId': 'j2', 'binary': True})
+        assert await client._receive_binary_frame(b'x' * 101) is None
+        assert client._pending_binary is None
+        assert sent[-1]['jobId'] == 'j2' and 'too large' in sent[-1]['error']
+
+    run_client(scenario, max_queued_bytes=100)
+
+
+def test_invalid_size_rejected():
+    async def scenario(client, sent):
+        for size in (-1, '10', True):
+            await client._begin_binary_job({'type': 'print', 'jobId': 'j3', 'binary': True, 'size': size})
+            assert client._pending_binary is None
+        assert all('Invalid binary size' in message['error'] for message in sent)
+
+    run_client(scenario)
+
+
+def test_declared_size_within_limit_is_assembled():
+    async def scenario(client, sent):
+        await client._begin_binary_job({'type': 'print', 'jobId': 'j4', 'binary': True, 'size': 6})
+        assert await client._receive_binary_frame(b'abc') is None
+        message = await client._receive_binary_frame(b'def')
+        assert message['content'] == bytearray(b'abcdef')
+        assert client._pending_binary is None
+
+    run_client(scenario, max_queued_bytes=100)
@@ -0,0 +1,156 @@
+import asyncio
+import types
+
+import pytest
+import websockets
+from websockets.frames import Close
+from websockets.protocol import State
+
+import connection_manager
+from connection_manager import ConnectionManager
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.state = State.OPEN
+        self.sent = []
+        self.inbox = asyncio.Queue()
+
+    async def send(self, payload):
+        if self.state != State.OPEN:
+            raise websockets.exceptions.ConnectionClosedOK(None, None)
+        self.sent.append(payload)
+
+    async def recv(self):
+        item = await self.inbox.get()
+        if isinstance(item, BaseException):
+            raise item
+        return item
+
+    def heartbeat_timeout(self):
+        """Như websockets khi không nhận được pong trong ping_timeout: đóng với mã 1011"""
+        self.state = State.CLOSED
+        self.inbox.put_nowait(websockets.exceptions.ConnectionClosedError(
+            None, Close(1011, 'keepalive ping timeout'), None
+        ))
+
+    async def close(self):
+        self.state = State.CLOSED
+
+
+class FakeServer:
+    """Thay websockets.connect: lần lượt lỗi hoặc trả về FakeWebSocket theo kịch bản"""
+
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = []
+        self.sockets = []
+
+    async def connect(self, url, **kwargs):
+        self.calls.append(kwargs)
+        if self.outcomes.pop(0) == 'fail':
+            raise ConnectionRefusedError('refused')
+        websocket = FakeWebSocket()
+        self.sockets.append(websocket)
+        return websocket
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = types.SimpleNamespace(now=1000.0)
+    clock.monotonic = lambda: clock.now
+    monkeypatch.setattr(connection_manager, 'time', clock)
+    # Bỏ jitter: next_delay trả đúng giới hạn backoff
+    monkeypatch.setattr(connection_manager, 'random', types.SimpleNamespace(uniform=lambda low, high: high))
+    return clock
+
+
+def fake_server(monkeypatch, outcomes):
+    server = FakeServer(outcomes)
+    monkeypatch.setattr(connection_manager.websockets, 'connect', server.connect)
+    return server
+
+
+def make_manager(**kwargs):
+    return ConnectionManager('ws://server', backoff_initial=0.1, backoff_max=1.0, backoff_factor=2.0,
+                             stable_after=5.0, **kwargs)
+
+
+def test_backoff_grows_and_is_capped(monkeypatch, clock):
+    fake_server(monkeypatch, ['fail'] * 6)
+    manager = make_manager()
+
+    async def scenario():
+        delays = []
+        for _ in range(6):
+            assert not await manager.connect()
+            delays.append(manager.next_delay())
+        return delays
+
+    assert asyncio.run(scenario()) == pytest.approx([0.1, 0.2, 0.4, 0.8, 1.0, 1.0])
+    assert manager.stats()['failures'] == 6
+
+
+def test_first_retry_is_immediate_range(monkeypatch, clock):
+    monkeypatch.setattr(connection_manager, 'random', types.SimpleNamespace(uniform=lambda low, high: (low, high)))
+    manager = make_manager()
+    assert manager.next_delay() == (0, 0.1)
+
+
+def test_stable_connection_resets_backoff(monkeypatch, clock):
+    server = fake_server(monkeypatch, ['fail', 'fail', 'fail', 'ok', 'ok'])
+    manager = make_manager()
+
+    async def scenario():
+        for _ in range(3):
+            await manager.connect()
+        assert manager.next_delay() == pytest.approx(0.4)
+
+        assert await manager.connect()
+        clock.now += 5.0
+        manager.connection_lost()
+        # Kết nối đã sống đủ lâu: lần kết nối lại bắt đầu từ độ trễ nhỏ nhất
+        assert manager.next_delay() == pytest.approx(0.1)
+
+        assert await manager.connect()
+        clock.now += 1.0
+        manager.connection_lost()
+        # Kết nối rớt ngay sau khi mở: vẫn tăng backoff
+        assert manager.next_delay() == pytest.approx(0.1)
+        manager.connection_lost()
+        assert manager.next_delay() == pytest.approx(0.2)
+
+    asyncio.run(scenario())
+    assert len(server.calls) == 5
+
+
+def test_heartbeat_timeout_closes_and_buffers_until_reconnect(monkeypatch, clock):
+    server = fake_server(monkeypatch, ['ok', 'ok'])
+    manager = make_manager(ping_interval=1.0, ping_timeout=2.0)
+
+    async def scenario():
+        assert await manager.connect()
+        assert server.calls[0]['ping_interval'] == 1.0
+        assert server.calls[0]['ping_timeout'] == 2.0
+
+        first = server.sockets[0]
+        first.inbox.put_nowait('hello')
+        assert await manager.recv() == 'hello'
+
+        first.heartbeat_timeout()
+        with pytest.raises(websockets.exceptions.ConnectionClosed):
+            await manager.recv()
+        assert not manager.connected
+        manager.connection_lost()
+
+        # Kết quả job trong lúc mất kết nối được giữ lại, tin nhắn tức thời bị bỏ
+        assert await manager.send('result', buffer=True)
+        assert not await manager.send('flow')
+        assert manager.stats()['pendingMessages'] == 1
+
+        assert await manager.connect()
+        assert await manager.flush() == 1
+        return server.sockets[1].sent
+
+    assert asyncio.run(scenario()) == ['result']
+    assert manager.stats()['pendingMessages'] == 0
@@ -0,0 +1,55 @@
+from document_cache import DocumentCache
+
+
+def test_get_marks_entry_recently_used():
+    cache = DocumentCache(max_bytes=30, max_document_bytes=30)
+    a = cache.put(b'a' * 10, 'raw')
+    b = cache.put(b'b' * 10, 'raw')
+    c = cache.put(b'c' * 10, 'raw')
+
+    assert cache.get(a).data == b'a' * 10
+    d = cache.put(b'd' * 10, 'raw')
+
+    # b là tài liệu lâu không dùng nhất sau khi a vừa được đọc
+    assert b not in cache
+    assert a in cache and c in cache and d in cache
+    assert cache.stats()['evictions'] == 1
+    assert cache.stats()['bytes'] == 30
+
+
+def test_eviction_until_under_limit():
+    cache = DocumentCache(max_bytes=25, max_document_bytes=25)
+    first = cache.put(b'1' * 10, 'raw')
+    second = cache.put(b'2' * 10, 'raw')
+    third = cache.put(b'3' * 20, 'pdf')
+
+    assert first not in cache and second not in cache
+    assert cache.get(third).content_type == 'pdf'
+    assert cache.stats()['evictions'] == 2
+
+
+def test_oversized_document_is_not_cached():
+    cache = DocumentCache(max_bytes=100, max_document_bytes=10)
+    kept = cache.put(b'k' * 5, 'raw')
+    doc_hash = cache.put(b'x' * 11, 'raw')
+
+    assert doc_hash == DocumentCache.compute_hash(b'x' * 11)
+    assert doc_hash not in cache
+    assert kept in cache
+
+
+def test_put_same_document_does_not_double_count():
+    cache = DocumentCache(max_bytes=100)
+    cache.put(b'same', 'raw')
+    cache.put(b'same', 'raw')
+    assert cache.stats()['entries'] == 1
+    assert cache.stats()['bytes'] == 4
+
+
+def test_hit_and_miss_stats():
+    cache = DocumentCache()
+    doc_hash = cache.put(b'data', 'text')
+    cache.get(doc_hash)
+    cache.get('missing')
+    stats = cache.stats()
+    assert stats['hits'] == 1 and stats['misses'] == 1
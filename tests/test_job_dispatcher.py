@@ -0,0 +1,117 @@
+import asyncio
+
+from job_dispatcher import FairQueue, JobDispatcher
+
+
+def _drain(queue):
+    order = []
+    while queue:
+        order.append(queue.pop().job)
+    return order
+
+
+def _push(queue, name, client_id='', priority='normal', cost=1.0):
+    queue.push(name, None, client_id, priority, cost)
+
+
+def test_fifo_within_one_flow():
+    queue = FairQueue()
+    for name in ('a', 'b', 'c'):
+        _push(queue, name, 'client')
+    assert _drain(queue) == ['a', 'b', 'c']
+
+
+def test_clients_share_lane_fairly():
+    queue = FairQueue()
+    for i in range(4):
+        _push(queue, f'bulk{i}', 'busy')
+    _push(queue, 'receipt', 'shop')
+
+    # Job của client mới không phải chờ sau toàn bộ job của client đang dồn
+    assert _drain(queue).index('receipt') <= 1
+
+
+def test_interactive_served_before_bulk_backlog():
+    queue = FairQueue()
+    for i in range(10):
+        _push(queue, f'bulk{i}', 'c', 'bulk')
+    for i in range(3):
+        _push(queue, f'ui{i}', 'c', 'interactive')
+
+    order = _drain(queue)
+    assert order[:3] == ['ui0', 'ui1', 'ui2']
+    assert [name for name in order if name.startswith('bulk')] == [f'bulk{i}' for i in range(10)]
+
+
+def test_client_weights_and_cost():
+    queue = FairQueue(client_weights={'gold': 2.0})
+    for i in range(4):
+        _push(queue, f'g{i}', 'gold')
+        _push(queue, f's{i}', 'silver')
+    order = _drain(queue)
+    # Trọng số gấp đôi: gold được phục vụ khoảng hai job cho mỗi job của silver
+    assert sum(name.startswith('g') for name in order[:6]) == 4
+
+    queue = FairQueue()
+    _push(queue, 'large', 'a', cost=8)
+    _push(queue, 'small1', 'b')
+    _push(queue, 'small2', 'b')
+    _push(queue, 'small3', 'b')
+    assert _drain(queue)[-1] == 'large'
+
+
+def test_dispatcher_runs_lane_in_fair_order():
+    async def scenario():
+        dispatcher = JobDispatcher(max_concurrent=1)
+        order = []
+
+        def job(name):
+            async def run():
+                order.append(name)
+                return name
+            return run
+
+        futures = [dispatcher.submit('P', job(f'bulk{i}'), 'c', 'bulk') for i in range(3)]
+        futures.append(dispatcher.submit('P', job('ui'), 'c', 'interactive'))
+        futures.append(dispatcher.submit(None, job('free')))
+        results = await asyncio.gather(*futures)
+
+        assert results == ['bulk0', 'bulk1', 'bulk2', 'ui', 'free']
+        assert order.index('ui') < order.index('bulk1')
+        assert dispatcher.pending_count() == 0
+
+    asyncio.run(scenario())
+
+
+def test_dispatcher_serializes_same_printer_and_parallelizes_printers():
+    async def scenario():
+        dispatcher = JobDispatcher(max_concurrent=4)
+        active = {}
+        peak = {}
+        running = set()
+        overlap = []
+
+        def job(printer):
+            async def run():
+                active[printer] = active.get(printer, 0) + 1
+                peak[printer] = max(peak.get(printer, 0), active[printer])
+                running.add(printer)
+                overlap.append(len(running))
+                await asyncio.sleep(0.05)
+                active[printer] -= 1
+                if not active[printer]:
+                    running.discard(printer)
+                return printer
+            return run
+
+        futures = [dispatcher.submit(printer, job(printer), 'c') for printer in ('A', 'B', 'A', 'B', 'A')]
+        results = await asyncio.gather(*futures)
+
+        assert results == ['A', 'B', 'A', 'B', 'A']
+        # Cùng máy in: không bao giờ hai job chạy cùng lúc
+        assert peak == {'A': 1, 'B': 1}
+        # Khác máy in: chạy song song
+        assert max(overlap) == 2
+        assert dispatcher.pending_count() == 0
+
+    asyncio.run(scenario())
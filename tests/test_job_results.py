@@ -0,0 +1,70 @@
+import asyncio
+import types
+
+from job_results import JobResultCache
+
+
+def test_successful_result_is_returned_for_retry():
+    cache = JobResultCache()
+    cache.finish('job-1', {'type': 'print', 'success': True, 'jobId': 'job-1'})
+    assert cache.get('job-1')['success'] is True
+    assert cache.stats()['hits'] == 1
+
+
+def test_failed_result_is_not_cached():
+    cache = JobResultCache()
+    cache.finish('job-1', {'type': 'print', 'success': False})
+    assert cache.get('job-1') is None
+
+
+def test_key_includes_client_id():
+    cache = JobResultCache()
+    key_a = JobResultCache.key('job-1', 'client-a')
+    key_b = JobResultCache.key('job-1', 'client-b')
+    cache.finish(key_a, {'success': True})
+
+    assert cache.get(key_b) is None
+    assert cache.get(JobResultCache.key('job-1')) is None
+    assert cache.get(JobResultCache.key('job-1', 'client-a')) == {'success': True}
+    assert JobResultCache.key('job-1', '') == 'job-1'
+
+
+def test_duplicate_joins_running_job():
+    async def scenario():
+        cache = JobResultCache()
+        cache.start('job-1')
+        future = cache.running('job-1')
+        assert future is not None and not future.done()
+
+        cache.finish('job-1', {'success': True})
+        assert await future == {'success': True}
+        assert cache.running('job-1') is None
+
+        cache.start('job-2')
+        joined = cache.running('job-2')
+        cache.abandon('job-2')
+        assert await joined is None
+
+    asyncio.run(scenario())
+
+
+def test_entries_expire_by_ttl_and_count(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr('job_results.time', types.SimpleNamespace(monotonic=lambda: now[0]))
+    cache = JobResultCache(max_entries=2, ttl=10.0)
+    for job_id in ('a', 'b', 'c'):
+        cache.finish(job_id, {'success': True})
+    assert cache.get('a') is None
+    assert cache.get('b') is not None
+
+    now[0] += 11
+    assert cache.get('c') is None
+    assert cache.stats()['cached'] == 0
+
+
+def test_is_valid_id():
+    assert JobResultCache.is_valid_id('abc')
+    assert JobResultCache.is_valid_id(42)
+    assert not JobResultCache.is_valid_id('')
+    assert not JobResultCache.is_valid_id(True)
+    assert not JobResultCache.is_valid_id(None)
@@ -0,0 +1,97 @@
+import pytest
+
+import message_codec
+from message_codec import (GetPrintersMessage, GetPrintersResponse, MessageError, PrintMessage, PrintResponse,
+                           PrintTestMessage, PrintTestResponse, Response)
+
+
+def test_print_message_round_trip():
+    raw = {'type': 'print', 'jobId': 'j1', 'clientId': 'c1', 'printer': 'P', 'content': 'Xin chào',
+           'options': {'copies': 2}}
+    message = message_codec.decode(message_codec.dumps(raw))
+
+    assert isinstance(message, PrintMessage)
+    assert message.content == 'Xin chào'
+    assert message.printer == 'P'
+    assert message.job_id == 'j1' and message.client_id == 'c1'
+    assert message.options == {'copies': 2, 'content_type': 'text'}
+    # Struct vẫn đọc được như dict gốc
+    assert dict(message) == raw
+    assert message_codec.loads(message_codec.dumps(dict(message))) == raw
+
+
+def test_typed_messages_and_passthrough():
+    assert isinstance(message_codec.decode('{"type": "printTest", "printer": "P"}'), PrintTestMessage)
+    assert message_codec.decode('{"type": "getPrinters", "refresh": 1}').refresh is True
+    assert isinstance(message_codec.decode('{"type": "getPrinters"}'), GetPrintersMessage)
+
+    other = message_codec.decode('{"type": "printBatch", "items": []}')
+    assert other == {'type': 'printBatch', 'items': []}
+    assert type(other) is dict
+
+
+def test_binary_header_is_checked_after_body():
+    header = {'type': 'print', 'binary': True, 'size': 3, 'options': {'content_type': 'pdf'}}
+    assert message_codec.from_dict(header) is header
+
+    message = message_codec.from_dict({**header, 'content': bytearray(b'%PD')})
+    assert isinstance(message, PrintMessage)
+    assert message.content == b'%PD'
+
+
+@pytest.mark.parametrize('payload, error', [
+    ('{"type": "print", "content": 5}', 'content'),
+    ('{"type": "print", "options": []}', 'options'),
+    ('{"type": "print", "options": {"content_type": "docx"}}', 'docx'),
+    ('{"type": "printTest", "printer": 7}', 'printer'),
+])
+def test_invalid_messages_raise_message_error(payload, error):
+    with pytest.raises(MessageError) as info:
+        message_codec.decode(payload)
+    assert error in str(info.value)
+    assert info.value.message_type in ('print', 'printTest')
+
+
+def test_invalid_json_raises_message_error():
+    with pytest.raises(MessageError):
+        message_codec.decode('{"type": ')
+
+
+def test_message_error_keeps_job_id():
+    with pytest.raises(MessageError) as info:
+        message_codec.decode('{"type": "print", "jobId": "j9", "content": []}')
+    assert info.value.job_id == 'j9'
+
+
+def test_responses_round_trip():
+    response = PrintResponse(success=True, printer='P', content_length=3, timestamp='t',
+                             document_hash='h', job_id='j1')
+    assert message_codec.loads(message_codec.dumps(response.to_dict())) == {
+        'type': 'print',
+        'success': True,
+        'data': {'printer': 'P', 'content_length': 3, 'timestamp': 't', 'documentHash': 'h'},
+        'jobId': 'j1'
+    }
+
+    failed = PrintResponse(success=False, error='Print failed').to_dict()
+    assert failed == {'type': 'print', 'success': False, 'error': 'Print failed'}
+
+    assert PrintTestResponse(success=True, data={'printer': 'P'}).to_dict() == {
+        'type': 'printTest', 'success': True, 'data': {'printer': 'P'}
+    }
+
+    printers = GetPrintersResponse(success=True, printers=[{'name': 'P'}], default_printer='P',
+                                   updated_at='t').to_dict()
+    assert message_codec.loads(message_codec.dumps(printers))['data'] == {
+        'printers': [{'name': 'P'}], 'count': 1, 'defaultPrinter': 'P', 'updatedAt': 't'
+    }
+
+
+def test_response_requires_to_dict():
+    class Incomplete(Response):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+    with pytest.raises(TypeError):
+        Response()
@@ -0,0 +1,111 @@
+import asyncio
+
+import pytest
+
+from print_stream import DEFAULT_MAX_STREAM_BYTES, PrintStream, stream_byte_limit
+from raw_tcp_backend import LocalRawPrinter
+from websocket_print_client import WebSocketPrintClient
+
+
+@pytest.fixture
+def printer():
+    printer = LocalRawPrinter().start()
+    yield printer
+    printer.stop()
+
+
+def run_client(printer, scenario, **kwargs):
+    """Chạy scenario(client, sent) với client nối tới máy in giả lập, không cần server"""
+    async def main():
+        client = WebSocketPrintClient(network_printers={'P': printer.address}, **kwargs)
+        sent = []
+
+        async def send_message(message):
+            sent.append(message)
+
+        client.send_message = send_message
+        try:
+            await scenario(client, sent)
+        finally:
+            await client.dispatcher.cancel_all()
+            client.print_handler.executor.shutdown()
+            client.print_handler.preparer.shutdown()
+            client.print_handler.raw_tcp.close_all()
+
+    asyncio.run(main())
+
+
+def chunk_header(job_id, seq, size):
+    return {'type': 'printChunk', 'jobId': job_id, 'seq': seq, 'binary': True, 'size': size}
+
+
+def test_stream_byte_limit_is_clamped():
+    assert stream_byte_limit({}) == DEFAULT_MAX_STREAM_BYTES
+    assert stream_byte_limit({'max_stream_bytes': 10 ** 13}) == DEFAULT_MAX_STREAM_BYTES
+    assert stream_byte_limit({'max_stream_bytes': 4096}) == 4096
+    for value in (0, -1, '1000', True, 1.5):
+        assert stream_byte_limit({'max_stream_bytes': value}) == DEFAULT_MAX_STREAM_BYTES
+    assert PrintStream(None, 'P', {'max_stream_bytes': 10 ** 13}).max_bytes == DEFAULT_MAX_STREAM_BYTES
+
+
+def test_out_of_range_max_stream_bytes_does_not_raise_limit(printer):
+    async def scenario(client, sent):
+        client.handle_print_begin('s1', {'type': 'printBegin', 'jobId': 's1', 'printer': 'P',
+                                         'options': {'max_stream_bytes': 10 ** 13}})
+        assert client.streams['s1']['max_bytes'] == DEFAULT_MAX_STREAM_BYTES
+        assert client._binary_size_limit(chunk_header('s1', 0, 1)) <= client.stream_buffer_bytes
+
+    run_client(printer, scenario, stream_buffer_bytes=1024)
+
+
+def test_oversized_chunk_rejected_before_allocation(printer):
+    async def scenario(client, sent):
+        client.handle_print_begin('s1', {'type': 'printBegin', 'jobId': 's1', 'printer': 'P'})
+        await client._begin_binary_job(chunk_header('s1', 0, 50 * 1024 * 1024))
+
+        assert client._pending_binary is None
+        assert 's1' not in client.streams
+        assert sent[-1]['type'] == 'printEnd' and sent[-1]['success'] is False
+        assert 'too large' in sent[-1]['error']
+
+    run_client(printer, scenario, stream_buffer_bytes=1024)
+
+
+def test_chunk_limited_by_free_buffer_and_stream_size(printer):
+    async def scenario(client, sent):
+        client.handle_print_begin('s1', {'type': 'printBegin', 'jobId': 's1', 'printer': 'P',
+                                         'options': {'max_stream_bytes': 2000}})
+        state = client.streams['s1']
+        state['buffered'] = 900
+        assert client._binary_size_limit(chunk_header('s1', 0, 1)) == 124
+
+        state['buffered'] = 0
+        state['received'] = 1500
+        assert client._binary_size_limit(chunk_header('s1', 0, 1)) == 500
+
+        await client._begin_binary_job(chunk_header('s1', 0, 600))
+        assert client._pending_binary is None
+        assert 'too large' in sent[-1]['error']
+
+    run_client(printer, scenario, stream_buffer_bytes=1024)
+
+
+def test_chunk_within_limits_is_streamed(printer):
+    async def scenario(client, sent):
+        client.handle_print_begin('s1', {'type': 'printBegin', 'jobId': 's1', 'printer': 'P'})
+        await client._begin_binary_job(chunk_header('s1', 0, 5))
+        assert len(client._pending_binary['buffer']) == 5
+        message = await client._receive_binary_frame(b'hello')
+        await client.handle_stream_message(message)
+        await client.handle_stream_message({'type': 'printEnd', 'jobId': 's1', 'chunks': 1})
+
+        for _ in range(100):
+            if any(m.get('type') == 'printEnd' for m in sent):
+                break
+            await asyncio.sleep(0.05)
+        result = [m for m in sent if m.get('type') == 'printEnd'][0]
+        assert result['success'] is True
+        assert result['data']['bytes'] == 5
+
+    run_client(printer, scenario, stream_buffer_bytes=1024)
+    assert printer.received == b'hello'
@@ -0,0 +1,154 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from printer_executor import (
+    PrinterCallCancelled,
+    PrinterExecutor,
+    PrinterTimeoutError,
+    check_cancelled,
+)
+
+
+def run_executor(scenario, **kwargs):
+    async def main():
+        executor = PrinterExecutor(**kwargs)
+        try:
+            return await scenario(executor)
+        finally:
+            executor.shutdown()
+    return asyncio.run(main())
+
+
+class Tracker:
+    """Đếm số lời gọi đang chạy cùng lúc theo máy in"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active = {}
+        self.peak = {}
+
+    def call(self, printer, duration):
+        with self.lock:
+            self.active[printer] = self.active.get(printer, 0) + 1
+            self.peak[printer] = max(self.peak.get(printer, 0), self.active[printer])
+        time.sleep(duration)
+        with self.lock:
+            self.active[printer] -= 1
+        return printer
+
+
+def test_run_returns_result():
+    async def scenario(executor):
+        return await executor.run(sum, [1, 2, 3])
+
+    assert run_executor(scenario) == 6
+
+
+def test_same_printer_calls_are_serialized():
+    tracker = Tracker()
+
+    async def scenario(executor):
+        await asyncio.gather(*(
+            executor.run(tracker.call, 'A', 0.05, printer='A') for _ in range(4)
+        ))
+
+    run_executor(scenario, max_workers=4)
+    assert tracker.peak['A'] == 1
+
+
+def test_different_printers_run_in_parallel():
+    tracker = Tracker()
+    started = time.monotonic()
+
+    async def scenario(executor):
+        return await asyncio.gather(*(
+            executor.run(tracker.call, name, 0.2, printer=name) for name in ('A', 'B', 'C')
+        ))
+
+    assert run_executor(scenario, max_workers=4) == ['A', 'B', 'C']
+    # Ba máy in chạy cùng lúc: tổng thời gian gần một lời gọi, không phải ba
+    assert time.monotonic() - started < 0.5
+
+
+def test_call_timeout_sets_cancel_event():
+    stopped = threading.Event()
+
+    def slow():
+        for _ in range(200):
+            try:
+                check_cancelled()
+            except PrinterCallCancelled:
+                stopped.set()
+                raise
+            time.sleep(0.01)
+
+    async def scenario(executor):
+        with pytest.raises(PrinterTimeoutError):
+            await executor.run(slow, printer='A', timeout=0.05)
+        return executor.stats()
+
+    stats = run_executor(scenario)
+    assert stopped.wait(1.0)
+    assert stats['timeouts'] == 1
+
+
+def test_waiting_for_busy_printer_times_out():
+    release = threading.Event()
+
+    async def scenario(executor):
+        first = asyncio.ensure_future(executor.run(release.wait, 5, printer='A'))
+        await asyncio.sleep(0.05)
+        try:
+            with pytest.raises(PrinterTimeoutError, match='bận'):
+                await executor.run(lambda: None, printer='A', timeout=0.05)
+            # Máy in khác không bị ảnh hưởng
+            assert await executor.run(lambda: 'ok', printer='B', timeout=1.0) == 'ok'
+        finally:
+            release.set()
+        await first
+        # Lượt được nhả khi thread xong: lời gọi mới vào ngay
+        return await executor.run(lambda: 'done', printer='A', timeout=1.0)
+
+    assert run_executor(scenario, max_workers=2) == 'done'
+
+
+def test_printer_slot_held_until_thread_finishes():
+    release = threading.Event()
+
+    async def scenario(executor):
+        with pytest.raises(PrinterTimeoutError):
+            await executor.run(release.wait, 5, printer='A', timeout=0.05)
+        # Thread treo vẫn giữ lượt của máy in
+        assert executor.stats()['active'] == {'A': 1}
+        release.set()
+        return await executor.run(lambda: 'ok', printer='A', timeout=1.0)
+
+    assert run_executor(scenario, max_workers=2) == 'ok'
+
+
+def test_cancellation_sets_cancel_event():
+    stopped = threading.Event()
+
+    def slow():
+        for _ in range(200):
+            try:
+                check_cancelled()
+            except PrinterCallCancelled:
+                stopped.set()
+                raise
+            time.sleep(0.01)
+
+    async def scenario(executor):
+        task = asyncio.ensure_future(executor.run(slow, printer='A'))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return executor.stats()
+
+    stats = run_executor(scenario)
+    assert stopped.wait(1.0)
+    assert stats['cancelled'] == 1
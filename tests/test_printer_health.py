@@ -0,0 +1,148 @@
+import asyncio
+import threading
+import types
+
+import pytest
+
+from print_handler import PrintHandler
+from printer_executor import PrinterBusyError, PrinterTimeoutError
+from printer_health import CLOSED, HALF_OPEN, OPEN, PrinterHealth, PrinterUnavailableError, status_faults
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = types.SimpleNamespace(now=1000.0)
+    clock.monotonic = lambda: clock.now
+    monkeypatch.setattr('printer_health.time', clock)
+    return clock
+
+
+def _open(health, printer='P'):
+    for _ in range(health.failure_threshold):
+        health.record_failure(printer, OSError('offline'))
+
+
+def test_opens_after_consecutive_failures(clock):
+    health = PrinterHealth(failure_threshold=3, reset_timeout=10.0)
+    health.record_failure('P', 'err')
+    health.record_failure('P', 'err')
+    assert health.state('P') == CLOSED
+    health.acquire('P')
+
+    health.record_failure('P', OSError('offline'))
+    assert health.state('P') == OPEN
+    with pytest.raises(PrinterUnavailableError) as info:
+        health.acquire('P')
+    assert info.value.retry_after == pytest.approx(10.0)
+    assert info.value.reason == 'offline'
+    assert health.stats()['rejected'] == 1
+
+
+def test_success_resets_failure_count(clock):
+    health = PrinterHealth(failure_threshold=2)
+    health.record_failure('P')
+    health.record_success('P')
+    health.record_failure('P')
+    assert health.state('P') == CLOSED
+
+
+def test_half_open_trial_success_closes(clock):
+    health = PrinterHealth(reset_timeout=10.0, probe_interval=5.0)
+    _open(health)
+    clock.now += 10
+
+    health.acquire('P')
+    assert health.state('P') == HALF_OPEN
+    # Chỉ một job chạy thử tại một thời điểm
+    with pytest.raises(PrinterUnavailableError):
+        health.acquire('P')
+
+    health.record_success('P')
+    assert health.state('P') == CLOSED
+    assert health.stats()['recovered'] == 1
+    health.acquire('P')
+
+
+def test_half_open_trial_failure_reopens_with_backoff(clock):
+    health = PrinterHealth(reset_timeout=10.0, max_reset_timeout=30.0)
+    _open(health)
+    for expected in (20.0, 30.0, 30.0):
+        clock.now += 100
+        health.acquire('P')
+        health.record_failure('P', 'still broken')
+        assert health.state('P') == OPEN
+        assert health.retry_after('P') == pytest.approx(expected)
+
+
+def test_release_frees_trial_slot(clock):
+    health = PrinterHealth(reset_timeout=10.0)
+    _open(health)
+    clock.now += 10
+    health.acquire('P')
+    health.release('P')
+    assert health.state('P') == HALF_OPEN
+    health.acquire('P')
+
+
+def test_status_faults_open_and_ready_status_recovers(clock):
+    health = PrinterHealth()
+    assert status_faults(0x00000080 | 0x00000010) == ['paper_out', 'offline']
+
+    health.record_status('P', {'Status': 0x00000008})
+    assert health.state('P') == OPEN
+    assert health.snapshot('P')['faults'] == ['paper_jam']
+
+    # Máy in báo sẵn sàng: chuyển half-open, probe tiếp theo không lỗi thì đóng
+    health.record_status('P', {'Status': 0})
+    assert health.state('P') == HALF_OPEN
+    health.record_status('P', {'Status': 0})
+    assert health.state('P') == CLOSED
+
+
+def test_probe_timeout_in_half_open_counts_as_failure(clock):
+    health = PrinterHealth(reset_timeout=10.0)
+    _open(health)
+    clock.now += 10
+    assert health._due_for_probe() == ['P']
+    assert health.state('P') == HALF_OPEN
+
+    health.record_status('P', None)
+    assert health.state('P') == OPEN
+
+
+def test_unknown_printer_is_closed(clock):
+    health = PrinterHealth()
+    assert health.retry_after('other') is None
+    assert health.snapshot('other') == {'state': CLOSED, 'failures': 0}
+    health.acquire(None)
+
+
+def test_busy_printer_wait_is_not_a_breaker_failure():
+    release = threading.Event()
+
+    async def main():
+        handler = PrintHandler()
+        try:
+            options = {'timeout': 0.05}
+            first = asyncio.ensure_future(handler.executor.run(release.wait, 5, printer='P'))
+            await asyncio.sleep(0.05)
+            for _ in range(handler.health.failure_threshold):
+                with pytest.raises(PrinterBusyError):
+                    await handler._call_printer(lambda: True, printer_name='P', options=options)
+            busy = handler.health.snapshot('P')
+            release.set()
+            await first
+
+            # Máy in không phản hồi (lời gọi đã chạy) vẫn là lỗi
+            stuck = threading.Event()
+            with pytest.raises(PrinterTimeoutError):
+                await handler._call_printer(stuck.wait, 5, printer_name='P', options=options)
+            stuck.set()
+            return busy, handler.health.snapshot('P')
+        finally:
+            handler.executor.shutdown()
+            handler.preparer.shutdown()
+
+    busy, after_timeout = asyncio.run(main())
+    assert busy == {'state': CLOSED, 'failures': 0}
+    assert after_timeout['failures'] == 1
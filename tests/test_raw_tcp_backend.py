@@ -0,0 +1,113 @@
+import socket
+import time
+
+import pytest
+
+from raw_tcp_backend import LocalRawPrinter, RawTcpBackend, parse_address
+
+
+@pytest.fixture
+def printer():
+    printer = LocalRawPrinter().start()
+    yield printer
+    printer.stop()
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def test_parse_address():
+    assert parse_address('tcp://10.0.0.5:9101') == ('10.0.0.5', 9101)
+    assert parse_address('printer.local') == ('printer.local', 9100)
+    assert parse_address('[::1]:9100') == ('::1', 9100)
+
+
+def test_send_job_to_local_printer_reuses_connection(printer):
+    backend = RawTcpBackend({'P': printer.address})
+    try:
+        assert backend.send_pages('P', [[b'hello ', b'world'], [b'!']]) == 12
+        assert backend.send_pages('P', [[b'again']]) == 5
+        assert wait_for(lambda: printer.received == b'hello world!again')
+        assert printer.connections == 1
+        stats = backend.stats()
+        assert stats['connected'] == 1 and stats['reused'] == 1 and stats['bytes'] == 17
+    finally:
+        backend.close_all()
+
+
+def test_non_persistent_printer_closes_after_job(printer):
+    backend = RawTcpBackend()
+    backend.add_printer('P', printer.address, persistent=False)
+    backend.send_pages('P', [[b'a']])
+    backend.send_pages('P', [[b'b']])
+    assert wait_for(lambda: printer.received == b'ab')
+    assert printer.connections == 2
+    assert backend.stats()['idle'] == 0
+
+
+def test_unregistered_address_is_not_routed(printer):
+    backend = RawTcpBackend()
+    assert not backend.handles(printer.address)
+    with pytest.raises(ValueError):
+        backend.send_pages(printer.address, [[b'data']])
+    assert printer.connections == 0
+
+    permissive = RawTcpBackend(allow_addresses=True)
+    try:
+        assert permissive.handles(printer.address)
+        permissive.send_pages(printer.address, [[b'data']])
+        assert wait_for(lambda: printer.received == b'data')
+    finally:
+        permissive.close_all()
+
+
+def test_connection_refused_raises():
+    backend = RawTcpBackend({'P': f'127.0.0.1:{free_port()}'}, connect_timeout=1.0)
+    with pytest.raises(OSError):
+        backend.send_pages('P', [[b'data']])
+    assert backend.stats()['idle'] == 0
+
+
+def test_reconnects_after_printer_restart(printer):
+    port = int(printer.address.rsplit(':', 1)[1])
+    backend = RawTcpBackend({'P': printer.address})
+    try:
+        backend.send_pages('P', [[b'first']])
+        assert wait_for(lambda: printer.received == b'first')
+        printer.stop()
+
+        restarted = LocalRawPrinter(port=port).start()
+        try:
+            backend.send_pages('P', [[b'second']])
+            assert wait_for(lambda: restarted.received == b'second')
+        finally:
+            restarted.stop()
+    finally:
+        backend.close_all()
+
+
+def test_write_timeout_when_printer_stops_reading():
+    stalled = LocalRawPrinter(bytes_per_second=1, keep_data=False).start()
+    backend = RawTcpBackend({'P': stalled.address}, write_timeout=0.3)
+    try:
+        started = time.monotonic()
+        with pytest.raises(OSError):
+            backend.send_pages('P', [[b'x' * (64 * 1024)] * 256])
+        assert time.monotonic() - started < 5
+        # Kết nối lỗi bị đóng, không trả lại pool
+        assert backend.stats()['idle'] == 0
+    finally:
+        backend.close_all()
+        stalled.stop()
@@ -0,0 +1,98 @@
+import asyncio
+import io
+import time
+
+import pytest
+
+from image_raster import rasterize_image
+from print_handler import PrintHandler
+from raw_tcp_backend import LocalRawPrinter
+from spool_store import SpoolStore
+
+
+@pytest.fixture
+def printer():
+    printer = LocalRawPrinter().start()
+    yield printer
+    printer.stop()
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def run_handler(printer, tmp_path, scenario):
+    async def main():
+        handler = PrintHandler(network_printers={'P': printer.address})
+        handler.spool_store = SpoolStore(str(tmp_path))
+        try:
+            return await scenario(handler)
+        finally:
+            handler.executor.shutdown()
+            handler.preparer.shutdown()
+            handler.raw_tcp.close_all()
+    return asyncio.run(main())
+
+
+@pytest.mark.parametrize('content_type, content, expected', [
+    ('text', 'xin chào', 'xin chào'.encode('utf-8')),
+    ('raw', '\x1b@ZPL', b'\x1b@ZPL'),
+    ('html', '<p>Hóa đơn</p>', None),
+])
+def test_keep_and_reprint_str_content(printer, tmp_path, content_type, content, expected):
+    async def scenario(handler):
+        options = {'content_type': content_type, 'printer': 'P', 'keep': True}
+        spool_id = await handler.keep_document(content, content_type, options)
+        assert spool_id is not None
+        assert await handler.print_content(content, options)
+        assert wait_for(lambda: len(printer.received) > 0)
+        first = printer.received
+
+        assert await handler.reprint(spool_id)
+        assert wait_for(lambda: len(printer.received) == 2 * len(first))
+        return first
+
+    first = run_handler(printer, tmp_path, scenario)
+    if expected is not None:
+        assert first == expected
+    assert printer.received == first + first
+
+
+def test_str_content_is_not_kept_without_option(printer, tmp_path):
+    async def scenario(handler):
+        assert await handler.keep_document('text', 'text', {'printer': 'P'}) is None
+        # PDF dạng chuỗi là đường dẫn/base64 chưa decode
+        assert await handler.keep_document('/tmp/x.pdf', 'pdf', {'printer': 'P', 'keep': True}) is None
+
+    run_handler(printer, tmp_path, scenario)
+
+
+def test_reprint_image_is_rasterized(printer, tmp_path):
+    Image = pytest.importorskip('PIL.Image')
+    pytest.importorskip('numpy')
+    buffer = io.BytesIO()
+    Image.new('L', (64, 16), color=0).save(buffer, format='PNG')
+    png = buffer.getvalue()
+    expected = rasterize_image(png, {})
+
+    async def scenario(handler):
+        spool_id = await handler.keep_document(png, 'image', {'printer': 'P', 'keep': True})
+        assert spool_id is not None
+        assert await handler.reprint(spool_id)
+        assert wait_for(lambda: len(printer.received) >= len(expected))
+
+    run_handler(printer, tmp_path, scenario)
+    assert printer.received == expected
+    assert not printer.received.startswith(b'\x89PNG')
+
+
+def test_reprint_unknown_id_returns_none(printer, tmp_path):
+    async def scenario(handler):
+        return await handler.reprint('missing')
+
+    assert run_handler(printer, tmp_path, scenario) is None
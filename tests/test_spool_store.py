@@ -0,0 +1,100 @@
+import json
+import os
+
+import pytest
+
+import spool_store
+from spool_store import INDEX_FILENAME, SpoolStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(spool_store, 'time', clock)
+    return clock
+
+
+def test_evicts_least_recently_used_when_over_bytes(tmp_path, clock):
+    store = SpoolStore(str(tmp_path), max_bytes=30)
+    first = store.store(b'1' * 10, 'pdf')
+    clock.now += 1
+    second = store.store(b'2' * 10, 'pdf')
+    clock.now += 1
+    third = store.store(b'3' * 10, 'pdf')
+    clock.now += 1
+    assert store.get(first) is not None
+
+    clock.now += 1
+    fourth = store.store(b'4' * 10, 'pdf')
+
+    assert store.get(second) is None
+    assert not os.path.exists(tmp_path / f'{second}.pdf')
+    for job_id in (first, third, fourth):
+        assert store.get(job_id) is not None
+    assert store.stats()['bytes'] == 30
+
+
+def test_evicts_by_job_count(tmp_path, clock):
+    store = SpoolStore(str(tmp_path), max_jobs=2)
+    ids = []
+    for i in range(3):
+        ids.append(store.store(bytes([i]), 'raw'))
+        clock.now += 1
+
+    assert store.get(ids[0]) is None
+    assert store.stats()['jobs'] == 2
+
+
+def test_new_job_is_kept_even_if_larger_than_limit(tmp_path, clock):
+    store = SpoolStore(str(tmp_path), max_bytes=10)
+    old = store.store(b'o' * 5, 'raw')
+    big = store.store(b'b' * 20, 'raw')
+
+    assert store.get(old) is None
+    assert store.get(big)['size'] == 20
+
+
+def test_expired_jobs_removed_on_cleanup(tmp_path, clock):
+    store = SpoolStore(str(tmp_path), max_age=60)
+    old = store.store(b'old', 'raw')
+    clock.now += 61
+    fresh = store.store(b'new', 'raw')
+
+    assert store.get(old) is None
+    assert store.get(fresh) is not None
+    clock.now += 61
+    store.cleanup()
+    assert store.stats()['jobs'] == 0
+
+
+def test_last_access_saved_in_batches(tmp_path, clock):
+    store = SpoolStore(str(tmp_path), access_save_interval=30)
+    job_id = store.store(b'data', 'raw')
+    index_path = tmp_path / INDEX_FILENAME
+    saved = index_path.read_text()
+
+    clock.now += 5
+    store.get(job_id)
+    assert index_path.read_text() == saved
+
+    store.flush()
+    assert json.loads(index_path.read_text())[job_id]['last_access'] == clock.now
+
+
+def test_index_survives_restart(tmp_path, clock):
+    job_id = SpoolStore(str(tmp_path)).store(b'keep', 'text', {'printer': 'P'})
+    entry = SpoolStore(str(tmp_path)).get(job_id)
+    assert entry['metadata'] == {'printer': 'P'}
+    with open(entry['path'], 'rb') as f:
+        assert f.read() == b'keep'
@@ -6,39 +6,139 @@ Kết nối trực tiếp với Node.js WebSocket server để xử lý in ấn
 """
 
 import asyncio
+import contextvars
 import websockets
-import json
 import logging
 import sys
 import os
+import time
+from collections.abc import Mapping
 from datetime import datetime
 from print_handler import PrintHandler
+from job_dispatcher import JobDispatcher, PRIORITY_WEIGHTS
+from printer_inventory import PrinterInventory
+from admission_control import AdmissionController
+from metrics import MetricsRegistry, MetricsServer
+from connection_manager import ConnectionManager
+from job_results import JobResultCache
+import message_codec
+from message_codec import (GetPrintersResponse, MessageError, PrintResponse, PrintTestResponse, Response)
+from print_stream import stream_byte_limit
+from logging_setup import payload_sampler, setup_logging, summarize_payload
 
-# Cấu hình logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('websocket_client.log'),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
 logger = logging.getLogger(__name__)
 
+# Tin nhắn của job stream nhiều frame, kiểm tra theo thứ tự nhận trong listen() rồi chuyển cho task của job
+STREAM_MESSAGE_TYPES = ('printBegin', 'printChunk', 'printEnd', 'printAbort')
+
+# Job in tới một máy in bị từ chối ngay khi circuit breaker của máy in đang mở
+FAST_FAIL_MESSAGE_TYPES = ('print', 'printRef', 'reprint', 'printTemplate')
+
+# Lớp ưu tiên mặc định theo loại tin nhắn (bên gửi đặt priority để ghi đè, ví dụ "interactive" cho hóa đơn)
+DEFAULT_MESSAGE_PRIORITIES = {
+    'printBatch': 'bulk',
+    'printTest': 'test'
+}
+
+# Dung lượng ứng với một đơn vị cost khi chia lượt giữa các client
+JOB_COST_UNIT_BYTES = 64 * 1024
+
+# (jobId, khóa trong cache kết quả) của job đang chạy: phản hồi gửi trong job được gắn jobId và ghi vào cache
+_current_job = contextvars.ContextVar('current_job', default=None)
+
 class WebSocketPrintClient:
-    def __init__(self, server_url="ws://localhost:3001"):
+    def __init__(self, server_url="ws://localhost:3001", max_concurrent_jobs=4, printers_cache_ttl=30.0,
+                 max_queued_jobs=64, max_queued_bytes=256 * 1024 * 1024, client_weights=None,
+                 network_printers=None, metrics_port=None, ping_interval=10.0, ping_timeout=10.0,
+                 result_cache_ttl=600.0, stream_buffer_bytes=16 * 1024 * 1024, allow_tcp_addresses=False):
         self.server_url = server_url
-        self.print_handler = PrintHandler()
-        self.websocket = None
+        # Kết nối có ping/pong, kết nối lại theo backoff và giữ kết quả job khi mất kết nối
+        self.connection = ConnectionManager(server_url, ping_interval=ping_interval, ping_timeout=ping_timeout)
+        # Số liệu theo giai đoạn/máy in, đọc qua tin nhắn metrics hoặc HTTP (metrics_port, chỉ nghe 127.0.0.1)
+        self.metrics = MetricsRegistry()
+        self.metrics_server = MetricsServer(self.metrics, port=metrics_port) if metrics_port is not None else None
+        self.print_handler = PrintHandler(network_printers=network_printers, metrics=self.metrics,
+                                          allow_tcp_addresses=allow_tcp_addresses)
+        self.dispatcher = JobDispatcher(max_concurrent=max_concurrent_jobs, client_weights=client_weights)
+        # Giới hạn số job và dung lượng job đang giữ trong bộ nhớ
+        self.admission = AdmissionController(max_jobs=max_queued_jobs, max_bytes=max_queued_bytes)
+        # Kết quả job theo jobId: job gửi lại không bị in lần nữa
+        self.results = JobResultCache(ttl=result_cache_ttl)
+        self.printer_inventory = PrinterInventory(
+            self.print_handler.get_available_printers,
+            ttl=printers_cache_ttl,
+            change_watcher=self.print_handler.watch_printer_changes
+        )
         self.running = False
+        # Job nhị phân đang chờ nhận body qua binary frame
+        self._pending_binary = None
+        # Các job stream đang mở theo jobId; mỗi job giữ tối đa stream_buffer_bytes chunk chờ máy in
+        self.streams = {}
+        self.stream_buffer_bytes = stream_buffer_bytes
+        self._register_metrics()
+    
+    def _register_metrics(self):
+        """Mô tả số liệu và đăng ký gauge tính khi đọc (độ sâu hàng đợi, job đang chạy, admission)"""
+        self.metrics.describe('stage_seconds', 'Thời gian từng giai đoạn xử lý job')
+        self.metrics.describe('job_seconds', 'Thời gian xử lý job từ lúc bắt đầu chạy tới khi gửi phản hồi')
+        self.metrics.describe('responses_total', 'Số phản hồi đã gửi theo loại tin nhắn và kết quả')
+        self.metrics.describe('duplicate_jobs_total', 'Số job trùng jobId được trả kết quả cũ hoặc chờ chung')
+        self.metrics.describe('messages_received_total', 'Số tin nhắn nhận từ server')
+        self.metrics.describe('received_bytes_total', 'Dung lượng tin nhắn nhận từ server')
+        self.metrics.describe('printer_bytes_total', 'Dung lượng đã gửi tới máy in')
+        self.metrics.describe('printer_errors_total', 'Số lần gửi dữ liệu tới máy in thất bại')
+        self.metrics.gauge_callback(
+            'queue_depth',
+            lambda: [({'printer': lane}, depth) for lane, depth in self.dispatcher.queue_depths().items()],
+            'Số job đang chờ trong hàng đợi của máy in'
+        )
+        self.metrics.gauge_callback(
+            'jobs_in_flight',
+            lambda: [({'printer': lane or ''}, count) for lane, count in self.dispatcher.in_flight().items()],
+            'Số job đang chạy'
+        )
+        self.metrics.gauge_callback(
+            'admitted_jobs',
+            lambda: [({}, self.admission.jobs)],
+            'Số job đã nhận chưa xong (giới hạn max_queued_jobs)'
+        )
+        self.metrics.gauge_callback(
+            'admitted_bytes',
+            lambda: [({}, self.admission.bytes)],
+            'Dung lượng job đã nhận chưa xong (giới hạn max_queued_bytes)'
+        )
+        self.metrics.describe('rejected_jobs_total', 'Số job bị từ chối ngay (máy in đang lỗi)')
+        self.metrics.gauge_callback(
+            'printer_circuit_open',
+            lambda: [
+                ({'printer': name, 'state': circuit['state']}, 1)
+                for name, circuit in self.print_handler.health.stats()['printers'].items()
+            ],
+            'Máy in đang bị circuit breaker chặn (open) hoặc chạy thử (half_open)'
+        )
+        self.metrics.gauge_callback(
+            'printer_calls_waiting',
+            lambda: [({'printer': name}, count) for name, count in self.print_handler.executor.stats()['waiting'].items()],
+            'Số lời gọi đang chờ lượt của máy in (giới hạn đồng thời theo máy in)'
+        )
+    
+    @property
+    def websocket(self):
+        return self.connection.websocket
         
     async def connect(self):
         """Kết nối tới WebSocket server"""
+        logger.info(f"Đang kết nối tới {self.server_url}...")
+        if not await self.connection.connect():
+            return False
+        
         try:
-            logger.info(f"Đang kết nối tới {self.server_url}...")
-            self.websocket = await websockets.connect(self.server_url)
             self.running = True
             logger.info("✅ Kết nối WebSocket thành công!")
+            # Gửi trước các kết quả job hoàn thành trong lúc mất kết nối
+            await self.connection.flush()
+            # Báo cho server số job/dung lượng còn nhận được
+            await self.send_flow_control('open')
             return True
         except Exception as e:
             logger.error(f"❌ Lỗi kết nối WebSocket: {e}")
@@ -47,122 +147,1004 @@ class WebSocketPrintClient:
     async def disconnect(self):
         """Ngắt kết nối WebSocket"""
         self.running = False
-        if self.websocket:
-            await self.websocket.close()
+        if self.connection.websocket:
+            await self.connection.close()
             logger.info("🔌 Đã ngắt kết nối WebSocket")
     
     async def send_message(self, message):
-        """Gửi tin nhắn qua WebSocket"""
+        """Gửi tin nhắn qua WebSocket; kết quả job được giữ lại khi mất kết nối và gửi sau khi kết nối lại"""
         try:
-            if self.websocket:
-                await self.websocket.send(json.dumps(message))
-                logger.debug(f"📤 Gửi: {message}")
+            if isinstance(message, Response):
+                message = message.to_dict()
+            current_job = _current_job.get()
+            if current_job is not None and 'success' in message:
+                job_id, result_key = current_job
+                message.setdefault('jobId', job_id)
+                self.results.finish(result_key, message)
+            with self.metrics.stage('serialize'):
+                payload = message_codec.dumps(message)
+            with self.metrics.stage('send'):
+                sent = await self.connection.send(payload, buffer='success' in message)
+            if not sent:
+                logger.debug(f"🔌 Mất kết nối, bỏ tin nhắn {message.get('type')}")
+            else:
+                if payload_sampler(logger):
+                    logger.debug("📤 Gửi: %s", summarize_payload(message))
+                if 'success' in message:
+                    result = 'busy' if message.get('busy') else ('success' if message['success'] else 'failed')
+                    self.metrics.inc('responses_total', type=message.get('type'), result=result,
+                                     **self.metrics.current_labels())
         except Exception as e:
             logger.error(f"❌ Lỗi gửi tin nhắn: {e}")
     
+    async def send_flow_control(self, state):
+        """Gửi trạng thái nhận job (open/paused/resumed) kèm số job và dung lượng còn nhận được"""
+        message = {
+            'type': 'flowControl',
+            'state': state,
+            'credits': self.admission.credits()
+        }
+        if state == 'paused':
+            message['retryAfter'] = self.admission.retry_after()
+        await self.send_message(message)
+    
+    async def _send_busy(self, message_data):
+        """Từ chối job khi hàng đợi đầy, báo bên gửi thời gian nên thử lại"""
+        retry_after = self.admission.retry_after()
+        logger.warning(f"⏳ Hàng đợi đầy ({self.admission.jobs} job, {self.admission.bytes} bytes), từ chối {message_data.get('type')}")
+        response = {
+            'type': message_data.get('type'),
+            'success': False,
+            'busy': True,
+            'retryAfter': retry_after,
+            'credits': self.admission.credits(),
+            'error': 'Client busy'
+        }
+        for key in ('jobId', 'batchId', 'hash', 'spoolId', 'name'):
+            if key in message_data:
+                response[key] = message_data[key]
+        await self.send_message(response)
+    
+    async def _send_printer_unavailable(self, message_data, printer_name, retry_after):
+        """Từ chối ngay job tới máy in đang lỗi (circuit breaker mở), không xếp hàng"""
+        circuit = self.print_handler.health.snapshot(printer_name)
+        logger.warning(f"⛔ Máy in {printer_name} đang lỗi ({circuit.get('lastError')}), từ chối {message_data.get('type')}")
+        response = {
+            'type': message_data.get('type'),
+            'success': False,
+            'printer': printer_name,
+            'printerUnavailable': True,
+            'retryAfter': round(retry_after, 1),
+            'circuit': circuit,
+            'error': 'Printer unavailable'
+        }
+        for key in ('jobId', 'batchId', 'hash', 'spoolId', 'name'):
+            if key in message_data:
+                response[key] = message_data[key]
+        await self.send_message(response)
+    
+    async def _pause_reading(self):
+        """Ngừng đọc socket tới khi hàng đợi giảm xuống, để server/TCP tự giữ job lại"""
+        logger.warning(f"⏸️ Hàng đợi đầy ({self.admission.jobs} job, {self.admission.bytes} bytes), tạm dừng nhận job")
+        await self.send_flow_control('paused')
+        while self.running and not await self.admission.wait_for_capacity(timeout=1.0):
+            continue
+        if self.running:
+            logger.info("▶️ Tiếp tục nhận job")
+            await self.send_flow_control('resumed')
+    
+    def _lane_for(self, message_data):
+        """Xác định làn xử lý: mỗi máy in một làn, getPrinters chạy ngay"""
+        message_type = message_data.get('type')
+        if message_type in ('print', 'printTest', 'printRef', 'reprint', 'printBatch', 'printTemplate'):
+            return message_data.get('printer') or self.print_handler.default_printer or ''
+        return None
+    
+    def _priority_for(self, message_data):
+        """Lớp ưu tiên của job: priority trong tin nhắn/options, mặc định theo loại tin nhắn"""
+        priority = message_data.get('priority') or (message_data.get('options') or {}).get('priority')
+        if priority in PRIORITY_WEIGHTS:
+            return priority
+        return DEFAULT_MESSAGE_PRIORITIES.get(message_data.get('type'), 'normal')
+    
+    def _job_cost(self, message_data, size):
+        """Cost của job khi chia lượt: theo dung lượng, lô tính ít nhất một đơn vị mỗi tài liệu"""
+        cost = max(1, (size or 0) // JOB_COST_UNIT_BYTES)
+        if message_data.get('type') == 'printBatch' and isinstance(message_data.get('items'), list):
+            cost = max(cost, len(message_data['items']))
+        return cost
+    
+    def dispatch_message(self, message_data, size=None):
+        """Đưa tin nhắn vào dispatcher thay vì xử lý tuần tự trong listen()"""
+        if not isinstance(message_data, Mapping):
+            logger.warning(f"⚠️ Tin nhắn không hợp lệ: {type(message_data).__name__}")
+            return None
+        # Lô chạy ngay: tài liệu được chia theo máy in và mỗi nhóm xếp hàng trong làn của máy in đó
+        lane = None if message_data.get('type') == 'printBatch' else self._lane_for(message_data)
+        queued_at = time.perf_counter()
+        return self.dispatcher.submit(
+            lane,
+            lambda: self._run_message(message_data, queued_at),
+            client_id=message_data.get('clientId'),
+            priority=self._priority_for(message_data),
+            cost=self._job_cost(message_data, size)
+        )
+    
+    async def _run_message(self, message_data, queued_at):
+        """Chạy tin nhắn từ dispatcher, ghi thời gian chờ hàng đợi và thời gian xử lý theo máy in/loại nội dung"""
+        message_type = message_data.get('type')
+        if self._lane_for(message_data) is None:
+            return await self.handle_message(message_data)
+        
+        labels = {
+            'printer': message_data.get('printer') or self.print_handler.default_printer or '',
+            'content_type': (message_data.get('options') or {}).get('content_type', 'text' if message_type == 'print' else '')
+        }
+        job_id = message_data.get('jobId')
+        started = time.perf_counter()
+        self.metrics.observe('stage_seconds', started - queued_at, stage='queue_wait', **labels)
+        current_job = None
+        if self.results.is_valid_id(job_id):
+            current_job = (job_id, self.results.key(job_id, message_data.get('clientId')))
+        token = _current_job.set(current_job)
+        try:
+            with self.metrics.job_labels(**labels):
+                await self.handle_message(message_data)
+        finally:
+            _current_job.reset(token)
+        self.metrics.observe('job_seconds', time.perf_counter() - started, type=message_type, **labels)
+    
+    async def _send_queued(self, message_data, future):
+        """Báo vị trí hàng đợi và thời gian chờ ước lượng cho job phải chờ"""
+        status = self.dispatcher.queue_status(future)
+        if not status or status['queuePosition'] == 0:
+            return
+        response = {
+            'type': 'queued',
+            'requestType': message_data.get('type'),
+            'priority': self._priority_for(message_data),
+            **status
+        }
+        for key in ('jobId', 'batchId', 'clientId'):
+            if key in message_data:
+                response[key] = message_data[key]
+        await self.send_message(response)
+    
+    def _is_binary_header(self, message_data):
+        """Header JSON báo trước body sẽ tới bằng binary frame"""
+        return (
+            isinstance(message_data, dict)
+            and message_data.get('type') in ('print', 'printChunk')
+            and message_data.get('binary') is True
+        )
+    
+    async def _begin_binary_job(self, message_data):
+        """Ghi nhận header của job nhị phân và chuẩn bị buffer nhận body"""
+        if self._pending_binary is not None:
+            await self._fail_binary_job('Binary body incomplete, superseded by new job')
+        
+        size = message_data.get('size')
+        if size is not None and (not isinstance(size, int) or isinstance(size, bool) or size < 0):
+            await self._reject_binary_header(message_data, f'Invalid binary size: {size}')
+            return
+        # Kiểm tra kích thước khai báo trước khi cấp phát buffer: header khai báo quá lớn bị từ chối ngay
+        limit = self._binary_size_limit(message_data)
+        if size is not None and size > limit:
+            await self._reject_binary_header(message_data, f'Binary body too large: {size} > {limit} bytes')
+            return
+        
+        self._pending_binary = {
+            'header': message_data,
+            'size': size,
+            'buffer': bytearray(size) if size is not None else bytearray(),
+            'received': 0
+        }
+        if size == 0:
+            await self._route_message(self._complete_binary_job())
+    
+    def _binary_size_limit(self, message_data):
+        """Kích thước body nhị phân tối đa: giới hạn dung lượng hàng đợi (print) hoặc giới hạn của job stream (printChunk)"""
+        if message_data.get('type') == 'printChunk':
+            state = self.streams.get(message_data.get('jobId'))
+            if state is not None:
+                # Chunk phải vừa cả phần còn lại của job lẫn chỗ trống trong buffer của job
+                return max(0, min(state['max_bytes'] - state['received'],
+                                  self.stream_buffer_bytes - state['buffered']))
+            # Job stream chưa mở (hoặc đã hủy): chunk sẽ bị từ chối, không cấp phát hơn một buffer stream
+            return self.stream_buffer_bytes
+        return self.admission.max_bytes
+    
+    async def _reject_binary_header(self, message_data, error):
+        """Báo lỗi header nhị phân không hợp lệ; các binary frame theo sau bị bỏ qua"""
+        logger.error(f"❌ Từ chối job nhị phân: {error}")
+        if message_data.get('type') == 'printChunk' and message_data.get('jobId') in self.streams:
+            await self._fail_stream(message_data['jobId'], error)
+            return
+        response = {
+            'type': message_data.get('type'),
+            'success': False,
+            'error': error
+        }
+        if 'jobId' in message_data:
+            response['jobId'] = message_data['jobId']
+        await self.send_message(response)
+    
+    async def _receive_binary_frame(self, frame):
+        """Ghép binary frame vào job đang chờ, trả về message khi đã nhận đủ body"""
+        pending = self._pending_binary
+        if pending is None:
+            logger.warning(f"⚠️ Nhận binary frame {len(frame)} bytes nhưng không có job nào đang chờ")
+            return None
+        
+        size = pending['size']
+        if size is None:
+            # Không báo trước kích thước: một frame là toàn bộ body
+            limit = self._binary_size_limit(pending['header'])
+            if len(frame) > limit:
+                await self._fail_binary_job(f'Binary body too large: {len(frame)} > {limit} bytes')
+                return None
+            pending['buffer'] = frame
+            pending['received'] = len(frame)
+            return self._complete_binary_job()
+        
+        offset = pending['received']
+        if offset + len(frame) > size:
+            await self._fail_binary_job(f'Binary body exceeds declared size {size}')
+            return None
+        
+        memoryview(pending['buffer'])[offset:offset + len(frame)] = frame
+        pending['received'] = offset + len(frame)
+        if pending['received'] == size:
+            return self._complete_binary_job()
+        return None
+    
+    def _complete_binary_job(self):
+        """Gắn body nhị phân vào message và xóa trạng thái chờ"""
+        pending = self._pending_binary
+        self._pending_binary = None
+        message_data = pending['header']
+        message_data['content'] = pending['buffer']
+        logger.info(f"📦 Nhận đủ body nhị phân {pending['received']} bytes")
+        return message_data
+    
+    async def _fail_binary_job(self, error):
+        """Hủy job nhị phân đang chờ và báo lỗi cho server"""
+        pending = self._pending_binary
+        self._pending_binary = None
+        if pending is None:
+            return
+        logger.error(f"❌ Lỗi nhận body nhị phân: {error}")
+        if pending['header'].get('type') == 'printChunk':
+            await self._fail_stream(pending['header'].get('jobId'), error)
+            return
+        response = {
+            'type': pending['header'].get('type'),
+            'success': False,
+            'error': error
+        }
+        if 'jobId' in pending['header']:
+            response['jobId'] = pending['header']['jobId']
+        await self.send_message(response)
+    
+    async def _route_message(self, message_data, size=None):
+        """Tin nhắn stream xử lý ngay theo thứ tự, các tin nhắn khác qua dispatcher"""
+        if not isinstance(message_data, Mapping) or self._lane_for(message_data) is None:
+            if isinstance(message_data, Mapping) and message_data.get('type') in STREAM_MESSAGE_TYPES:
+                await self.handle_stream_message(message_data)
+            else:
+                self.dispatch_message(message_data)
+            return
+        
+        # Job đã in hoặc đang chạy (bên gửi retry): trả lại kết quả, không in lần nữa
+        # jobId chỉ cần duy nhất trong phạm vi một client: khóa theo (clientId, jobId) khi có clientId
+        job_id = message_data.get('jobId')
+        result_key = None
+        if self.results.is_valid_id(job_id):
+            result_key = self.results.key(job_id, message_data.get('clientId'))
+            if await self._reply_duplicate(message_data, job_id, result_key):
+                return
+        
+        # Máy in đang lỗi: fail nhanh, không giữ chỗ trong hàng đợi (printTest vẫn xếp hàng, có thể là job chạy thử)
+        if message_data.get('type') in FAST_FAIL_MESSAGE_TYPES:
+            printer_name = self._lane_for(message_data)
+            retry_after = self.print_handler.health.retry_after(printer_name)
+            if retry_after is not None:
+                self.metrics.inc('rejected_jobs_total', reason='printer_unavailable', printer=printer_name)
+                await self._send_printer_unavailable(message_data, printer_name, retry_after)
+                return
+        
+        # Job in: chỉ nhận khi còn chỗ trong giới hạn số job/dung lượng
+        if size is None:
+            content = message_data.get('content')
+            size = len(content) if isinstance(content, (str, bytes, bytearray, memoryview)) else 0
+        ticket = self.admission.try_admit(size)
+        if ticket is None:
+            await self._send_busy(message_data)
+            return
+        
+        if result_key is not None:
+            self.results.start(result_key)
+        future = self.dispatch_message(message_data, size)
+        if future is None:
+            self.admission.release(ticket)
+            if result_key is not None:
+                self.results.abandon(result_key)
+        else:
+            future.add_done_callback(lambda _: self.admission.release(ticket))
+            if result_key is not None:
+                # Job kết thúc mà không gửi phản hồi (bị hủy): job trùng đang chờ không bị treo
+                future.add_done_callback(lambda _: self.results.abandon(result_key))
+            await self._send_queued(message_data, future)
+    
+    async def _reply_duplicate(self, message_data, job_id, result_key):
+        """Trả lại kết quả của job đã in hoặc chờ chung job đang chạy; False nếu là job mới"""
+        cached = self.results.get(result_key)
+        if cached is not None:
+            logger.info(f"♻️ Job {job_id} đã xử lý, gửi lại kết quả cũ")
+            self.metrics.inc('duplicate_jobs_total', state='done')
+            await self.send_message({**cached, 'duplicate': True})
+            return True
+        
+        future = self.results.running(result_key)
+        if future is None:
+            return False
+        logger.info(f"♻️ Job {job_id} đang chạy, chờ chung kết quả")
+        self.metrics.inc('duplicate_jobs_total', state='running')
+        self.dispatcher.submit(None, lambda: self._send_joined(message_data, job_id, future))
+        return True
+    
+    async def _send_joined(self, message_data, job_id, future):
+        """Gửi kết quả của job đang chạy cho tin nhắn trùng khi job đó xong"""
+        response = await asyncio.shield(future)
+        if response is None:
+            response = {
+                'type': message_data.get('type'),
+                'success': False,
+                'jobId': job_id,
+                'error': 'Job cancelled'
+            }
+        await self.send_message({**response, 'duplicate': True})
+    
+    async def handle_stream_message(self, message_data):
+        """Xử lý printBegin/printChunk/printEnd/printAbort: chỉ kiểm tra và xếp vào hàng của job stream, không chờ máy in"""
+        message_type = message_data.get('type')
+        job_id = message_data.get('jobId')
+        try:
+            if not job_id:
+                raise ValueError('Missing jobId')
+            
+            if message_type == 'printBegin':
+                self.handle_print_begin(job_id, message_data)
+            elif message_type == 'printChunk':
+                await self.handle_print_chunk(job_id, message_data)
+            elif message_type == 'printEnd':
+                self.handle_print_end(job_id, message_data)
+            elif message_type == 'printAbort':
+                await self._fail_stream(job_id, 'Aborted by sender', notify=False)
+                
+        except Exception as e:
+            logger.error(f"❌ Lỗi xử lý {message_type}: {e}")
+            if message_type == 'printBegin' or job_id not in self.streams:
+                await self.send_message({
+                    'type': message_type,
+                    'success': False,
+                    'jobId': job_id,
+                    'error': str(e)
+                })
+            else:
+                await self._fail_stream(job_id, str(e))
+    
+    def handle_print_begin(self, job_id, message_data):
+        """Đăng ký job stream; StartDocPrinter và việc ghi chạy trong task riêng của job"""
+        if job_id in self.streams:
+            raise ValueError(f'Job {job_id} already started')
+        
+        options = message_data.get('options', {})
+        if options.get('content_type') == 'html':
+            raise ValueError('Streaming is not supported for html')
+        
+        printer_name = message_data.get('printer') or self.print_handler.default_printer
+        state = {
+            'stream': None,
+            'printer': printer_name,
+            'options': options,
+            'max_bytes': stream_byte_limit(options),
+            'next_seq': 0,
+            'received': 0,
+            # Chunk đã nhận nhưng chưa vào hàng đợi ghi của PrintStream
+            'inbox': asyncio.Queue(),
+            'buffered': 0,
+            'paused': False,
+            'error': None
+        }
+        self.streams[job_id] = state
+        self.dispatcher.submit(None, lambda: self._run_stream(job_id, state))
+    
+    async def handle_print_chunk(self, job_id, message_data):
+        """Kiểm tra số thứ tự và đưa chunk vào hàng của job stream"""
+        state = self.streams.get(job_id)
+        if state is None:
+            raise ValueError(f'Unknown job {job_id}')
+        
+        seq = message_data.get('seq')
+        if seq != state['next_seq']:
+            raise ValueError(f"Out-of-order chunk: expected seq {state['next_seq']}, got {seq}")
+        
+        if 'content' in message_data:
+            chunk = message_data['content']
+        else:
+            import base64
+            chunk = base64.b64decode(message_data.get('data', ''))
+        
+        if state['received'] + len(chunk) > state['max_bytes']:
+            raise ValueError(f"Stream exceeds {state['max_bytes']} bytes")
+        # Máy in không nhận kịp: chỉ job này bị dừng, socket vẫn được đọc cho các job khác
+        if state['buffered'] + len(chunk) > self.stream_buffer_bytes:
+            raise ValueError(f'Stream buffer full ({self.stream_buffer_bytes} bytes), sender ignored flowControl')
+        
+        state['next_seq'] = seq + 1
+        state['received'] += len(chunk)
+        state['buffered'] += len(chunk)
+        state['inbox'].put_nowait(chunk)
+        if not state['paused'] and state['buffered'] >= self.stream_buffer_bytes // 2:
+            state['paused'] = True
+            await self._send_stream_flow_control(job_id, state)
+    
+    def handle_print_end(self, job_id, message_data):
+        """Kết thúc nhận dữ liệu; task của job đẩy nốt dữ liệu tới máy in rồi gửi kết quả"""
+        state = self.streams.get(job_id)
+        if state is None:
+            raise ValueError(f'Unknown job {job_id}')
+        
+        total_chunks = message_data.get('chunks')
+        if total_chunks is not None and total_chunks != state['next_seq']:
+            raise ValueError(f"Chunk count mismatch: expected {total_chunks}, received {state['next_seq']}")
+        
+        del self.streams[job_id]
+        state['inbox'].put_nowait(None)
+    
+    async def _send_stream_flow_control(self, job_id, state):
+        """Báo bên gửi tạm dừng/tiếp tục gửi chunk cho riêng một job stream"""
+        flow_state = 'paused' if state['paused'] else 'resumed'
+        if state['paused']:
+            logger.warning(f"⏸️ Job stream {job_id} chờ máy in ({state['buffered']} bytes đang giữ)")
+        await self.send_message({
+            'type': 'flowControl',
+            'state': flow_state,
+            'jobId': job_id,
+            'buffered': state['buffered']
+        })
+    
+    async def _run_stream(self, job_id, state):
+        """Task của một job stream: mở job in rồi ghi lần lượt các chunk; chỉ job này chờ máy in"""
+        try:
+            stream = self.print_handler.open_stream(state['printer'], state['options'])
+            await stream.start()
+        except Exception as e:
+            logger.error(f"❌ Lỗi xử lý printBegin: {e}")
+            if self.streams.get(job_id) is state:
+                del self.streams[job_id]
+            if state['error'] is None:
+                await self.send_message({
+                    'type': 'printBegin',
+                    'success': False,
+                    'jobId': job_id,
+                    'error': str(e)
+                })
+            return
+        
+        state['stream'] = stream
+        if state['error'] is None:
+            logger.info(f"📥 Bắt đầu job stream {job_id} trên {state['printer']}")
+            await self.send_message({
+                'type': 'printBegin',
+                'success': True,
+                'jobId': job_id
+            })
+        
+        try:
+            while True:
+                chunk = await state['inbox'].get()
+                if state['error'] is not None:
+                    await stream.abort()
+                    logger.warning(f"⚠️ Hủy job stream {job_id}: {state['error']}")
+                    return
+                if chunk is None:
+                    await self._finish_stream(job_id, state)
+                    return
+                try:
+                    # Chờ ở đây khi hàng đợi ghi đã đầy: chỉ task của job này dừng lại
+                    await stream.write(chunk)
+                except Exception as e:
+                    logger.error(f"❌ Lỗi xử lý printChunk: {e}")
+                    await self._fail_stream(job_id, str(e))
+                    continue
+                state['buffered'] -= len(chunk)
+                if state['paused'] and state['buffered'] <= self.stream_buffer_bytes // 4:
+                    state['paused'] = False
+                    await self._send_stream_flow_control(job_id, state)
+        except asyncio.CancelledError:
+            await stream.abort()
+            raise
+    
+    async def _finish_stream(self, job_id, state):
+        """Chờ job stream ghi xong và gửi kết quả"""
+        stream = state['stream']
+        success = await stream.finish()
+        response = {
+            'type': 'printEnd',
+            'success': success,
+            'jobId': job_id,
+            'data': {
+                'printer': state['printer'],
+                'bytes': stream.bytes_written,
+                'chunks': stream.chunks_written,
+                'timestamp': datetime.now().isoformat()
+            }
+        }
+        if success:
+            logger.info(f"🖨️ In stream thành công {stream.bytes_written} bytes trên {state['printer']}")
+        else:
+            logger.error(f"❌ In stream thất bại: {job_id}")
+            response['error'] = 'Print failed'
+        await self.send_message(response)
+    
+    async def _fail_stream(self, job_id, error, notify=True):
+        """Hủy job stream và báo lỗi cho server; task của job tự hủy job in, không chờ ở đây"""
+        state = self.streams.pop(job_id, None)
+        if state is not None and state['error'] is None:
+            state['error'] = error
+            # Đánh thức task nếu đang chờ chunk; các chunk còn lại bị bỏ qua
+            state['inbox'].put_nowait(None)
+        if notify:
+            await self.send_message({
+                'type': 'printEnd',
+                'success': False,
+                'jobId': job_id,
+                'error': error
+            })
+    
     async def handle_message(self, message_data):
         """Xử lý tin nhắn từ server"""
+        try:
+            # Tin nhắn nhị phân ghép xong body vẫn là dict: kiểm tra thành struct ở đây
+            message_data = message_codec.from_dict(message_data)
+        except MessageError as e:
+            await self._send_invalid(message_data, e)
+            return
+        
         try:
             message_type = message_data.get('type')
             
             if message_type == 'getPrinters':
-                await self.handle_get_printers()
+                await self.handle_get_printers(message_data)
             elif message_type == 'printTest':
                 await self.handle_print_test(message_data)
             elif message_type == 'print':
                 await self.handle_print(message_data)
+            elif message_type == 'printRef':
+                await self.handle_print_ref(message_data)
+            elif message_type == 'reprint':
+                await self.handle_reprint(message_data)
+            elif message_type == 'printBatch':
+                await self.handle_print_batch(message_data)
+            elif message_type == 'registerTemplate':
+                await self.handle_register_template(message_data)
+            elif message_type == 'printTemplate':
+                await self.handle_print_template(message_data)
+            elif message_type == 'metrics':
+                await self.handle_metrics(message_data)
             else:
                 logger.warning(f"⚠️ Loại tin nhắn không xác định: {message_type}")
                 
         except Exception as e:
             logger.error(f"❌ Lỗi xử lý tin nhắn: {e}")
     
-    async def handle_get_printers(self):
-        """Xử lý yêu cầu lấy danh sách máy in"""
+    async def _send_invalid(self, message_data, error):
+        """Báo lỗi tin nhắn sai cấu trúc cho bên gửi"""
+        logger.error(f"❌ Tin nhắn không hợp lệ: {error}")
+        if isinstance(message_data, Mapping):
+            message_type, job_id = message_data.get('type'), message_data.get('jobId')
+        else:
+            message_type, job_id = error.message_type, error.job_id
+        if message_type is None:
+            return
+        response = {
+            'type': message_type,
+            'success': False,
+            'error': f'Invalid message: {error}'
+        }
+        if job_id is not None:
+            response['jobId'] = job_id
+        await self.send_message(response)
+    
+    async def handle_get_printers(self, message=None):
+        """Xử lý yêu cầu lấy danh sách máy in (từ cache, làm mới nền)"""
         try:
-            printers = self.print_handler.get_available_printers()
+            force_refresh = bool(message and message.refresh)
+            printers = await self.printer_inventory.get(force_refresh=force_refresh)
             default_printer = self.print_handler.default_printer
             
-            # Đánh dấu máy in mặc định
+            # Đánh dấu máy in mặc định, kèm trạng thái circuit breaker hiện tại (không lấy từ cache)
             for printer in printers:
                 printer['isDefault'] = (printer['name'] == default_printer)
+                printer['circuit'] = self.print_handler.health.snapshot(printer['name'])
             
-            response = {
-                'type': 'getPrinters',
+            await self.send_message(GetPrintersResponse(
+                success=True,
+                printers=printers,
+                default_printer=default_printer,
+                updated_at=self.printer_inventory.updated_at
+            ))
+            logger.info(f"📋 Gửi danh sách {len(printers)} máy in")
+            
+        except Exception as e:
+            logger.error(f"❌ Lỗi lấy danh sách máy in: {e}")
+            await self.send_message(GetPrintersResponse(success=False, error=str(e)))
+    
+    async def handle_metrics(self, message_data=None):
+        """Xử lý yêu cầu số liệu: JSON (mặc định) hoặc text Prometheus với format='prometheus'"""
+        try:
+            if message_data and message_data.get('format') == 'prometheus':
+                data = self.metrics.render_prometheus()
+            else:
+                data = self.metrics.snapshot()
+                data['admission'] = self.admission.stats()
+                data['rawTcp'] = self.print_handler.raw_tcp.stats()
+                data['printerCalls'] = self.print_handler.executor.stats()
+                data['printerHealth'] = self.print_handler.health.stats()
+                data['connection'] = self.connection.stats()
+                data['jobResults'] = self.results.stats()
+            
+            await self.send_message({
+                'type': 'metrics',
                 'success': True,
+                'data': data
+            })
+            
+        except Exception as e:
+            logger.error(f"❌ Lỗi lấy số liệu: {e}")
+            await self.send_message({
+                'type': 'metrics',
+                'success': False,
+                'error': str(e)
+            })
+    
+    async def handle_print_test(self, message):
+        """Xử lý yêu cầu in test"""
+        try:
+            printer_name = message.printer
+            result = await self.print_handler.print_test_page(printer_name)
+            
+            if result.get('success'):
+                logger.info(f"🖨️ In test thành công trên {printer_name or 'máy in mặc định'}")
+            else:
+                logger.error(f"❌ In test thất bại: {result.get('message')}")
+            
+            await self.send_message(PrintTestResponse(success=result.get('success', False), data=result))
+            
+        except Exception as e:
+            logger.error(f"❌ Lỗi in test: {e}")
+            await self.send_message(PrintTestResponse(success=False, error=str(e)))
+    
+    async def handle_print(self, message):
+        """Xử lý yêu cầu in nội dung"""
+        try:
+            printer_name = message.printer
+            options = message.options
+            content_type = options['content_type']
+            
+            content_length = len(message.content)
+            # PDF/hình ảnh được decode một lần và cache theo hash để lần sau in bằng printRef
+            doc_hash, content = await self.print_handler.cache_document(message.content, content_type)
+            # Lưu vào spool store (PDF mặc định, loại khác khi có option keep) để in lại bằng reprint
+            spool_id = await self.print_handler.keep_document(content, content_type, {
+                **options,
+                'printer': printer_name
+            })
+            
+            success = await self.print_handler.print_content(content, {
+                **options,
+                'printer': printer_name
+            })
+            
+            response = PrintResponse(
+                success=success,
+                printer=printer_name or self.print_handler.default_printer,
+                content_length=content_length,
+                timestamp=datetime.now().isoformat(),
+                document_hash=doc_hash,
+                spool_id=spool_id,
+                job_id=message.job_id
+            )
+            
+            if success:
+                logger.info(f"🖨️ In thành công {content_length} ký tự trên {printer_name or 'máy in mặc định'}")
+            else:
+                logger.error("❌ In thất bại")
+                response.error = 'Print failed'
+            
+            await self.send_message(response)
+            
+        except Exception as e:
+            logger.error(f"❌ Lỗi in: {e}")
+            await self.send_message(PrintResponse(success=False, job_id=message.job_id, error=str(e)))
+    
+    async def handle_print_ref(self, message_data):
+        """Xử lý yêu cầu in tài liệu đã cache theo hash"""
+        doc_hash = message_data.get('hash')
+        try:
+            printer_name = message_data.get('printer')
+            options = message_data.get('options', {})
+            
+            success = None
+            if doc_hash:
+                success = await self.print_handler.print_cached_document(doc_hash, {
+                    **options,
+                    'printer': printer_name
+                })
+            
+            if success is None:
+                # Không có trong cache: bên gửi cần gửi lại nội dung bằng tin nhắn print
+                logger.info(f"📭 Không có tài liệu {doc_hash} trong cache")
+                await self.send_message({
+                    'type': 'printRef',
+                    'success': False,
+                    'miss': True,
+                    'hash': doc_hash,
+                    'error': 'Document not cached'
+                })
+                return
+            
+            response = {
+                'type': 'printRef',
+                'success': success,
+                'hash': doc_hash,
                 'data': {
-                    'printers': printers,
-                    'count': len(printers),
-                    'defaultPrinter': default_printer
+                    'printer': printer_name or self.print_handler.default_printer,
+                    'timestamp': datetime.now().isoformat()
                 }
             }
             
+            if success:
+                logger.info(f"🖨️ In tài liệu cache {doc_hash[:12]} thành công trên {printer_name or 'máy in mặc định'}")
+            else:
+                logger.error("❌ In thất bại")
+                response['error'] = 'Print failed'
+            
             await self.send_message(response)
-            logger.info(f"📋 Gửi danh sách {len(printers)} máy in")
             
         except Exception as e:
-            logger.error(f"❌ Lỗi lấy danh sách máy in: {e}")
+            logger.error(f"❌ Lỗi in tài liệu cache: {e}")
             await self.send_message({
-                'type': 'getPrinters',
+                'type': 'printRef',
                 'success': False,
+                'hash': doc_hash,
                 'error': str(e)
             })
     
-    async def handle_print_test(self, message_data):
-        """Xử lý yêu cầu in test"""
+    async def handle_reprint(self, message_data):
+        """Xử lý yêu cầu in lại job đã lưu trong spool"""
+        spool_id = message_data.get('spoolId')
         try:
             printer_name = message_data.get('printer')
-            result = await self.print_handler.print_test_page(printer_name)
+            options = message_data.get('options', {})
+            
+            success = None
+            if spool_id:
+                success = await self.print_handler.reprint(spool_id, {
+                    **options,
+                    'printer': printer_name
+                })
+            
+            if success is None:
+                await self.send_message({
+                    'type': 'reprint',
+                    'success': False,
+                    'spoolId': spool_id,
+                    'error': 'Spool job not found'
+                })
+                return
             
             response = {
-                'type': 'printTest',
-                'success': result.get('success', False),
-                'data': result
+                'type': 'reprint',
+                'success': success,
+                'spoolId': spool_id,
+                'data': {
+                    'printer': printer_name or self.print_handler.default_printer,
+                    'timestamp': datetime.now().isoformat()
+                }
             }
             
-            if result.get('success'):
-                logger.info(f"🖨️ In test thành công trên {printer_name or 'máy in mặc định'}")
+            if success:
+                logger.info(f"🖨️ In lại job {spool_id} thành công")
             else:
-                logger.error(f"❌ In test thất bại: {result.get('message')}")
+                logger.error("❌ In lại thất bại")
+                response['error'] = 'Print failed'
             
             await self.send_message(response)
             
         except Exception as e:
-            logger.error(f"❌ Lỗi in test: {e}")
+            logger.error(f"❌ Lỗi in lại: {e}")
             await self.send_message({
-                'type': 'printTest',
+                'type': 'reprint',
                 'success': False,
+                'spoolId': spool_id,
                 'error': str(e)
             })
     
-    async def handle_print(self, message_data):
-        """Xử lý yêu cầu in nội dung"""
+    async def handle_print_batch(self, message_data):
+        """Xử lý yêu cầu in nhiều tài liệu trong một tin nhắn"""
+        batch_id = message_data.get('batchId')
+        try:
+            items = message_data.get('items')
+            if not isinstance(items, list) or not items:
+                raise ValueError('items must be a non-empty list')
+            
+            result = await self._print_batch_by_printer(message_data, items, {
+                **message_data.get('options', {}),
+                'printer': message_data.get('printer')
+            })
+            
+            response = {
+                'type': 'printBatch',
+                'success': result['failed'] == 0,
+                'batchId': batch_id,
+                'data': {
+                    **result,
+                    'timestamp': datetime.now().isoformat()
+                }
+            }
+            
+            if result['failed'] == 0:
+                logger.info(f"🖨️ In lô thành công {result['count']} tài liệu trong {result['jobs']} job")
+            else:
+                logger.error(f"❌ In lô: {result['failed']}/{result['count']} tài liệu thất bại")
+                response['error'] = 'Some items failed'
+            
+            await self.send_message(response)
+            
+        except Exception as e:
+            logger.error(f"❌ Lỗi in lô: {e}")
+            await self.send_message({
+                'type': 'printBatch',
+                'success': False,
+                'batchId': batch_id,
+                'error': str(e)
+            })
+    
+    async def _print_batch_by_printer(self, message_data, items, options):
+        """Chia lô theo máy in: mỗi nhóm qua circuit breaker và xếp hàng trong làn của máy in đó"""
+        results = [None] * len(items)
+        groups = {}
+        default_printer = options.get('printer') or self.print_handler.default_printer or ''
+        for index, item in enumerate(items):
+            if not isinstance(item, Mapping):
+                results[index] = {'index': index, 'id': None, 'printer': None,
+                                  'success': False, 'error': 'Item must be an object'}
+                continue
+            groups.setdefault(item.get('printer') or default_printer, []).append(index)
+        
+        pending = {}
+        for printer_name, indices in groups.items():
+            retry_after = self.print_handler.health.retry_after(printer_name)
+            if retry_after is not None:
+                # Máy in đang lỗi: các tài liệu của nó bị từ chối ngay, nhóm khác vẫn in
+                self.metrics.inc('rejected_jobs_total', reason='printer_unavailable', printer=printer_name)
+                for index in indices:
+                    results[index] = {
+                        'index': index,
+                        'id': items[index].get('id'),
+                        'printer': printer_name,
+                        'success': False,
+                        'printerUnavailable': True,
+                        'retryAfter': round(retry_after, 1),
+                        'error': 'Printer unavailable'
+                    }
+                continue
+            group_items = [items[index] for index in indices]
+            pending[printer_name] = self.dispatcher.submit(
+                printer_name,
+                lambda group_items=group_items: self.print_handler.print_batch(group_items, options),
+                client_id=message_data.get('clientId'),
+                priority=self._priority_for(message_data),
+                cost=len(group_items)
+            )
+        
+        jobs = 0
+        try:
+            outcomes = await asyncio.gather(*pending.values(), return_exceptions=True)
+        except asyncio.CancelledError:
+            for future in pending.values():
+                future.cancel()
+            raise
+        for printer_name, outcome in zip(pending, outcomes):
+            indices = groups[printer_name]
+            if isinstance(outcome, BaseException):
+                error = str(outcome) or type(outcome).__name__
+                for index in indices:
+                    results[index] = {'index': index, 'id': items[index].get('id'), 'printer': printer_name,
+                                      'success': False, 'error': error}
+                continue
+            jobs += outcome['jobs']
+            for index, item_result in zip(indices, outcome['items']):
+                results[index] = {**item_result, 'index': index}
+        
+        succeeded = sum(1 for result in results if result.get('success'))
+        return {
+            'items': results,
+            'count': len(items),
+            'succeeded': succeeded,
+            'failed': len(items) - succeeded,
+            'jobs': jobs
+        }
+    
+    async def handle_register_template(self, message_data):
+        """Xử lý yêu cầu đăng ký template"""
+        name = message_data.get('name')
+        try:
+            if not name or not isinstance(message_data.get('template'), str):
+                raise ValueError('name and template are required')
+            
+            template = self.print_handler.register_template(
+                name,
+                message_data['template'],
+                message_data.get('options', {})
+            )
+            await self.send_message({
+                'type': 'registerTemplate',
+                'success': True,
+                'name': name,
+                'data': {
+                    'slots': template.slots,
+                    'content_type': template.content_type
+                }
+            })
+            
+        except Exception as e:
+            logger.error(f"❌ Lỗi đăng ký template: {e}")
+            await self.send_message({
+                'type': 'registerTemplate',
+                'success': False,
+                'name': name,
+                'error': str(e)
+            })
+    
+    async def handle_print_template(self, message_data):
+        """Xử lý yêu cầu in template với các biến"""
+        name = message_data.get('name')
         try:
-            content = message_data.get('content', '')
             printer_name = message_data.get('printer')
             options = message_data.get('options', {})
             
-            # Mặc định in dạng text
-            if 'content_type' not in options:
-                options['content_type'] = 'text'
-            
-            success = await self.print_handler.print_content(content, {
+            success = await self.print_handler.print_template(name, message_data.get('variables', {}), {
                 **options,
                 'printer': printer_name
             })
             
+            if success is None:
+                # Template chưa đăng ký (ví dụ client vừa khởi động lại): bên gửi cần registerTemplate
+                await self.send_message({
+                    'type': 'printTemplate',
+                    'success': False,
+                    'miss': True,
+                    'name': name,
+                    'error': 'Template not registered'
+                })
+                return
+            
             response = {
-                'type': 'print',
+                'type': 'printTemplate',
                 'success': success,
+                'name': name,
                 'data': {
                     'printer': printer_name or self.print_handler.default_printer,
-                    'content_length': len(content),
                     'timestamp': datetime.now().isoformat()
                 }
             }
             
             if success:
-                logger.info(f"🖨️ In thành công {len(content)} ký tự trên {printer_name or 'máy in mặc định'}")
+                logger.info(f"🖨️ In template {name} thành công trên {printer_name or 'máy in mặc định'}")
             else:
                 logger.error("❌ In thất bại")
                 response['error'] = 'Print failed'
@@ -170,68 +1152,115 @@ class WebSocketPrintClient:
             await self.send_message(response)
             
         except Exception as e:
-            logger.error(f"❌ Lỗi in: {e}")
+            logger.error(f"❌ Lỗi in template: {e}")
             await self.send_message({
-                'type': 'print',
+                'type': 'printTemplate',
                 'success': False,
+                'name': name,
                 'error': str(e)
             })
     
     async def listen(self):
         """Lắng nghe tin nhắn từ server"""
         try:
-            while self.running and self.websocket:
+            while self.running and self.connection.websocket:
                 try:
-                    message = await asyncio.wait_for(
-                        self.websocket.recv(), 
-                        timeout=1.0
-                    )
+                    # Chờ theo sự kiện; mất kết nối (kể cả server không trả pong) báo bằng ConnectionClosed
+                    message = await self.connection.recv()
                     
-                    logger.debug(f"📥 Nhận: {message}")
-                    message_data = json.loads(message)
-                    await self.handle_message(message_data)
+                    if isinstance(message, bytes):
+                        message_data = await self._receive_binary_frame(message)
+                        if message_data is not None:
+                            await self._route_message(message_data)
+                        if self.admission.is_full():
+                            await self._pause_reading()
+                        continue
+                    
+                    if payload_sampler(logger):
+                        logger.debug("📥 Nhận: %s", summarize_payload(message))
+                    with self.metrics.stage('parse'):
+                        message_data = message_codec.decode(message)
+                    self.metrics.inc('messages_received_total',
+                                     type=message_data.get('type') if isinstance(message_data, Mapping) else '')
+                    self.metrics.inc('received_bytes_total', len(message))
+                    if self._is_binary_header(message_data):
+                        await self._begin_binary_job(message_data)
+                        continue
+                    await self._route_message(message_data, len(message))
+                    if self.admission.is_full():
+                        await self._pause_reading()
                     
-                except asyncio.TimeoutError:
-                    # Timeout bình thường, tiếp tục lắng nghe
-                    continue
                 except websockets.exceptions.ConnectionClosed:
                     logger.warning("🔌 Kết nối WebSocket bị đóng")
                     break
-                except json.JSONDecodeError as e:
-                    logger.error(f"❌ Lỗi parse JSON: {e}")
+                except MessageError as e:
+                    # JSON lỗi hoặc tin nhắn sai cấu trúc: báo lỗi (nếu biết loại tin nhắn) rồi nhận tiếp
+                    await self._send_invalid(None, e)
+                    continue
+                except Exception as e:
+                    # Lỗi khi xử lý một tin nhắn không được làm mất cả phiên kết nối
+                    logger.error(f"❌ Lỗi xử lý tin nhắn: {e}")
                     continue
                     
         except Exception as e:
             logger.error(f"❌ Lỗi lắng nghe: {e}")
         finally:
+            self._pending_binary = None
+            # Job stream chưa nhận đủ dữ liệu không thể tiếp tục sau khi mất kết nối
+            for job_id in list(self.streams):
+                await self._fail_stream(job_id, 'Connection closed', notify=False)
             self.running = False
     
     async def run(self):
         """Chạy client"""
         logger.info("🚀 Khởi động WebSocket Print Client...")
         
+        # Nạp sẵn danh sách máy in để getPrinters trả lời ngay từ bộ nhớ
+        self.printer_inventory.start()
+        # Probe định kỳ máy in đang bị circuit breaker chặn
+        self.print_handler.health.start()
+        if self.metrics_server is not None:
+            await self.metrics_server.start()
+        
         while True:
             try:
                 if await self.connect():
                     await self.listen()
-                else:
-                    logger.error("❌ Không thể kết nối, thử lại sau 5 giây...")
-                    await asyncio.sleep(5)
-                    continue
+                    self.connection.connection_lost()
                     
             except KeyboardInterrupt:
                 logger.info("🛑 Nhận tín hiệu dừng...")
                 break
             except Exception as e:
                 logger.error(f"❌ Lỗi không mong muốn: {e}")
-                await asyncio.sleep(5)
             finally:
                 await self.disconnect()
-                
+            
+            # Backoff có jitter: lần đầu gần như ngay lập tức, tăng dần nếu server vẫn chưa sẵn sàng
+            delay = self.connection.next_delay()
+            logger.info(f"🔄 Kết nối lại sau {delay:.2f} giây...")
+            await asyncio.sleep(delay)
+        
+        await self.dispatcher.cancel_all()
+        await self.printer_inventory.stop()
+        await self.print_handler.health.stop()
+        if self.metrics_server is not None:
+            await self.metrics_server.stop()
+        self.print_handler.preparer.shutdown()
+        # Ghi nốt last_access của spool trước khi dừng pool
+        try:
+            await self.print_handler.executor.run(self.print_handler.spool_store.flush)
+        except Exception as e:
+            logger.warning(f"⚠️ Không ghi được index spool: {e}")
+        self.print_handler.executor.shutdown()
+        self.print_handler.raw_tcp.close_all()
         logger.info("✅ WebSocket Print Client đã dừng")
 
 async def main():
     """Hàm main"""
+    # Cấu hình logging: ghi file (xoay vòng 10 MB x 5) và console trong thread riêng, không chặn event loop.
+    # Chỉ gọi từ entry point: worker của process pool import lại module này nhưng không được mở file log
+    setup_logging(level=logging.INFO, log_file='websocket_client.log')
     print("🖨️ WebSocket Print Client")
     print("🔌 Kết nối tới Node.js WebSocket Server")
     print("⚠️ Nhấn Ctrl+C để dừng")
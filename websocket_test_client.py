@@ -79,7 +79,7 @@ class WebSocketTestClient:
     async def handle_get_printers(self):
         """Xử lý yêu cầu lấy danh sách máy in"""
         try:
-            printers = self.print_handler.get_available_printers()
+            printers = await self.print_handler.get_available_printers()
             default_printer = self.print_handler.default_printer
             
             # Đánh dấu máy in mặc định